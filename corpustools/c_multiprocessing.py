@@ -1,281 +1,330 @@
-
-from multiprocessing import Process, process, Manager, Queue, cpu_count, Value, Lock, Pool, JoinableQueue
-from queue import Empty, Full
-
-import time
+from multiprocessing import Pool
+from functools import partial
+from itertools import islice
+from collections import deque
 
 
 def pool_filter(func, candidates, num_cores):
     pool = Pool(num_cores)
     return [c for c, keep in zip(candidates,pool.map(func,candidates)) if keep]
 
-class Counter(object):
-    def __init__(self, initval=0):
-        self.val = Value('i', initval)
-        self.lock = Lock()
-
-    def increment(self):
-        with self.lock:
-            self.val.value += 1
-
-    def value(self):
-        with self.lock:
-            return self.val.value
-
-class Stopped(object):
-    def __init__(self, initval=False):
-        self.val = Value('i', initval)
-        self.lock = Lock()
-
-    def stop(self):
-        with self.lock:
-            self.val.value = True
-
-    def stop_check(self):
-        with self.lock:
-            return self.val.value
-
-class QueueAdder(Process):
-    def __init__(self, iterable, queue, stopped):
-        Process.__init__(self)
-        self.iterable = iterable
-        self.queue = queue
-        self.stopped = stopped
-
-    def run(self):
-        for item in self.iterable:
-            if self.stopped.stop_check():
-                break
-            while True:
-                if self.stopped.stop_check():
-                    break
-                try:
-                    self.queue.put(item,False)
-                    break
-                except Full:
-                    pass
-        self.queue.close()
-        print('queue adder worker returning!')
-        return
-
-class FilterWorker(Process):
-    def __init__(self, job_q, filtered_q, filter_function, counter, stopped):
-        Process.__init__(self)
-        self.job_q = job_q
-        self.filtered_q = filtered_q
-        self.filter_function = filter_function
-        self.counter = counter
-        self.stopped = stopped
-
-    def run(self):
-        results = list()
-        while True:
-            self.counter.increment()
-            try:
-                args = self.job_q.get(timeout=1)
-            except Empty:
-                break
-            try:
-                for a in args:
-                    if self.filter_function(*a):
-                        results.append(a)
-            except Exception as e:
-                self.stopped.stop()
-                self.filtered_q.put(e)
-                break
-            self.job_q.task_done()
-        if self.stopped.stop_check():
-            return
-        if len(results) > 0:
-            self.filtered_q.put(results)
-
-
-        print('filter worker returning!')
-        return
+# Largest number of jobs sent to a worker at once, so that progress and
+# cancellation stay responsive on long inputs
+MAX_CHUNK_SIZE = 500
+
+# Number of chunks to aim for per worker, so that workers finishing early
+# pick up more work instead of idling
+CHUNKS_PER_PROCESS = 4
+
+_worker_context = None
+_worker_function = None
+_worker_words = None
+
+def _init_context_worker(corpus_context, function):
+    global _worker_context, _worker_function, _worker_words
+    _worker_context = corpus_context
+    _worker_function = function
+    _worker_words = None
+
+def _run_context_chunk(chunk):
+    return [_worker_function(_worker_context, *args) for args in chunk]
+
+def _call_without_context(function, corpus_context, *args):
+    return function(*args)
+
+def _context_word(position):
+    global _worker_words
+    if _worker_words is None:
+        _worker_words = list(_worker_context)
+    return _worker_words[position]
+
+def _apply_to_context_word(function, corpus_context, position):
+    return function(corpus_context, _context_word(position))
 
 def chunks(l, n):
     for i in range(0,len(l), n):
         yield l[i:i+n]
 
+def adaptive_chunk_size(num_jobs, num_procs):
+    """
+    Choose how many jobs to send to a worker at once.
+
+    Parameters
+    ----------
+    num_jobs : int
+        Total number of jobs
+    num_procs : int
+        Number of worker processes
+
+    Returns
+    -------
+    int
+        Chunk size giving each worker several chunks, between 1 and
+        MAX_CHUNK_SIZE
+    """
+    size = -(-num_jobs // (num_procs * CHUNKS_PER_PROCESS))
+    return max(1, min(MAX_CHUNK_SIZE, size))
+
+def context_map_mp(corpus_context, function, jobs, num_procs, call_back=None, stop_check=None,
+                    chunk_size=None):
+    """
+    Apply a function to a corpus context and each job's arguments in a
+    pool of processes.
+
+    The corpus context and the function are given to each worker once,
+    through the pool initializer, so only the job arguments are pickled
+    per task.  Jobs are sent in chunks and the results are collected from
+    their asynchronous results, keeping the order of `jobs`.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus, passed as the first argument to
+        `function`
+    function : callable
+        Module-level function (or functools.partial of one) taking the
+        corpus context followed by the arguments of a job
+    jobs : iterable of tuples
+        Arguments for each call of `function`
+    num_procs : int
+        Number of worker processes
+    stop_check : callable, optional
+        Optional function to check whether to gracefully terminate early
+    call_back : callable, optional
+        Optional function to supply progress information during the function
+    chunk_size : int, optional
+        Number of jobs sent to a worker at once, chosen from the number
+        of jobs and processes if not specified
+
+    Returns
+    -------
+    list or None
+        Results of each job, in the order of `jobs`, or None if stopped
+    """
+    jobs = list(jobs)
+    if chunk_size is None:
+        chunk_size = adaptive_chunk_size(len(jobs), num_procs)
+    if call_back is not None:
+        call_back(0, len(jobs))
+    pool = Pool(num_procs, initializer=_init_context_worker,
+                initargs=(corpus_context, function))
+    try:
+        futures = [(pool.apply_async(_run_context_chunk, (chunk,)), len(chunk))
+                    for chunk in chunks(jobs, chunk_size)]
+        pending = list(futures)
+        done_jobs = 0
+        while pending:
+            if stop_check is not None and stop_check():
+                return None
+            pending[0][0].wait(timeout=0.1)
+            still_pending = []
+            for future, size in pending:
+                if future.ready():
+                    # Raises any exception from the worker
+                    future.get()
+                    done_jobs += size
+                else:
+                    still_pending.append((future, size))
+            if call_back is not None and len(still_pending) < len(pending):
+                call_back(done_jobs)
+            pending = still_pending
+        results = []
+        for future, size in futures:
+            results.extend(future.get())
+    finally:
+        # Workers are stopped straight away when cancelled or on error
+        pool.terminate()
+        pool.join()
+    return results
+
+def context_imap_mp(corpus_context, function, jobs, num_procs, call_back=None, stop_check=None,
+                    chunk_size=MAX_CHUNK_SIZE):
+    """
+    Lazily apply a function to a corpus context and each job's arguments
+    in a pool of processes.
+
+    Like `context_map_mp`, but jobs are taken from `jobs` only as workers
+    need them and results are yielded in order as soon as they are ready,
+    so neither has to be held in memory all at once.  At most a few
+    chunks per worker are sent ahead.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus, passed as the first argument to
+        `function`
+    function : callable
+        Module-level function (or functools.partial of one) taking the
+        corpus context followed by the arguments of a job
+    jobs : iterable of tuples
+        Arguments for each call of `function`
+    num_procs : int
+        Number of worker processes
+    stop_check : callable, optional
+        Optional function to check whether to gracefully terminate early,
+        which ends the generator
+    call_back : callable, optional
+        Optional function to supply progress information during the function
+    chunk_size : int, optional
+        Number of jobs sent to a worker at once
+
+    Yields
+    ------
+    object
+        Result of each job, in the order of `jobs`
+    """
+    jobs = iter(jobs)
+    pool = Pool(num_procs, initializer=_init_context_worker,
+                initargs=(corpus_context, function))
+    in_flight = deque()
+
+    def submit():
+        chunk = list(islice(jobs, chunk_size))
+        if not chunk:
+            return False
+        in_flight.append((pool.apply_async(_run_context_chunk, (chunk,)), len(chunk)))
+        return True
+
+    try:
+        more_jobs = True
+        while more_jobs and len(in_flight) < num_procs * CHUNKS_PER_PROCESS:
+            more_jobs = submit()
+        done_jobs = 0
+        while in_flight:
+            future, size = in_flight[0]
+            while not future.ready():
+                if stop_check is not None and stop_check():
+                    return
+                future.wait(timeout=0.1)
+            in_flight.popleft()
+            if more_jobs:
+                more_jobs = submit()
+            # Raises any exception from the worker
+            for result in future.get():
+                yield result
+            done_jobs += size
+            if call_back is not None:
+                call_back(done_jobs)
+    finally:
+        # Workers are stopped straight away when cancelled, on error, or
+        # when the generator is closed early
+        pool.terminate()
+        pool.join()
+
+def context_words_map_mp(corpus_context, function, num_procs, call_back=None, stop_check=None,
+                        chunk_size=None):
+    """
+    Apply a function to a corpus context and each of its words in a pool
+    of processes.
+
+    Words are sent to workers as their positions in the corpus context,
+    and looked up in each worker's own copy, so words found there (e.g.,
+    in cached indexes) are the same objects as the word being processed.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    function : callable
+        Module-level function (or functools.partial of one) taking the
+        corpus context and a word
+    num_procs : int
+        Number of worker processes
+    stop_check : callable, optional
+        Optional function to check whether to gracefully terminate early
+    call_back : callable, optional
+        Optional function to supply progress information during the function
+    chunk_size : int, optional
+        Number of words sent to a worker at once
+
+    Returns
+    -------
+    list or None
+        Results for each word, in the order the corpus context yields them,
+        or None if stopped
+    """
+    jobs = [(i,) for i in range(len(corpus_context))]
+    return context_map_mp(corpus_context, partial(_apply_to_context_word, function), jobs,
+                        num_procs, call_back=call_back, stop_check=stop_check,
+                        chunk_size=chunk_size)
+
+def map_mp(function, jobs, num_procs, call_back=None, stop_check=None, chunk_size=None):
+    """
+    Apply a function to each job's arguments in a pool of processes.
+
+    See `context_map_mp` for details; `function` here takes only the
+    arguments of a job.
+
+    Returns
+    -------
+    list or None
+        Results of each job, in the order of `jobs`, or None if stopped
+    """
+    return context_map_mp(None, partial(_call_without_context, function), jobs, num_procs,
+                        call_back=call_back, stop_check=stop_check, chunk_size=chunk_size)
+
+def filter_mp(iterable, filter_function, num_procs, call_back, stop_check, debug = False,
+                chunk_size = None):
+    """
+    Keep the arguments for which `filter_function` returns True, checked
+    in a pool of processes.
+
+    Parameters
+    ----------
+    iterable : iterable of tuples
+        Arguments to check
+    filter_function : callable
+        Picklable function taking the arguments of an item
+    num_procs : int
+        Number of worker processes
+    call_back : callable or None
+        Optional function to supply progress information during the function
+    stop_check : callable or None
+        Optional function to check whether to gracefully terminate early
+    chunk_size : int, optional
+        Number of items sent to a worker at once
+
+    Returns
+    -------
+    list or None
+        The items kept, in input order, or None if stopped
+    """
+    items = list(iterable)
+    keep = map_mp(filter_function, items, num_procs, call_back=call_back,
+                    stop_check=stop_check, chunk_size=chunk_size)
+    if keep is None:
+        return None
+    return [a for a, k in zip(items, keep) if k]
+
+def score_mp(iterable, function, num_procs, call_back, stop_check, debug = False, chunk_size = None):
+    """
+    Score each item of arguments with `function` in a pool of processes.
 
-def filter_mp(iterable, filter_function, num_procs, call_back, stop_check, debug = False):
-    job_queue = JoinableQueue(100)
-    filtered_queue = Queue()
-    stopped = Stopped()
-    done = False
-    while not done:
-        chunk = []
-        while len(chunk) < 500:
-            try:
-                item = next(iterable)
-            except StopIteration:
-                done = True
-                break
-            chunk.append(item)
-        try:
-            job_queue.put(chunk,False)
-        except Full:
-            break
-    procs = []
-
-    counter = Counter()
-    for i in range(num_procs):
-        p = FilterWorker(job_queue, filtered_queue, filter_function, counter, stopped)
-        procs.append(p)
-        p.start()
-    val = 0
-    done = False
-    while not done:
-        if stop_check is None:
-            break
-        if stop_check is not None and stop_check():
-            stopped.stop()
-            time.sleep(1)
-            break
-        chunk = []
-        while len(chunk) < 500:
-            try:
-                item = next(iterable)
-            except StopIteration:
-                done = True
-                break
-            chunk.append(item)
-        job_queue.put(chunk)
-
-        if call_back is not None:
-            value = counter.value()
-            call_back(value)
-    job_queue.join()
-    if debug:
-        print('queueadder joined!')
-    return_list = list()
-    error = None
-    while True:
-        try:
-            l = filtered_queue.get(timeout=2)
-        except Empty:
-            break
-        if isinstance(l, Exception):
-            error = l
-        else:
-            return_list.extend(l)
-    if debug:
-        print('emptied result queue')
-    for p in procs:
-        p.join()
-    if error is not None:
-        raise(error)
-    if debug:
-        print('joined')
-        print(len(return_list))
-    return return_list
-
-class ScoreWorker(Process):
-    def __init__(self, job_q, scored_q, function, counter, stopped):
-        Process.__init__(self)
-        self.job_q = job_q
-        self.scored_q = scored_q
-        self.function = function
-        self.counter = counter
-        self.stopped = stopped
-
-    def run(self):
-        while True:
-            self.counter.increment()
-            try:
-                args = self.job_q.get(timeout=1)
-            except Empty:
-                break
-            results = list()
-            for a in args:
-                try:
-                    score = self.function(*a)
-                    if score is None:
-                        continue
-                    return_value = tuple([x for x in a] + [score])
-                    results.append(return_value)
-                except Exception as e:
-                    self.scored_q.put(e)
-                    self.stopped.stop()
-                    break
-            self.job_q.task_done()
-            if self.stopped.stop_check():
-                continue
-            self.scored_q.put(results)
-
-        return
-
-
-def score_mp(iterable, function, num_procs, call_back, stop_check, debug = False, chunk_size = 500):
-    job_queue = JoinableQueue(100)
-    scored_queue = Queue()
-    stopped = Stopped()
-    done = False
-    while not done:
-        chunk = []
-        while len(chunk) < chunk_size:
-            try:
-                item = next(iterable)
-            except StopIteration:
-                done = True
-                break
-            chunk.append(item)
-        try:
-            job_queue.put(chunk,False)
-        except Full:
-            break
-    procs = []
-
-    counter = Counter()
-    for i in range(num_procs):
-        p = ScoreWorker(job_queue, scored_queue, function, counter, stopped)
-        procs.append(p)
-        p.start()
-    val = 0
-    done = False
-    while not done:
-        if stop_check is None:
-            break
-        if stop_check is not None and stop_check():
-            stopped.stop()
-            time.sleep(1)
-            break
-        chunk = []
-        while len(chunk) < chunk_size:
-            try:
-                item = next(iterable)
-            except StopIteration:
-                done = True
-                break
-            chunk.append(item)
-        job_queue.put(chunk)
-
-        if call_back is not None:
-            value = counter.value()
-            call_back(value)
-    job_queue.join()
-    time.sleep(2)
-    if debug:
-        print('queueadder joined!')
-    return_list = list()
-    error = None
-    while True:
-        try:
-            l = scored_queue.get(timeout=2)
-        except Empty:
-            break
-        if isinstance(l, Exception):
-            error = l
-        else:
-            return_list.extend(l)
-    if debug:
-        print('emptied result queue')
-    for p in procs:
-        p.join()
-    if error is not None:
-        raise(error)
-    if debug:
-        print('joined')
-        print(len(return_list))
-    return return_list
+    Parameters
+    ----------
+    iterable : iterable of tuples
+        Arguments to score
+    function : callable
+        Picklable function taking the arguments of an item, returning
+        None for items to leave out
+    num_procs : int
+        Number of worker processes
+    call_back : callable or None
+        Optional function to supply progress information during the function
+    stop_check : callable or None
+        Optional function to check whether to gracefully terminate early
+    chunk_size : int, optional
+        Number of items sent to a worker at once
 
+    Returns
+    -------
+    list or None
+        Tuples of each item's arguments followed by its score, in input
+        order, or None if stopped
+    """
+    items = list(iterable)
+    scores = map_mp(function, items, num_procs, call_back=call_back,
+                    stop_check=stop_check, chunk_size=chunk_size)
+    if scores is None:
+        return None
+    return [tuple(a) + (score,) for a, score in zip(items, scores) if score is not None]
@@ -41,6 +41,7 @@ def main():
     parser.add_argument('-w', '--environment_rhs', default=None, help="Right hand side of environment filter. Format: positions separated by commas, groups by slashes, e.g. m/n,i matches mi or ni.")
     parser.add_argument('-n', '--prevent_normalization', action='store_true', help="For deltah entropy: prevents normalization of the entropy difference by the pre-neutralization entropy. To replicate the Surendran \& Niyogi metric, do NOT use this flag.")
     parser.add_argument('-x', '--separate_pairs', action='store_true', help="If present, calculate FL for each pair in the pairs file separately.")
+    parser.add_argument('-j', '--num_cores', type=int, default=-1, help="For -l / --all_pairwise_fls: number of processes to spread the segment pairs over. Defaults to -1, which uses a single process.")
     parser.add_argument('-o', '--outfile', help='Name of output file')
 
     args = parser.parse_args()
@@ -91,8 +92,9 @@ def main():
     # Determine which function to call
 
     if args.all_pairwise_fls:
-        results = all_pairwise_fls(corpus, relative_fl=args.relative_fl, algorithm=args.algorithm, relative_count=args.relative_count,
-                     distinguish_homophones=args.distinguish_homophones, environment_filters=environment_filters, prevent_normalization=args.prevent_normalization)
+        results = all_pairwise_fls(corpus, relative_fl=args.relative_fl, algorithm=args.algorithm, relative_count_to_relevant_sounds=args.relative_count,
+                     distinguish_homophones=args.distinguish_homophones, environment_filter=environment_filters or None, prevent_normalization=args.prevent_normalization,
+                     num_cores=args.num_cores)
         for pair, fl in results:
             detailed_results[pair] = fl
         keys_label = 'segment pair'
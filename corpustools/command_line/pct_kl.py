@@ -11,22 +11,30 @@ sys.path.insert(0,base)
 
 from corpustools.corpus.classes import Corpus
 from corpustools.corpus.io import load_binary
-from corpustools.kl.kl import KullbackLeibler
+from corpustools.kl.kl import KullbackLeibler, pairwise_KullbackLeibler
 from corpustools.contextmanagers import *
 
 def main():
 
     #### Parse command-line arguments
+    # The segments are only positional arguments outside of matrix mode,
+    # so check for --matrix first
+    matrix_parser = argparse.ArgumentParser(add_help=False)
+    matrix_parser.add_argument('-m', '--matrix', action='store_true')
+    matrix = matrix_parser.parse_known_args()[0].matrix
+
     parser = argparse.ArgumentParser(description = 'Phonological CorpusTools: Kullback-Leibler CL interface')
     parser.add_argument('corpus_file_name', help='Path to corpus file. This can just be the file name if it\'s in the same directory as CorpusTools')
-    parser.add_argument('seg1', help='First segment')
-    parser.add_argument('seg2', help='Second segment')
+    if not matrix:
+        parser.add_argument('seg1', help='First segment')
+        parser.add_argument('seg2', help='Second segment')
     parser.add_argument('side', help='Context to check. Options are \'right\', \'left\' and \'both\'. You can enter just the first letter.')
     parser.add_argument('-s', '--sequence_type', default='transcription', help="The attribute of Words to calculate KL over. Normally this will be the transcription, but it can also be the spelling or a user-specified tier.")
     parser.add_argument('-t', '--type_or_token', default='token', help='Specifies whether entropy is based on type or token frequency.')
     parser.add_argument('-c', '--context_type', type=str, default='Canonical', help="How to deal with variable pronunciations. Options are 'Canonical', 'MostFrequent', 'SeparatedTokens', or 'Weighted'. See documentation for details.")
     parser.add_argument('-o', '--outfile', help='Name of output file (optional)')
-    
+    parser.add_argument('-m', '--matrix', action='store_true', help='Calculate the KL distances between every pair of segments in the inventory, with the entropy of each segment. The two segments are then left out of the arguments.')
+
     args = parser.parse_args()
 
     ####
@@ -49,6 +57,23 @@ def main():
     elif args.context_type == 'Weighted':
         corpus = WeightedVariantContext(corpus, args.sequence_type, args.type_or_token)
 
+    if args.matrix:
+        segments, entropies, distances = pairwise_KullbackLeibler(corpus, args.side)
+        lines = [','.join(['Segment', 'Entropy'] + segments)]
+        for seg, entropy, row in zip(segments, entropies, distances):
+            lines.append(','.join([seg, str(entropy)] + [str(d) for d in row]))
+        if args.outfile is not None:
+            outfile = args.outfile
+            if not outfile.endswith('.txt'):
+                outfile += '.txt'
+            with open(outfile, mode='w', encoding='utf-8-sig') as f:
+                for line in lines:
+                    print(line, file=f)
+        else:
+            for line in lines:
+                print(line)
+        return
+
     results = KullbackLeibler(corpus, args.seg1, args.seg2, args.side, outfile=None)
 
     outfile = args.outfile
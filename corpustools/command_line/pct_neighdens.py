@@ -7,25 +7,11 @@ import csv
 base = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 sys.path.insert(0,base)
 
-from corpustools.corpus.classes import Word
 from corpustools.corpus.io.binary import load_binary
 from corpustools.neighdens.neighborhood_density import neighborhood_density
 from corpustools.neighdens.neighborhood_density import find_mutation_minpairs
 from corpustools.contextmanagers import *
-
-
-def ensure_query_is_word(query, corpus, sequence_type, trans_delimiter):
-    if isinstance(query, Word):
-        query_word = query
-    else:
-        try:
-            query_word = corpus.corpus.find(query)
-        except KeyError:
-            if trans_delimiter == '':
-                query_word = Word(**{sequence_type: list(query)})
-            else:
-                query_word = Word(**{sequence_type: query.split(trans_delimiter)})
-    return query_word
+from corpustools.command_line.utils import ensure_query_is_word
 
 
 def main():
@@ -42,7 +28,7 @@ def main():
     parser.add_argument('-w', '--count_what', default ='type', help="If 'type', count neighbors in terms of their type frequency. If 'token', count neighbors in terms of their token frequency.")
     parser.add_argument('-e', '--trans_delimiter', default='', help="If not empty string, splits the query by this str to make a transcription/spelling list for the query's Word object.")
     parser.add_argument('-m', '--find_mutation_minpairs', action='store_true', help='This flag causes the script not to calculate neighborhood density, but rather to find minimal pairs---see documentation.')
-    parser.add_argument('-q', '--force_quadratic_algorithm', action='store_true', help='This flag prevents PCT from using the more efficient linear-time algorithm for edit distance of 1 neighborhoods.')
+    parser.add_argument('-q', '--force_quadratic_algorithm', action='store_true', help='This flag makes PCT compare the query with every word in turn instead of using the more efficient index-based algorithms for edit distance and phonological edit distance.')
     parser.add_argument('-o', '--outfile', help='Name of output file')
 
     args = parser.parse_args()
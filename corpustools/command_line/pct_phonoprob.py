@@ -0,0 +1,81 @@
+import argparse
+import os
+import sys
+import csv
+
+# default to importing from CorpusTools repo
+base = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+sys.path.insert(0,base)
+
+from corpustools.corpus.io.binary import load_binary
+from corpustools.phonoprob.phonotactic_probability import phonotactic_probabilities
+from corpustools.contextmanagers import *
+from corpustools.command_line.utils import ensure_query_is_word
+
+
+def main():
+
+    #### Parse command-line arguments
+    parser = argparse.ArgumentParser(description = \
+             'Phonological CorpusTools: phonotactic probability CL interface')
+    parser.add_argument('corpus_file_name', help='Name of corpus file')
+    parser.add_argument('query', help='Word to query, or name of file including a list of words or nonwords')
+    parser.add_argument('-c', '--context_type', type=str, default='Canonical', help="How to deal with variable pronunciations. Options are 'Canonical', 'MostFrequent', 'SeparatedTokens', or 'Weighted'. See documentation for details.")
+    parser.add_argument('-a', '--algorithm', default='vitevitch', help="The algorithm used to calculate phonotactic probability")
+    parser.add_argument('-p', '--probability_type', default='unigram', help="Either 'unigram' or 'bigram' positional probabilities")
+    parser.add_argument('-s', '--sequence_type', default = 'transcription', help="The name of the tier on which to calculate phonotactic probability")
+    parser.add_argument('-w', '--count_what', default ='type', help="If 'type', use type frequencies. If 'token', use token frequencies.")
+    parser.add_argument('-n', '--no_log_count', action='store_true', help="This flag causes token frequencies not to be log-scaled.")
+    parser.add_argument('-e', '--trans_delimiter', default='', help="If not empty string, splits the query by this str to make a transcription/spelling list for the query's Word object.")
+    parser.add_argument('-j', '--num_cores', type=int, default=-1, help="Number of cores to use, -1 to use only one")
+    parser.add_argument('-o', '--outfile', help='Name of output file')
+
+    args = parser.parse_args()
+
+    ####
+
+    try:
+        home = os.path.expanduser('~')
+        corpus = load_binary(os.path.join(home, 'Documents', 'PCT', 'CorpusTools', 'CORPUS', args.corpus_file_name))
+    except FileNotFoundError:
+        corpus = load_binary(args.corpus_file_name)
+
+    log_count = not args.no_log_count
+    if args.context_type == 'Canonical':
+        corpus = CanonicalVariantContext(corpus, args.sequence_type, type_or_token=args.count_what, log_count=log_count)
+    elif args.context_type == 'MostFrequent':
+        corpus = MostFrequentVariantContext(corpus, args.sequence_type, type_or_token=args.count_what, log_count=log_count)
+    elif args.context_type == 'SeparatedTokens':
+        corpus = SeparatedTokensVariantContext(corpus, args.sequence_type, type_or_token=args.count_what, log_count=log_count)
+    elif args.context_type == 'Weighted':
+        corpus = WeightedVariantContext(corpus, args.sequence_type, type_or_token=args.count_what, log_count=log_count)
+
+    try: # read query as a file name
+        with open(args.query) as queryfile:
+            queries = [line[0] for line in csv.reader(queryfile, delimiter='\t') if len(line) > 0]
+            queries = [ensure_query_is_word(q, corpus, args.sequence_type, args.trans_delimiter) for q in queries]
+        results = phonotactic_probabilities(corpus, queries, args.algorithm,
+                                            probability_type = args.probability_type,
+                                            num_cores = args.num_cores)
+        if args.outfile:
+            with open(args.outfile, 'w') as outfile:
+                for q, r in zip(queries, results):
+                    outfile.write('{}\t{}\n'.format(q, str(r)))
+        else:
+            raise Exception('In order to use a file of queries as input, you must provide an output file name using the option -o.')
+
+    except FileNotFoundError: # read query as a single word
+        query = ensure_query_is_word(args.query, corpus, args.sequence_type, args.trans_delimiter)
+        result = phonotactic_probabilities(corpus, [query], args.algorithm,
+                                           probability_type = args.probability_type)[0]
+
+        if args.outfile:
+            with open(args.outfile, 'w') as outfile:
+                outfile.write('{}\t{}'.format(query, str(result)))
+        else:
+            print('No output file name provided.')
+            print('The phonotactic probability of the given form is {}.'.format(str(result)))
+
+
+if __name__ == '__main__':
+    main()
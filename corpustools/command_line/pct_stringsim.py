@@ -0,0 +1,67 @@
+import argparse
+import os
+import sys
+
+# default to importing from CorpusTools repo
+base = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+sys.path.insert(0,base)
+
+from corpustools.corpus.io.binary import load_binary
+from corpustools.symbolsim.string_similarity import string_similarity
+from corpustools.contextmanagers import *
+from corpustools.command_line.utils import ensure_query_is_word
+
+
+def main():
+
+    #### Parse command-line arguments
+    parser = argparse.ArgumentParser(description = \
+             'Phonological CorpusTools: string similarity CL interface')
+    parser.add_argument('corpus_file_name', help='Name of corpus file')
+    parser.add_argument('query', help='Word to compare to every word in the corpus')
+    parser.add_argument('-c', '--context_type', type=str, default='Canonical', help="How to deal with variable pronunciations. Options are 'Canonical', 'MostFrequent', 'SeparatedTokens', or 'Weighted'. See documentation for details.")
+    parser.add_argument('-a', '--algorithm', default= 'edit_distance', help="The algorithm used to determine similarity: 'khorsi', 'edit_distance' or 'phono_edit_distance'")
+    parser.add_argument('-s', '--sequence_type', default = 'transcription', help="The name of the tier on which to calculate similarity")
+    parser.add_argument('-w', '--count_what', default ='type', help="If 'type', use type frequency for the segment frequencies of khorsi. If 'token', use token frequency.")
+    parser.add_argument('-e', '--trans_delimiter', default='', help="If not empty string, splits the query by this str to make a transcription/spelling list for the query's Word object.")
+    parser.add_argument('-k', '--top_k', type=int, default=None, help="If specified, only return this many of the most similar words.")
+    parser.add_argument('--min_rel', type=float, default=None, help="Filter out words with a similarity score lower than this")
+    parser.add_argument('--max_rel', type=float, default=None, help="Filter out words with a similarity score higher than this")
+    parser.add_argument('-j', '--num_cores', type=int, default=-1, help="Number of cores to use when comparing to every word, -1 to use only one")
+    parser.add_argument('-o', '--outfile', help='Name of output file')
+
+    args = parser.parse_args()
+
+    ####
+
+    try:
+        home = os.path.expanduser('~')
+        corpus = load_binary(os.path.join(home, 'Documents', 'PCT', 'CorpusTools', 'CORPUS', args.corpus_file_name))
+    except FileNotFoundError:
+        corpus = load_binary(args.corpus_file_name)
+
+    if args.context_type == 'Canonical':
+        corpus = CanonicalVariantContext(corpus, args.sequence_type, type_or_token=args.count_what)
+    elif args.context_type == 'MostFrequent':
+        corpus = MostFrequentVariantContext(corpus, args.sequence_type, type_or_token=args.count_what)
+    elif args.context_type == 'SeparatedTokens':
+        corpus = SeparatedTokensVariantContext(corpus, args.sequence_type, type_or_token=args.count_what)
+    elif args.context_type == 'Weighted':
+        corpus = WeightedVariantContext(corpus, args.sequence_type, type_or_token=args.count_what)
+
+    query = ensure_query_is_word(args.query, corpus, args.sequence_type, args.trans_delimiter)
+    results = string_similarity(corpus, query, args.algorithm, top_k = args.top_k,
+                                min_rel = args.min_rel, max_rel = args.max_rel,
+                                num_cores = args.num_cores)
+
+    if args.outfile:
+        with open(args.outfile, 'w') as outfile:
+            for _, word, score in results:
+                outfile.write('{}\t{}\n'.format(word, score))
+    else:
+        for _, word, score in results:
+            print('{}\t{}'.format(word, score))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,15 @@
+from corpustools.corpus.classes import Word
+
+
+def ensure_query_is_word(query, corpus, sequence_type, trans_delimiter):
+    if isinstance(query, Word):
+        query_word = query
+    else:
+        try:
+            query_word = corpus.corpus.find(query)
+        except KeyError:
+            if trans_delimiter == '':
+                query_word = Word(**{sequence_type: list(query)})
+            else:
+                query_word = Word(**{sequence_type: query.split(trans_delimiter)})
+    return query_word
@@ -8,6 +8,21 @@ from corpustools.corpus.classes.lexicon import Word
 
 from corpustools.exceptions import PCTContextError
 
+class ReadOnlyDict(dict):
+    """
+    Dictionary that cannot be modified, for tables cached by a corpus
+    context and shared between callers.  Use ``dict(d)`` to get a copy
+    that can be modified.
+    """
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('This table is cached by the corpus context and cannot be modified')
+
+    __setitem__ = __delitem__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return (type(self), (dict(self),))
+
 def ensure_context(context):
     if not isinstance(context, BaseCorpusContext):
         raise(PCTContextError('Context manager required for here, please see API documentation for more details.'))
@@ -38,6 +53,13 @@ class BaseCorpusContext(object):
         self.name = self.corpus.name
         self.attribute = attribute
         self._freq_base = {}
+        self._freq_views = {}
+        self._minpair_index = {}
+        self._encoded_lexicon = {}
+        self._deletion_index = {}
+        self._context_counts = {}
+        self._prefix_trie = {}
+        self._context_model = {}
         self.length = None
         self.frequency_threshold = frequency_threshold
         self.log_count = log_count
@@ -84,9 +106,10 @@ class BaseCorpusContext(object):
 
         Returns
         -------
-        dict
+        ReadOnlyDict
             Keys are segments (or sequences of segments) and values are
-            their frequency in the Corpus
+            their frequency in the Corpus; the table is cached and shared
+            between calls, so it cannot be modified
         """
         if (gramsize) not in self._freq_base:
             freq_base = collections.defaultdict(float)
@@ -103,17 +126,21 @@ class BaseCorpusContext(object):
                     freq_base[x] += word.frequency
             freq_base['total'] = sum(value for value in freq_base.values())
             self._freq_base[(gramsize)] = freq_base
-        freq_base = self._freq_base[(gramsize)]
-        return_dict = { k:v for k,v in freq_base.items()}
-        if halve_edges and '#' in return_dict:
-            return_dict['#'] = (return_dict['#'] / 2) + 1
-            if not probability:
-                return_dict['total'] -= return_dict['#'] - 2
-        if probability:
-            return_dict = { k:v/freq_base['total'] for k,v in return_dict.items()}
-        return return_dict
-
-    def get_phone_probs(self, gramsize = 1, probability = True, preserve_position = True):
+        view_key = ('frequency', gramsize, halve_edges, probability)
+        if view_key not in self._freq_views:
+            freq_base = self._freq_base[(gramsize)]
+            return_dict = { k:v for k,v in freq_base.items()}
+            if halve_edges and '#' in return_dict:
+                return_dict['#'] = (return_dict['#'] / 2) + 1
+                if not probability:
+                    return_dict['total'] -= return_dict['#'] - 2
+            if probability:
+                return_dict = { k:v/freq_base['total'] for k,v in return_dict.items()}
+            self._freq_views[view_key] = ReadOnlyDict(return_dict)
+        return self._freq_views[view_key]
+
+    def get_phone_probs(self, gramsize = 1, probability = True, preserve_position = True,
+                        log_count = None):
         """
         Generate (and cache) phonotactic probabilities for segments in
         the Corpus.
@@ -133,21 +160,24 @@ class BaseCorpusContext(object):
 
         log_count : boolean
             If True, token frequencies will be logrithmically-transformed
-            prior to being summed
+            prior to being summed, defaults to the setting of the context
 
         Returns
         -------
-        dict
+        ReadOnlyDict
             Keys are segments (or sequences of segments) and values are
-            their phonotactic probability in the Corpus
+            their phonotactic probability in the Corpus; the table is
+            cached and shared between calls, so it cannot be modified
         """
-        if (gramsize, preserve_position, self.log_count) not in self._freq_base:
+        if log_count is None:
+            log_count = self.log_count
+        if (gramsize, preserve_position, log_count) not in self._freq_base:
             freq_base = collections.defaultdict(float)
             totals = collections.defaultdict(float)
             for word in self:
                 if self.type_or_token == 'type':
                     freq = 1
-                elif self.type_or_token == 'token' and self.log_count:
+                elif self.type_or_token == 'token' and log_count:
                     freq = math.log(word.frequency) if word.frequency > 1 else math.log(1.00001)
                 else:
                     freq = word.frequency
@@ -166,16 +196,19 @@ class BaseCorpusContext(object):
                 freq_base['total'] = sum(value for value in freq_base.values())
             else:
                 freq_base['total'] = totals
-            self._freq_base[(gramsize, preserve_position, self.log_count)] = freq_base
-
-        freq_base = self._freq_base[(gramsize,preserve_position, self.log_count)]
-        return_dict = { k:v for k,v in freq_base.items()}
-        if probability and not preserve_position:
-            return_dict = { k:v/freq_base['total'] for k,v in return_dict.items()}
-        elif probability:
-            return_dict = { k:v/freq_base['total'][k[1]]
-                            for k,v in return_dict.items() if k != 'total'}
-        return return_dict
+            self._freq_base[(gramsize, preserve_position, log_count)] = freq_base
+
+        view_key = ('phone', gramsize, probability, preserve_position, log_count)
+        if view_key not in self._freq_views:
+            freq_base = self._freq_base[(gramsize,preserve_position, log_count)]
+            return_dict = { k:v for k,v in freq_base.items()}
+            if probability and not preserve_position:
+                return_dict = { k:v/freq_base['total'] for k,v in return_dict.items()}
+            elif probability:
+                return_dict = { k:v/freq_base['total'][k[1]]
+                                for k,v in return_dict.items() if k != 'total'}
+            self._freq_views[view_key] = ReadOnlyDict(return_dict)
+        return self._freq_views[view_key]
 
     def __exit__(self, exc_type, exc, exc_tb):
         if exc_type is None:
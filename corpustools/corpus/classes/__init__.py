@@ -1,5 +1,5 @@
 
-from .lexicon import (Corpus, Word, Environment, EnvironmentFilter, FeatureMatrix,
+from .lexicon import (Corpus, Word, Environment, EnvironmentFilter, EnvironmentMatcher, SegmentIndex, FeatureMatrix,
                       Segment, Transcription, Attribute, )
 
 from .spontaneous import Speaker, WordToken, Discourse, SpontaneousSpeechCorpus
@@ -348,44 +348,7 @@ class Transcription(object):
         if mode == 'segMode':
             if not isinstance(environment, EnvironmentFilter):
                 return None
-            if all(m not in self for m in environment._middle):
-                return None
-            num_segs = len(environment)
-
-            possibles = zip(*[self.with_word_boundaries()[i:] for i in range(num_segs)])
-
-            lhs_num = environment.lhs_count()
-            middle_num = lhs_num
-            rhs_num = middle_num + 1
-
-            for i, p in enumerate(possibles):
-                if p in environment:
-                    lhs = p[:lhs_num]
-                    middle = p[middle_num]
-                    rhs = p[rhs_num:]
-                    envs.append(Environment(middle, i + middle_num, lhs, rhs))
-
-            lhsZeroes, rhsZeroes = environment.zeroPositions
-            if lhsZeroes:
-                word = [seg for pos,seg in enumerate(self.with_word_boundaries()) if pos not in lhsZeroes]
-                possibles = zip(*[word[i:] for i in range(num_segs)])
-                for i, p in enumerate(possibles):
-                    if environment.without_zeroes_contains(p):
-                        lhs = p[:lhs_num]
-                        middle = p[middle_num]
-                        rhs = p[rhs_num:]
-                        envs.append(Environment(middle, i + middle_num, lhs, rhs))
-
-            if rhsZeroes:
-                rhsZeroes = [rz+middle_num+1 for rz in rhsZeroes]
-                word = [seg for pos, seg in enumerate(self.with_word_boundaries()) if pos not in rhsZeroes]
-                possibles = zip(*[word[i:] for i in range(num_segs)])
-                for i, p in enumerate(possibles):
-                    if environment.without_zeroes_contains(p):
-                        lhs = p[:lhs_num]
-                        middle = p[middle_num]
-                        rhs = p[rhs_num:]
-                        envs.append(Environment(middle, i + middle_num, lhs, rhs))
+            envs = environment.compile().find(self)[0]
         else:  # mode == 'sylMode'
             reg_exp = environment.generate_regular_expression()
             word_str = self.with_syllable_and_word_boundaries()
@@ -634,6 +597,10 @@ class FeatureMatrix(object):
     attributes = ['name', '_features', 'vowel_features', 'cons_features', 'voice_features', 'rounded_feature',
                   'diph_feature', 'possible_values', 'matrix', '_default_value']
 
+    # Number of changes made to the matrix, so that things computed from
+    # it (like the cost tables of an Aligner) can tell when to rebuild
+    revision = 0
+
     def __init__(self, name, feature_entries):
         self.name = name
         self._features = None
@@ -672,6 +639,7 @@ class FeatureMatrix(object):
     def default_fill(self, seg_list):
         for seg in seg_list:
             self.matrix[seg] = {feature: self.default_value for feature in self._features}
+        self.revision += 1
 
     @property
     def trans_name(self):
@@ -763,6 +731,7 @@ class FeatureMatrix(object):
             for f in self._features:
                 if f not in v:
                     self.matrix[k][f] = self._default_value
+        self.revision += 1
 
     def set_major_class_features(self, source):
         self.vowel_feature = source.vowel_feature
@@ -807,6 +776,7 @@ class FeatureMatrix(object):
         # s.set_features(feat_spec)
         # self.matrix[seg] = s._features
         self.matrix[seg] = feat_spec
+        self.revision += 1
 
     def add_feature(self,feature, default = None):
         """
@@ -832,6 +802,7 @@ class FeatureMatrix(object):
                 for f in self._features:
                     if f not in features:
                         self.matrix[seg][f] = default
+        self.revision += 1
 
 
     def valid_feature_strings(self):
@@ -974,6 +945,7 @@ class FeatureMatrix(object):
         except KeyError:
             if assign_defaults:
                 self.matrix[symbol] = {feature:'n' for feature in self.features}
+                self.revision += 1
                 features = self.matrix[symbol]
             else:
                 raise KeyError(symbol)
@@ -994,6 +966,7 @@ class FeatureMatrix(object):
 
     def __delitem__(self,item):
         del self.matrix[item]
+        self.revision += 1
 
     def __contains__(self,item):
         return item in list(self.matrix.keys())
@@ -1003,6 +976,7 @@ class FeatureMatrix(object):
             self.matrix[key] = value
         if isinstance(key, Segment):
             self.matrix[key.symbol] = value
+        self.revision += 1
 
     def __len__(self):
         return len(self.matrix)
@@ -1760,6 +1734,7 @@ class EnvironmentFilter(object):
             self.zeroPositions = (None, None)
         else:
             self.zeroPositions = zeroPositions
+        self._compiled = None
 
     @property
     def middle(self):
@@ -1820,6 +1795,22 @@ class EnvironmentFilter(object):
     def compile_re_pattern(self):
         pass
 
+    def compile(self):
+        """
+        Compile the EnvironmentFilter into an EnvironmentMatcher, which is
+        kept until the filter changes
+
+        Returns
+        -------
+        EnvironmentMatcher
+            Matcher for this EnvironmentFilter alone
+        """
+        zeroes = tuple(None if z is None else tuple(z) for z in self.zeroPositions)
+        key = (self.lhs, self.rhs, frozenset(self._middle), zeroes)
+        if self._compiled is None or self._compiled[0] != key:
+            self._compiled = (key, EnvironmentMatcher([self]))
+        return self._compiled[1]
+
     def lhs_count(self):
         """
         Get the number of elements on the left hand side
@@ -1950,6 +1941,284 @@ class EnvironmentFilter(object):
 
         return RegExp
 
+class EnvironmentMatcher(object):
+    """
+    EnvironmentFilters compiled into tables of the filters that accept
+    each segment at each position of a window, so that a Transcription is
+    scanned once for all of the filters at the same time
+
+    Parameters
+    ----------
+    environments : list of EnvironmentFilter
+        EnvironmentFilters to search for
+    """
+    def __init__(self, environments):
+        self.environments = list(environments)
+        # Bit masks of the filters that can apply to a word containing a
+        # segment, since filters only apply if a middle segment is in the word
+        self._middles = collections.defaultdict(int)
+        # Patterns are grouped by the positions of the word that they skip,
+        # which are only present for filters with zero positions
+        self._groups = collections.OrderedDict()
+        for i, env in enumerate(self.environments):
+            for m in env._middle:
+                self._middles[m] |= 1 << i
+            self._add_pattern(frozenset(), i, 0, list(env), len(env), env.lhs_count())
+            lhsZeroes, rhsZeroes = env.zeroPositions
+            if lhsZeroes:
+                self._add_pattern(frozenset(lhsZeroes), i, 1, env.without_zero_positions(),
+                                  len(env), env.lhs_count())
+            if rhsZeroes:
+                skipped = frozenset(rz + env.lhs_count() + 1 for rz in rhsZeroes)
+                self._add_pattern(skipped, i, 2, env.without_zero_positions(),
+                                  len(env), env.lhs_count())
+        for group in self._groups.values():
+            self._compile_group(group)
+
+    def _add_pattern(self, skipped, env_index, variant, slots, length, lhs_num):
+        if skipped not in self._groups:
+            self._groups[skipped] = {'patterns': []}
+        self._groups[skipped]['patterns'].append((env_index, variant, slots, length, lhs_num))
+
+    def _compile_group(self, group):
+        patterns = group['patterns']
+        width = max(length for _, _, _, length, _ in patterns)
+        required = [0] * width
+        free = [0] * width
+        accept = [collections.defaultdict(int) for _ in range(width)]
+        for bit, (_, _, slots, length, _) in enumerate(patterns):
+            for d in range(width):
+                if d >= length:
+                    free[d] |= 1 << bit
+                    continue
+                required[d] |= 1 << bit
+                if d >= len(slots) or '*' in slots[d]:
+                    free[d] |= 1 << bit
+                    continue
+                for seg in slots[d]:
+                    accept[d][seg] |= 1 << bit
+        group['required'] = required
+        group['free'] = free
+        group['accept'] = [dict(a) for a in accept]
+
+    def find(self, transcription, starts = None):
+        """
+        Find the instances of every EnvironmentFilter in a Transcription
+
+        Parameters
+        ----------
+        transcription : Transcription
+            Transcription to search
+        starts : list of int, optional
+            Positions in the Transcription with word boundaries where
+            windows of the filters can start, such as from
+            `SegmentIndex.starts`, defaults to every position
+
+        Returns
+        -------
+        list
+            List with a list of matching Environments for each
+            EnvironmentFilter, in the same order as the filters, with the
+            same Environments as `Transcription.find`
+        """
+        found = [([], [], []) for _ in self.environments]
+        applicable = 0
+        for seg in set(transcription._list):
+            applicable |= self._middles.get(seg, 0)
+        if not applicable:
+            return [[] for _ in self.environments]
+        word = transcription.with_word_boundaries()
+        for skipped, group in self._groups.items():
+            patterns = group['patterns']
+            mask = 0
+            for bit, (env_index, _, _, _, _) in enumerate(patterns):
+                if applicable >> env_index & 1:
+                    mask |= 1 << bit
+            if not mask:
+                continue
+            if skipped:
+                sequence = [seg for pos, seg in enumerate(word) if pos not in skipped]
+                group_starts = None
+            else:
+                sequence = word
+                group_starts = starts
+            for start, matched in self._scan(group, sequence, mask, group_starts):
+                while matched:
+                    bit = (matched & -matched).bit_length() - 1
+                    matched &= matched - 1
+                    env_index, variant, _, length, lhs_num = patterns[bit]
+                    p = tuple(sequence[start:start + length])
+                    found[env_index][variant].append(Environment(p[lhs_num], start + lhs_num,
+                                                                 p[:lhs_num], p[lhs_num + 1:]))
+        return [main + lhs_variants + rhs_variants for main, lhs_variants, rhs_variants in found]
+
+    def _scan(self, group, sequence, mask, starts = None):
+        required = group['required']
+        free = group['free']
+        accept = group['accept']
+        width = len(required)
+        n = len(sequence)
+        if starts is None:
+            starts = range(n)
+        for start in starts:
+            matched = mask
+            for d in range(width):
+                if start + d < n:
+                    matched &= free[d] | accept[d].get(sequence[start + d], 0)
+                else:
+                    matched &= ~required[d]
+                if not matched:
+                    break
+            if matched:
+                yield start, matched
+
+
+class SegmentIndex(object):
+    """
+    Inverted index of the positions of segments and pairs of adjacent
+    segments in the words of a Corpus, kept up to date by
+    `Corpus.add_word` and `Corpus.remove_word`
+
+    Parameters
+    ----------
+    sequence_type : str
+        Tier of the words to index
+
+    Attributes
+    ----------
+    segments : dict
+        Dictionary with segments as keys, and dictionaries of the
+        positions of the segment in each word (counting the initial word
+        boundary), keyed by the identifier of the word in the Corpus, as
+        values
+    bigrams : dict
+        Same as `segments` for pairs of adjacent segments, including word
+        boundaries, with the position of the first segment
+    """
+    def __init__(self, sequence_type):
+        self.sequence_type = sequence_type
+        self.segments = collections.defaultdict(dict)
+        self.bigrams = collections.defaultdict(dict)
+        self._contents = {}
+        self._order = {}
+        self._count = 0
+
+    def add(self, key, word):
+        """
+        Add the segments of a Word, replacing any that were indexed for
+        its identifier
+        """
+        self.remove(key)
+        self._order[key] = self._count
+        self._count += 1
+        tier = getattr(word, self.sequence_type, None)
+        if not isinstance(tier, Transcription):
+            self._contents[key] = ((), ())
+            return
+        sequence = tier.with_word_boundaries()
+        for pos in range(1, len(sequence) - 1):
+            self.segments[sequence[pos]].setdefault(key, []).append(pos)
+        for pos in range(len(sequence) - 1):
+            self.bigrams[(sequence[pos], sequence[pos + 1])].setdefault(key, []).append(pos)
+        self._contents[key] = (set(sequence[1:-1]), set(zip(sequence, sequence[1:])))
+
+    def remove(self, key):
+        """
+        Remove the segments indexed for a Word identifier, if any
+        """
+        if key not in self._contents:
+            return
+        segments, bigrams = self._contents.pop(key)
+        del self._order[key]
+        for table, grams in ((self.segments, segments), (self.bigrams, bigrams)):
+            for gram in grams:
+                del table[gram][key]
+                if not table[gram]:
+                    del table[gram]
+
+    def words(self, segments):
+        """
+        Get the identifiers of the words that contain any of the segments
+
+        Parameters
+        ----------
+        segments : iterable
+            Segments to look up
+
+        Returns
+        -------
+        set
+            Identifiers of the words in the Corpus
+        """
+        keys = set()
+        for seg in segments:
+            keys.update(self.segments.get(seg, ()))
+        return keys
+
+    def candidates(self, environments):
+        """
+        Get the identifiers of the words that can contain a match for any
+        of the EnvironmentFilters, using the pairs of the middle segments
+        and their neighbours where possible
+
+        Parameters
+        ----------
+        environments : list of EnvironmentFilter
+            EnvironmentFilters to search for
+
+        Returns
+        -------
+        list
+            Identifiers of the words, in the order they were added to the
+            Corpus
+        """
+        keys = set()
+        for env in environments:
+            lhsZeroes, rhsZeroes = env.zeroPositions
+            if not lhsZeroes and not rhsZeroes:
+                if env.rhs and '*' not in env.rhs[0]:
+                    for m in env._middle:
+                        for r in env.rhs[0]:
+                            keys.update(self.bigrams.get((m, r), ()))
+                    continue
+                if env.lhs and '*' not in env.lhs[-1]:
+                    for l in env.lhs[-1]:
+                        for m in env._middle:
+                            keys.update(self.bigrams.get((l, m), ()))
+                    continue
+            keys.update(self.words(env._middle))
+        return sorted(keys, key = self._order.__getitem__)
+
+    def starts(self, key, environments):
+        """
+        Get the positions where windows of the EnvironmentFilters can
+        start in a word, from the positions of their middle segments
+
+        Parameters
+        ----------
+        key : str
+            Identifier of the word in the Corpus
+        environments : list of EnvironmentFilter
+            EnvironmentFilters to search for
+
+        Returns
+        -------
+        list or None
+            Sorted positions for `EnvironmentMatcher.find`, or None if any
+            position is possible
+        """
+        starts = set()
+        for env in environments:
+            if '*' in env._middle or '#' in env._middle:
+                return None
+            lhs_num = env.lhs_count()
+            for m in env._middle:
+                for pos in self.segments.get(m, {}).get(key, ()):
+                    if pos >= lhs_num:
+                        starts.add(pos - lhs_num)
+        return sorted(starts)
+
+
 class Attribute(object):
     """
     Attributes are for collecting summary information about attributes of
@@ -2450,6 +2719,9 @@ class Corpus(object):
                     }
     basic_attributes = ['spelling','transcription','frequency']
 
+    # SegmentIndex of each tier, built when first needed
+    _segment_indexes = None
+
     def __init__(self, name, update=False):
         if update:
             self.update(update)
@@ -2484,6 +2756,7 @@ class Corpus(object):
 
     def update_wordlist(self, new_wordlist):
         self.wordlist = dict()
+        self._segment_indexes = None
         for word in new_wordlist:
             self.add_word(word)
 
@@ -2528,6 +2801,7 @@ class Corpus(object):
             self.set_feature_matrix(other.specifier)
 
         self.inventory.segs.update(other.inventory.segs)
+        self._segment_indexes = None
         return self
 
     def key(self, word):
@@ -2591,6 +2865,7 @@ class Corpus(object):
     def retranscribe(self, segmap):
 
         self.inventory = Inventory()
+        self._segment_indexes = None
         for word in self.wordlist:
             T = Transcription([segmap[seg] for seg in self.wordlist[word].transcription])
             self.wordlist[word].transcription = T
@@ -2748,6 +3023,7 @@ class Corpus(object):
                 break
         else:
             self._attributes.append(attribute)
+        self._segment_indexes = None
         for word in self:
             word.add_abstract_tier(attribute.name,spec)
             attribute.update_range(getattr(word,attribute.name))
@@ -2772,6 +3048,8 @@ class Corpus(object):
         else:
             self._attributes.append(attribute)
         if initialize_defaults:
+            if self._segment_indexes:
+                self._segment_indexes.pop(attribute.name, None)
             for word in self:
                 word.add_attribute(attribute.name,attribute.default_value)
 
@@ -2841,6 +3119,7 @@ class Corpus(object):
         else:
             tier_segs = spec
         attribute._range = tier_segs
+        self._segment_indexes = None
         for word in self:
             word.add_tier(attribute.name,tier_segs)
 
@@ -2858,7 +3137,10 @@ class Corpus(object):
         try:
             del self.wordlist[word_key]
         except KeyError:
-            pass
+            return
+        if self._segment_indexes:
+            for index in self._segment_indexes.values():
+                index.remove(word_key)
 
     def remove_attribute(self, attribute):
         """
@@ -2881,11 +3163,15 @@ class Corpus(object):
                 break
         else:
             return
+        self._segment_indexes = None
         for word in self:
             word.remove_attribute(name)
 
     def __getstate__(self):
         state = self.__dict__
+        if '_segment_indexes' in state:
+            state = state.copy()
+            del state['_segment_indexes']
         return state
 
     def __setstate__(self, state):
@@ -2979,6 +3265,31 @@ class Corpus(object):
         for word in sorted_list:
             yield self.wordlist[word]
 
+    def get_segment_index(self, sequence_type = 'transcription'):
+        """
+        Generate (and cache) the SegmentIndex of a tier of the words in the
+        Corpus.  The index is kept up to date as words are added and
+        removed.
+
+        Parameters
+        ----------
+        sequence_type : str
+            Tier of the words to index, defaults to 'transcription'
+
+        Returns
+        -------
+        SegmentIndex
+            Index of the segments in the tier
+        """
+        if self._segment_indexes is None:
+            self._segment_indexes = {}
+        if sequence_type not in self._segment_indexes:
+            index = SegmentIndex(sequence_type)
+            for key, word in self.wordlist.items():
+                index.add(key, word)
+            self._segment_indexes[sequence_type] = index
+        return self._segment_indexes[sequence_type]
+
     def set_feature_matrix(self,matrix):
         """
         Set the feature system to be used by the corpus and make sure
@@ -3058,7 +3369,8 @@ class Corpus(object):
             if word.frequency == 0:
                 word.frequency += 1
 
-            self.wordlist[word.spelling] = word  #copy.copy(word)
+            key = word.spelling
+            self.wordlist[key] = word  #copy.copy(word)
             if word.spelling is not None:
                 if not self.has_spelling:
                     self.has_spelling = True
@@ -3084,6 +3396,10 @@ class Corpus(object):
                 word.add_attribute(a.name, a.default_value)
             a.update_range(getattr(word, a.name))
 
+        if self._segment_indexes:
+            for index in self._segment_indexes.values():
+                index.add(key, word)
+
         return added_default
 
     def update_features(self):
@@ -3262,6 +3578,7 @@ class Corpus(object):
 
     def __setitem__(self,item,value):
         self.wordlist[item] = value
+        self._segment_indexes = None
 
     def __getitem__(self,item):
         return self.wordlist[item]
@@ -173,6 +173,13 @@ class FuncLoadError(PCTError):
     """
     pass
 
+class InformativityError(PCTError):
+    """
+    Base error class for exceptions in informativity function
+    calls.
+    """
+    pass
+
 class KLError(PCTError):
     """
     Base error class for exceptions in Kullback-Leibler function
@@ -1,13 +1,118 @@
 #fun times with morphological relatedness
+from bisect import bisect_left, bisect_right
+from functools import partial
+
 import corpustools.symbolsim.phono_align as pam
-from corpustools.symbolsim.string_similarity import string_similarity
+from corpustools.symbolsim.string_similarity import relatedness_function, khorsi_frequency_base
+from corpustools.symbolsim.khorsi import khorsi_log_terms
+from corpustools.symbolsim.phono_edit_distance import get_aligner, _BOUND_TOLERANCE
+from corpustools.c_multiprocessing import map_mp
 from .io import print_freqalt_results
 
+def _blocking_keys(corpus_context, algorithm, words, min_rel, max_rel):
+    """
+    Get a key for each word and a function giving the range of keys of
+    the words it can be related to, given the relatedness thresholds.
+
+    For the edit distances the key is the length of a word, as each
+    segment of difference in length costs at least one insertion or
+    deletion.  For khorsi it is the sum of the log terms of a word's
+    segments, as the score of two words is at most twice the smaller of
+    their sums minus the larger one.
+
+    Returns
+    -------
+    list
+        Key of each word
+    callable or None
+        Function from a key to the smallest and largest keys of words
+        that can be related to it, or None if no pairs can be skipped
+    """
+    sequence_type = corpus_context.sequence_type
+    if algorithm == 'khorsi' and min_rel is not None:
+        log_terms = khorsi_log_terms(khorsi_frequency_base(corpus_context))
+        keys = [sum(log_terms[x] for x in getattr(w, sequence_type)) for w in words]
+        return keys, lambda key: ((key + min_rel) / 2 - _BOUND_TOLERANCE,
+                                    2 * key - min_rel + _BOUND_TOLERANCE)
+    keys = [len(getattr(w, sequence_type)) for w in words]
+    if max_rel is None:
+        return keys, None
+    if algorithm == 'edit_distance':
+        return keys, lambda key: (key - max_rel, key + max_rel)
+    if algorithm == 'phono_edit_distance':
+        aligner = get_aligner(corpus_context.specifier)
+        aligner.build_cost_tables()
+        min_cost = min(aligner.ins_cost_array.min(initial = float('inf')),
+                        aligner.del_cost_array.min(initial = float('inf')))
+        if min_cost <= 0 or min_cost == float('inf'):
+            return keys, None
+        max_difference = max_rel / min_cost + _BOUND_TOLERANCE
+        return keys, lambda key: (key - max_difference, key + max_difference)
+    return keys, None
+
+def _candidate_pairs(keys1, keys2, key_range):
+    """
+    Generate, for each word with the first segment, the indices of words
+    with the second segment that are not ruled out by `key_range`.
+    """
+    if key_range is None:
+        all_indices = list(range(len(keys2)))
+        for i in range(len(keys1)):
+            yield i, all_indices
+        return
+    order = sorted(range(len(keys2)), key = lambda j: keys2[j])
+    sorted_keys = [keys2[j] for j in order]
+    for i, key in enumerate(keys1):
+        low, high = key_range(key)
+        candidates = order[bisect_left(sorted_keys, low):bisect_right(sorted_keys, high)]
+        if candidates:
+            yield i, sorted(candidates)
+
+def _related_pairs_job(words1, words2, seg1, seg2, relate_func, min_rel, max_rel,
+                        min_pairs_okay, aligner, index1, candidates):
+    """
+    Find the words with the second segment that are related to one word
+    with the first segment.
+
+    Returns
+    -------
+    list
+        Tuples of the index of a related word in `words2` and the
+        relatedness score
+    """
+    w1 = words1[index1]
+    related = []
+    for index2 in candidates:
+        w2 = words2[index2]
+        if w1 == w2:
+            continue
+        score = relate_func(w1, w2)
+        if min_rel is not None and score < min_rel:
+            continue
+        if max_rel is not None and score > max_rel:
+            continue
+        if not min_pairs_okay:
+            if len(w1.transcription) == len(w2.transcription):
+                count_diff = 0
+                for i in range(len(w1.transcription)):
+                    if w1.transcription[i] != w2.transcription[i]:
+                        count_diff += 1
+                        if count_diff > 1:
+                            break
+                if count_diff == 1:
+                    continue
+        if aligner is not None:
+            if not aligner.morpho_related_sequences(w1.transcription, w2.transcription,
+                                                    seg1, seg2):
+                continue
+        related.append((index2, score))
+    return related
+
 
 def calc_freq_of_alt(corpus_context, seg1, seg2, algorithm, output_filename = None,
                     min_rel = None, max_rel = None, phono_align = False,
                     min_pairs_okay = False, stop_check = None,
-                    call_back = None):
+                    call_back = None, num_cores = -1):
     """Returns a double that is a measure of the frequency of
     alternation of two sounds in a given corpus
 
@@ -36,6 +141,9 @@ def calc_freq_of_alt(corpus_context, seg1, seg2, algorithm, output_filename = No
         Optional function to check whether to gracefully terminate early
     call_back : callable, optional
         Optional function to supply progress information during the function
+    num_cores : int, optional
+        Number of processes to compare words with, -1 or 1 to use only
+        the current one
 
     Returns
     -------
@@ -65,45 +173,44 @@ def calc_freq_of_alt(corpus_context, seg1, seg2, algorithm, output_filename = No
             list_seg2.append(w)
             all_words.add(w.spelling)
 
+    relate_func = relatedness_function(corpus_context, algorithm, max_rel)
+    if algorithm == 'khorsi' and min_rel is not None:
+        # Scores below min_rel are filtered out anyway
+        relate_func = partial(relate_func, max_distance = min_rel)
+    keys1, key_range = _blocking_keys(corpus_context, algorithm, list_seg1, min_rel, max_rel)
+    keys2, _ = _blocking_keys(corpus_context, algorithm, list_seg2, min_rel, max_rel)
+    jobs = list(_candidate_pairs(keys1, keys2, key_range))
+
+    if phono_align:
+        al = pam.Aligner(features = corpus_context.specifier)
+    else:
+        al = None
+    function = partial(_related_pairs_job, list_seg1, list_seg2, seg1, seg2, relate_func,
+                        min_rel, max_rel, min_pairs_okay, al)
+
     if call_back is not None:
         call_back('Calculating string similarities...')
-        call_back(0, len(list_seg1) * len(list_seg2))
+        call_back(0, len(jobs))
         cur = 0
-    related_list = []
-    if phono_align:
-        al = pam.Aligner(features = corpus_context.specifier)
-    for w1 in list_seg1:
-        for w2 in list_seg2:
+    if num_cores == -1 or num_cores == 1:
+        results = []
+        for job in jobs:
             if stop_check is not None and stop_check():
                 return
             if call_back is not None:
                 cur += 1
-                if cur % 1000 == 0:
-                    #print(len(related_list))
+                if cur % 10 == 0:
                     call_back(cur)
-            if w1 == w2:
-                continue
-            ss = string_similarity(corpus_context, (w1,w2), algorithm)
-            if min_rel is not None and ss[0][-1] < min_rel:
-                continue
-            if max_rel is not None and ss[0][-1] > max_rel:
-                continue
-            if not min_pairs_okay:
-                if len(w1.transcription) == len(w2.transcription):
-                    count_diff = 0
-                    for i in range(len(w1.transcription)):
-                        if w1.transcription[i] != w2.transcription[i]:
-                            count_diff += 1
-                            if count_diff > 1:
-                                break
-                    if count_diff == 1:
-                        continue
-            if phono_align:
-                alignment = al.align(w1.transcription, w2.transcription)
-                if not al.morpho_related(alignment, seg1, seg2):
-                    continue
+            results.append(function(*job))
+    else:
+        results = map_mp(function, jobs, num_cores, call_back = call_back, stop_check = stop_check)
+        if results is None:
+            return
 
-            related_list.append(ss[0])
+    related_list = []
+    for (index1, _), related in zip(jobs, results):
+        for index2, score in related:
+            related_list.append((list_seg1[index1], list_seg2[index2], score))
 
     words_with_alt = set()
     if call_back is not None:
@@ -3,12 +3,13 @@ from collections import defaultdict
 from math import *
 import itertools
 from math import factorial
-import time
+from functools import partial
 #from pprint import pprint
 
 from corpustools.exceptions import FuncLoadError
 from corpustools.funcload.io import save_minimal_pairs
 from corpustools.corpus.classes.lexicon import EnvironmentFilter
+from corpustools.c_multiprocessing import context_map_mp
 
 
 def is_minpair(first, second, corpus_context, segment_pairs, environment_filter):
@@ -117,6 +118,136 @@ def make_environment_re(environment_filter):
     return re_lhs + '_' + re_rhs
 
 
+class MinimalPairIndex(object):
+    """
+    Index of the words in a corpus that contain any of a set of target
+    segments, bucketed by their neutralized sequence (every target
+    segment replaced by a wildcard).
+
+    Two words can only be a minimal pair for the target segments if they
+    differ solely in target positions, so they always share a bucket and
+    candidate pairs can be read off the buckets instead of comparing
+    every pair of words.
+
+    Parameters
+    ----------
+    sequence_type : str
+        Tier of the Words to index
+    target_segments : iterable of str
+        Segments to neutralize
+
+    Attributes
+    ----------
+    words : list of Words
+        Words containing at least one target segment, in corpus order
+    buckets : dict
+        Keys are neutralized sequences and values are lists of indices
+        into `words`
+    """
+    wildcard = None
+
+    def __init__(self, sequence_type, target_segments):
+        self.sequence_type = sequence_type
+        self.target_segments = frozenset(target_segments)
+        self.words = []
+        self.buckets = defaultdict(list)
+
+    def neutralize(self, sequence):
+        """
+        Get the bucket key for a sequence
+
+        Parameters
+        ----------
+        sequence : Transcription or str
+            Sequence to neutralize
+
+        Returns
+        -------
+        tuple
+            Sequence with every target segment replaced by the wildcard
+        """
+        return tuple(self.wildcard if s in self.target_segments else s
+                     for s in sequence)
+
+    def add(self, word):
+        """
+        Add a Word to the index if it contains any target segment
+
+        Parameters
+        ----------
+        word : Word
+            Word to add
+        """
+        tier = getattr(word, self.sequence_type)
+        if not any(s in tier for s in self.target_segments):
+            return
+        self.buckets[self.neutralize(tier)].append(len(self.words))
+        self.words.append(word)
+
+    def candidate_pairs(self):
+        """
+        Get all pairs of words that share a bucket
+
+        Returns
+        -------
+        list of tuple(int, int)
+            Pairs of indices into `words`, in the same order as
+            ``itertools.combinations(words, 2)``
+        """
+        pairs = []
+        for bucket in self.buckets.values():
+            if len(bucket) > 1:
+                pairs.extend(itertools.combinations(bucket, 2))
+        pairs.sort()
+        return pairs
+
+
+def get_minpair_index(corpus_context, segment_pairs, stop_check=None, call_back=None):
+    """
+    Get (and cache) the MinimalPairIndex of a corpus for the segments in
+    segment_pairs.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    segment_pairs : list of length-2 tuples of str
+        The pairs of segments to be conflated.
+    stop_check : callable, optional
+        Optional function to check whether to gracefully terminate early
+    call_back : callable, optional
+        Optional function to supply progress information during the function
+
+    Returns
+    -------
+    MinimalPairIndex
+        The index, or None if the calculation was stopped
+    """
+    target_segments = frozenset(itertools.chain.from_iterable(segment_pairs))
+    key = (corpus_context.sequence_type, target_segments)
+    if key in corpus_context._minpair_index:
+        return corpus_context._minpair_index[key]
+
+    if call_back is not None:
+        call_back('Finding words with the specified segments...')
+        call_back(0, len(corpus_context))
+        cur = 0
+
+    index = MinimalPairIndex(corpus_context.sequence_type, target_segments)
+    for w in corpus_context:  # loops through the words in the context manager
+        if stop_check is not None and stop_check():
+            return
+        if call_back is not None:
+            cur += 1
+            if cur % 100 == 0:
+                call_back(cur)
+        index.add(w)
+    if stop_check is not None and stop_check():
+        return
+    corpus_context._minpair_index[key] = index
+    return index
+
+
 # This is the function I really edited
 # I changed the parameter called 'relative_count' to 'relative_count_to_relevant_sounds' and changed its default value.
 # I added a new parameter, 'relative_count_to_whole_corpus', and set its default to true.
@@ -177,42 +308,28 @@ def minpair_fl(corpus_context, segment_pairs,
 
     ## Filter out words that have none of the target segments
     ## (for relative_count_to_relevant_sounds as well as improving runtime)
-    contain_target_segment = []
-    if call_back is not None:
-        call_back('Finding words with the specified segments...')
-        call_back(0, len(corpus_context))
-        cur = 0
-
-    # creates a list of target segments from the list of tuples
-    all_target_segments = list(itertools.chain.from_iterable(segment_pairs))
-    for w in corpus_context:  # loops through the words in the context manager
-        if stop_check is not None and stop_check():
-            return
-        if call_back is not None:
-            cur += 1
-            if cur % 100 == 0:
-                call_back(cur)
-
-        tier = getattr(w, corpus_context.sequence_type)
-        if any([s in tier for s in all_target_segments]):
-            contain_target_segment.append(w)
-    if stop_check is not None and stop_check():
+    index = get_minpair_index(corpus_context, segment_pairs,
+                              stop_check=stop_check, call_back=call_back)
+    if index is None:
         return
+    contain_target_segment = index.words
 
     ## Find minimal pairs
     minpairs = []
+    candidates = index.candidate_pairs()
     if call_back is not None:
         call_back('Finding minimal pairs...')
-        if len(contain_target_segment) >= 2:
-            call_back(0, factorial(len(contain_target_segment)) / (factorial(len(contain_target_segment) - 2) * 2))
+        call_back(0, len(candidates))
         cur = 0
-    for first, second in itertools.combinations(contain_target_segment, 2):
+    for i, j in candidates:
         if stop_check is not None and stop_check():
             return
         if call_back is not None:
             cur += 1
             if cur % 100 == 0:
                 call_back(cur)
+        first = contain_target_segment[i]
+        second = contain_target_segment[j]
         if is_minpair(first, second, corpus_context, segment_pairs, environment_filter):
             ordered_pair = sorted([(first, getattr(first, corpus_context.sequence_type)),
                                    (second, getattr(second, corpus_context.sequence_type))],
@@ -330,6 +447,10 @@ def deltah_fl(corpus_context, segment_pairs, environment_filter=None, prevent_no
         call_back(0, len(list(original_probs.keys())))
         cur = 0
 
+    patterns = compile_environment_patterns(filled_environments)
+    # Transcriptions that differ only in stress, tone or morpheme boundaries
+    # share a string, so each string only needs neutralizing once
+    neutralized_forms = {}
     for k, v in original_probs.items():
         if stop_check is not None and stop_check():
             return
@@ -338,8 +459,15 @@ def deltah_fl(corpus_context, segment_pairs, environment_filter=None, prevent_no
             if cur % 100 == 0:
                 call_back(cur)
 
-
-        neutralized = neutralize_with_all_envs(k, filled_environments)
+        string = ''.join(k.with_word_boundaries())
+        try:
+            neutralized = neutralized_forms[string]
+        except KeyError:
+            if any(s in string for s in all_target_segments):
+                neutralized = neutralize_with_patterns(string, patterns)
+            else:
+                neutralized = string
+            neutralized_forms[string] = neutralized
         neutralized_probs[neutralized] += v
 
     if corpus_context.type_or_token == 'type':
@@ -360,22 +488,59 @@ def deltah_fl(corpus_context, segment_pairs, environment_filter=None, prevent_no
     return result
 
 
+def compile_environment_patterns(env_filters):
+    """
+    Compile the regular expressions of environment filters once, for use
+    with ``neutralize_with_patterns``.
+
+    Parameters
+    ----------
+    env_filters : list of EnvironmentFilter
+        Environment filters with the segments to neutralize as their
+        middle segments
+
+    Returns
+    -------
+    list
+        Compiled regular expressions, in the order of `env_filters`
+    """
+    return [re.compile(env_filter.generate_regular_expression()) for env_filter in env_filters]
+
+
+def neutralize_with_patterns(string, patterns):
+    """
+    Replace the middle segment of every match of each pattern in a string
+    with '-'.
+
+    The patterns are applied in turn, each one to the result of the
+    previous one, and all (overlapping) matches of a pattern are replaced
+    in one pass.
+
+    Parameters
+    ----------
+    string : str
+        Joined transcription, including word boundaries
+    patterns : list
+        Compiled patterns from ``compile_environment_patterns``
+
+    Returns
+    -------
+    str
+        The neutralized string
+    """
+    for pattern in patterns:
+        positions = [match.start('MID') for match in pattern.finditer(string, overlapped=True)]
+        if positions:
+            chars = list(string)
+            for i in positions:
+                chars[i] = '-'
+            string = ''.join(chars)
+    return string
+
+
 def neutralize_with_all_envs(trans, env_filters):
     string = ''.join(trans.with_word_boundaries())
-    length = len(string)
-    for env_filter in env_filters:
-        pattern = env_filter.generate_regular_expression()
-        for match in re.finditer(pattern, string, overlapped=True):
-            mid_index = match.start('MID')
-            temp = ''
-            for i in range(length):
-                if i == mid_index:
-                    s = '-'
-                else:
-                    s = string[i]
-                temp += s
-            string = temp
-    return string
+    return neutralize_with_patterns(string, compile_environment_patterns(env_filters))
 
 
 # This function is weirdly named. It should really be something like
@@ -387,7 +552,7 @@ def neutralize_with_all_envs(trans, env_filters):
 def relative_minpair_fl(corpus_context, segment,
                         relative_count_to_relevant_sounds=False, relative_count_to_whole_corpus=True,
                         distinguish_homophones=False, output_filename=None, environment_filter=None,
-                        prevent_normalization=False, stop_check=None, call_back=None):
+                        prevent_normalization=False, num_cores=-1, stop_check=None, call_back=None):
     """Calculate the average functional load of the contrasts between a
     segment and all other segments, as a count of minimal pairs.
 
@@ -412,6 +577,9 @@ def relative_minpair_fl(corpus_context, segment,
     environment_filter : EnvironmentFilter
         Allows the user to restrict the neutralization process to segments in
         particular segmental contexts
+    num_cores : int, optional
+        Number of processes to spread the segment pairs over. Defaults
+        to -1, which calculates them one after another in this process.
     stop_check : callable, optional
         Optional function to check whether to gracefully terminate early
     call_back : callable, optional
@@ -433,14 +601,33 @@ def relative_minpair_fl(corpus_context, segment,
 
     results = []
     to_output = []
-    for sp in segment_pairs:
-        res = minpair_fl(corpus_context, [sp],
-                         relative_count_to_relevant_sounds=relative_count_to_relevant_sounds,
-                         relative_count_to_whole_corpus=relative_count_to_whole_corpus,
-                         distinguish_homophones=distinguish_homophones,
-                         environment_filter=environment_filter,
-                         prevent_normalization=prevent_normalization,
-                         stop_check=stop_check, call_back=call_back)
+    if num_cores == -1 or num_cores == 1:
+        all_res = []
+        for sp in segment_pairs:
+            res = minpair_fl(corpus_context, [sp],
+                             relative_count_to_relevant_sounds=relative_count_to_relevant_sounds,
+                             relative_count_to_whole_corpus=relative_count_to_whole_corpus,
+                             distinguish_homophones=distinguish_homophones,
+                             environment_filter=environment_filter,
+                             prevent_normalization=prevent_normalization,
+                             stop_check=stop_check, call_back=call_back)
+            if res is None:
+                return
+            all_res.append(res)
+    else:
+        function = partial(minpair_fl,
+                           relative_count_to_relevant_sounds=relative_count_to_relevant_sounds,
+                           relative_count_to_whole_corpus=relative_count_to_whole_corpus,
+                           distinguish_homophones=distinguish_homophones,
+                           environment_filter=environment_filter,
+                           prevent_normalization=prevent_normalization)
+        if call_back is not None:
+            call_back('Calculating functional loads...')
+        all_res = context_map_mp(corpus_context, function, [([sp],) for sp in segment_pairs],
+                                 num_cores, call_back=call_back, stop_check=stop_check)
+        if all_res is None:
+            return
+    for sp, res in zip(segment_pairs, all_res):
         results.append(res[0])
 
         if output_filename is not None:
@@ -452,7 +639,7 @@ def relative_minpair_fl(corpus_context, segment,
 
 def relative_deltah_fl(corpus_context, segment,
                        environment_filter=None, prevent_normalization=False,
-                       stop_check=None, call_back=None):
+                       num_cores=-1, stop_check=None, call_back=None):
     """Calculate the average functional load of the contrasts between a
     segment and all other segments, as the decrease in corpus entropy
     caused by a merger.
@@ -463,6 +650,9 @@ def relative_deltah_fl(corpus_context, segment,
         Context manager for a corpus
     segment : str
         The target segment.
+    num_cores : int, optional
+        Number of processes to spread the segment pairs over. Defaults
+        to -1, which calculates them one after another in this process.
     stop_check : callable, optional
         Optional function to check whether to gracefully terminate early
     call_back : callable, optional
@@ -479,11 +669,24 @@ def relative_deltah_fl(corpus_context, segment,
     segment_pairs = [(segment, other.symbol) for other in all_segments
                      if other.symbol != segment and other.symbol != '#']
 
-    results = []
-    for sp in segment_pairs:
-        results.append(deltah_fl(corpus_context, [sp], prevent_normalization=prevent_normalization,
-                                 environment_filter=environment_filter,
-                                 stop_check=stop_check, call_back=call_back))
+    if num_cores == -1 or num_cores == 1:
+        results = []
+        for sp in segment_pairs:
+            res = deltah_fl(corpus_context, [sp], prevent_normalization=prevent_normalization,
+                            environment_filter=environment_filter,
+                            stop_check=stop_check, call_back=call_back)
+            if res is None:
+                return
+            results.append(res)
+    else:
+        function = partial(deltah_fl, prevent_normalization=prevent_normalization,
+                           environment_filter=environment_filter)
+        if call_back is not None:
+            call_back('Calculating functional loads...')
+        results = context_map_mp(corpus_context, function, [([sp],) for sp in segment_pairs],
+                                 num_cores, call_back=call_back, stop_check=stop_check)
+        if results is None:
+            return
     return sum(results) / len(segment_pairs)
 
 
@@ -552,8 +755,8 @@ def all_pairwise_fls(corpus_context, relative_fl=False,
                      algorithm='minpair',
                      relative_count_to_relevant_sounds=False, relative_count_to_whole_corpus=True,
                      distinguish_homophones=False,
-                     environment_filter=None,
-                     call_back=None, stop_check=None):
+                     environment_filter=None, prevent_normalization=False,
+                     num_cores=-1, call_back=None, stop_check=None):
     """Calculate the functional load of the contrast between two segments as a count of minimal pairs.
     This version calculates the functional load for ALL pairs of segments in the inventory,
     which could be useful for visually mapping out phoneme inventories.
@@ -583,6 +786,16 @@ def all_pairwise_fls(corpus_context, relative_fl=False,
     environment_filter : EnvironmentFilter
         Allows the user to restrict the neutralization process to segments in
         particular segmental contexts
+    prevent_normalization : bool, optional
+        For deltah, if True, do not divide the change in entropy by the
+        entropy before the merger.
+    num_cores : int, optional
+        Number of processes to spread the segment pairs over. Defaults
+        to -1, which calculates them all in this process.
+    stop_check : callable, optional
+        Optional function to check whether to gracefully terminate early
+    call_back : callable, optional
+        Optional function to supply progress information during the function
 
     Returns
     -------
@@ -592,38 +805,53 @@ def all_pairwise_fls(corpus_context, relative_fl=False,
         Normally returns a list of all Segment pairs and their respective functional load values, as length-2 tuples ordered by FL.
         If calculating relative FL (i.e., average FL for a segment), returns a dictionary of each segment and its relative (average) FL, with entries ordered by FL.
     """
-    fls = {}
-    total_calculations = ((((len(corpus_context.inventory) - 1) ** 2) - len(corpus_context.inventory) - 1) / 2) + 1
-    ct = 1
-    t = time.time()
     if '' in corpus_context.inventory:
         raise Exception(
             'Warning: Calculation of functional load for all segment pairs requires that all items in corpus have a non-null transcription.')
 
-    # Count the number of words in the corpus (needed if relative_count_to_whole_corpus is True)
-    num_words_in_corpus = len(corpus_context.corpus)
-
+    segment_pairs = []
     for i, s1 in enumerate(corpus_context.inventory[:-1]):
         for s2 in corpus_context.inventory[i + 1:]:
             if s1 != '#' and s2 != '#':
-                print('Performing FL calculation {} out of {} possible'.format(str(ct), str(total_calculations)))
-                ct += 1
-                print('Duration of last calculation: {}'.format(str(time.time() - t)))
-                t = time.time()
                 if type(s1) != str:
                     s1 = s1.symbol
                 if type(s2) != str:
                     s2 = s2.symbol
-                if algorithm == 'minpair':
-                    fl = minpair_fl(corpus_context, [(s1, s2)],
-                                    relative_count_to_relevant_sounds=relative_count_to_relevant_sounds,
-                                    relative_count_to_whole_corpus=relative_count_to_whole_corpus,
-                                    distinguish_homophones=distinguish_homophones,
-                                    environment_filter=environment_filter)[0]
-                elif algorithm == 'deltah':
-                    fl = deltah_fl(corpus_context, [(s1, s2)],
-                                   environment_filter=environment_filter)
-                fls[(s1, s2)] = fl
+                segment_pairs.append((s1, s2))
+
+    if algorithm == 'minpair':
+        function = partial(pairwise_minpair_fls,
+                           relative_count_to_relevant_sounds=relative_count_to_relevant_sounds,
+                           relative_count_to_whole_corpus=relative_count_to_whole_corpus,
+                           distinguish_homophones=distinguish_homophones,
+                           environment_filter=environment_filter)
+    elif algorithm == 'deltah':
+        function = partial(pairwise_deltah_fls,
+                           environment_filter=environment_filter,
+                           prevent_normalization=prevent_normalization)
+    else:
+        raise FuncLoadError('Algorithm must be either \'minpair\' or \'deltah\'.')
+
+    if num_cores == -1 or num_cores == 1:
+        fls = function(corpus_context, segment_pairs,
+                       stop_check=stop_check, call_back=call_back)
+    else:
+        # Several chunks per process keeps the processes busy when some
+        # chunks take longer than others, and gives finer progress
+        num_chunks = min(len(segment_pairs), num_cores * 4)
+        jobs = [(segment_pairs[i::num_chunks],) for i in range(num_chunks)]
+        if call_back is not None:
+            call_back('Calculating functional loads...')
+        chunk_fls = context_map_mp(corpus_context, function, jobs, num_cores,
+                                   call_back=call_back, stop_check=stop_check)
+        if chunk_fls is None:
+            return
+        merged = {}
+        for f in chunk_fls:
+            merged.update(f)
+        fls = {pair: merged[pair] for pair in segment_pairs}
+    if fls is None:
+        return
     if not relative_fl:
         ordered_fls = sorted([(pair, fls[pair]) for pair in fls], key=lambda p: p[1], reverse=True)
         return ordered_fls
@@ -641,17 +869,74 @@ def all_pairwise_fls(corpus_context, relative_fl=False,
         ordered_rel_fls = sorted([(s, rel_fls[s]) for s in rel_fls], key=lambda p: p[1], reverse=True)
         return ordered_rel_fls
 
-    ## Filter out words that have none of the target segments
-    ## (for relative_count_to_relevant_sounds as well as improving runtime)
-    contain_target_segment = []
+
+def _segments_in(tier, segments):
+    """
+    Get the segments of interest that occur in a tier, using the same
+    membership test as ``minpair_fl``.
+    """
+    if isinstance(tier, str):
+        return frozenset(s for s in segments if s in tier)
+    return frozenset(tier) & segments
+
+
+def pairwise_minpair_fls(corpus_context, segment_pairs,
+                         relative_count_to_relevant_sounds=False, relative_count_to_whole_corpus=True,
+                         distinguish_homophones=False, environment_filter=None,
+                         stop_check=None, call_back=None):
+    """Calculate the minimal pair functional load of many segment pairs in
+    a single pass over the corpus.
+
+    Every word is indexed under its sequence with one segment, or both
+    segments of a pair, replaced by a wildcard. Two words can only be a
+    minimal pair for (s1, s2) if they share the key that masks every
+    occurrence of s1 and s2 in each of them, so candidate pairs for all
+    segment pairs can be read off the same index. The result for each
+    pair is the same as ``minpair_fl(corpus_context, [pair], ...)[0]``.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    segment_pairs : list of length-2 tuples of str
+        The pairs of segments to calculate functional load for, each
+        pair separately.
+    relative_count_to_relevant_sounds : bool, optional
+        If True, divide the number of minimal pairs by
+        by the total number of words that contain either of the two segments.
+    relative_count_to_whole_corpus : bool, optional
+        If True, divide the number of minimal pairs by the total number of words
+        in the corpus (regardless of whether those words contain the target sounds).
+        Defaults to True.
+    distinguish_homophones : bool, optional
+        If False, count minimal pairs with identical transcriptions only once.
+    environment_filter : EnvironmentFilter
+        Allows the user to restrict the neutralization process to segments in
+        particular segmental contexts
+    stop_check : callable, optional
+        Optional function to check whether to gracefully terminate early
+    call_back : callable, optional
+        Optional function to supply progress information during the function
+
+    Returns
+    -------
+    dict
+        Keys are the segment pairs and values are their functional loads
+    """
+    num_words_in_corpus = len(corpus_context.corpus)
+    segments = frozenset(itertools.chain.from_iterable(segment_pairs))
+    requested = set(frozenset(pair) for pair in segment_pairs)
+
     if call_back is not None:
-        call_back('Finding words with the specified segments...')
+        call_back('Indexing words...')
         call_back(0, len(corpus_context))
         cur = 0
-
-    all_target_segments = list(
-        itertools.chain.from_iterable(segment_pairs))  # creates a list of target segments from the list of tuples
-    for w in corpus_context:  # loops through the words in the context manager
+    words = []
+    contained = []
+    segment_counts = defaultdict(int)
+    cooccurrence_counts = defaultdict(int)
+    buckets = defaultdict(list)
+    for w in corpus_context:
         if stop_check is not None and stop_check():
             return
         if call_back is not None:
@@ -659,57 +944,202 @@ def all_pairwise_fls(corpus_context, relative_fl=False,
             if cur % 100 == 0:
                 call_back(cur)
         tier = getattr(w, corpus_context.sequence_type)
-        if any([s in tier for s in all_target_segments]):
-            contain_target_segment.append(w)
-    if stop_check is not None and stop_check():
-        return
+        present = _segments_in(tier, segments)
+        if not present:
+            continue
+        index = len(words)
+        words.append(w)
+        contained.append(present)
+        for x in present:
+            segment_counts[x] += 1
+        for masked in itertools.chain(((x,) for x in present),
+                                      itertools.combinations(sorted(present), 2)):
+            masked = frozenset(masked)
+            if len(masked) == 2:
+                if masked not in requested:
+                    continue
+                cooccurrence_counts[masked] += 1
+            key = tuple(None if s in masked else s for s in tier)
+            buckets[key].append((index, masked))
 
-    ## Find minimal pairs
-    minpairs = []
     if call_back is not None:
         call_back('Finding minimal pairs...')
-        if len(contain_target_segment) >= 2:
-            call_back(0, factorial(len(contain_target_segment)) / (factorial(len(contain_target_segment) - 2) * 2))
+        call_back(0, len(buckets))
         cur = 0
-    for first, second in itertools.combinations(contain_target_segment, 2):
+    minpairs = defaultdict(list)
+    for bucket in buckets.values():
         if stop_check is not None and stop_check():
             return
         if call_back is not None:
             cur += 1
-            if cur % 100 == 0:
+            if cur % 1000 == 0:
                 call_back(cur)
-        if is_minpair(first, second, corpus_context, segment_pairs, environment_filter):
-            ordered_pair = sorted([(first, getattr(first, corpus_context.sequence_type)),
-                                   (second, getattr(second, corpus_context.sequence_type))],
-                                  key=lambda x: x[1])  # sort by tier/transcription
-            minpairs.append(tuple(ordered_pair))
+        for (i, masked_i), (j, masked_j) in itertools.combinations(bucket, 2):
+            if i == j:
+                continue
+            pair = masked_i | masked_j
+            if len(pair) != 2 or pair not in requested:
+                continue
+            if masked_i != pair & contained[i] or masked_j != pair & contained[j]:
+                continue
+            if i > j:
+                i, j = j, i
+            first = words[i]
+            second = words[j]
+            if is_minpair(first, second, corpus_context, [tuple(pair)], environment_filter):
+                minpairs[pair].append(tuple(sorted([getattr(first, corpus_context.sequence_type),
+                                                    getattr(second, corpus_context.sequence_type)])))
 
-    ## Generate output
-    if not distinguish_homophones:
-        actual_minpairs = {}
+    fls = {}
+    for s1, s2 in segment_pairs:
+        pair = frozenset((s1, s2))
+        if distinguish_homophones:
+            result = len(minpairs[pair])
+        else:
+            result = len(set(minpairs[pair]))
+        num_relevant = segment_counts[s1] + segment_counts[s2] - cooccurrence_counts[pair]
+        if relative_count_to_relevant_sounds and num_relevant > 0:
+            result = result / num_relevant
+        elif relative_count_to_whole_corpus:
+            result = result / num_words_in_corpus
+        fls[(s1, s2)] = result
+    return fls
 
-        for pair in minpairs:
-            if stop_check is not None and stop_check():
+
+def pairwise_deltah_fls(corpus_context, segment_pairs, environment_filter=None,
+                        prevent_normalization=False, stop_check=None, call_back=None):
+    """Calculate the change in entropy functional load of many segment
+    pairs from one shared table of transcription frequencies.
+
+    Only the transcriptions that contain one of the two segments change
+    when they are merged, so the entropy after each merger is computed
+    from the groups of those transcriptions rather than from the whole
+    corpus. The result for each pair is the same as
+    ``deltah_fl(corpus_context, [pair], ...)``.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    segment_pairs : list of length-2 tuples of str
+        The pairs of segments to calculate functional load for, each
+        pair separately.
+    environment_filter : EnvironmentFilter
+        Allows the user to restrict the neutralization process to segments in
+        particular segmental contexts
+    prevent_normalization : bool, optional
+        If True, do not divide the change in entropy by the entropy
+        before the merger.
+    stop_check : callable, optional
+        Optional function to check whether to gracefully terminate early
+    call_back : callable, optional
+        Optional function to supply progress information during the function
+
+    Returns
+    -------
+    dict
+        Keys are the segment pairs and values are their functional loads
+    """
+    if call_back is not None:
+        call_back('Finding instances of segments...')
+        call_back(0, len(corpus_context))
+        cur = 0
+
+    freq_sum = 0
+    original = defaultdict(float)
+    for w in corpus_context:
+        if stop_check is not None and stop_check():
+            return
+        if call_back is not None:
+            cur += 1
+            if cur % 100 == 0:
+                call_back(cur)
+        f = w.frequency
+        original[getattr(w, corpus_context.sequence_type)] += f
+        freq_sum += f
+
+    strings = {k: ''.join(k.with_word_boundaries()) for k in original}
+    symbols = set(itertools.chain.from_iterable(original))
+    if (len(set(strings.values())) != len(strings)
+            or any('-' in s for s in symbols)):
+        # Joined transcriptions are ambiguous, so the merged groups cannot
+        # be worked out from the transcriptions that change
+        fls = {}
+        for pair in segment_pairs:
+            fl = deltah_fl(corpus_context, [pair], environment_filter=environment_filter,
+                           prevent_normalization=prevent_normalization,
+                           stop_check=stop_check)
+            if fl is None:
                 return
-            key = (pair[0][1], pair[1][1])  # Keys are tuples of transcriptions
-            if key not in actual_minpairs:
-                actual_minpairs[key] = (pair[0][0], pair[1][0])  # Values are words
-            else:
-                pair_freq = pair[0][0].frequency + pair[1][0].frequency
-                existing_freq = actual_minpairs[key][0].frequency + \
-                                actual_minpairs[key][1].frequency
-                if pair_freq > existing_freq:
-                    actual_minpairs[key] = (pair[0][0], pair[1][0])
-        result = sum((x[0].frequency + x[1].frequency) / 2
-                     for x in actual_minpairs.values())
+            fls[pair] = fl
+        return fls
+
+    if corpus_context.type_or_token == 'type':
+        preneutr_h = log(len(original), 2)
     else:
-        result = sum((x[0][0].frequency + x[1][0].frequency) / 2 for x in minpairs)
+        original_probs = {k: v / freq_sum for k, v in original.items()}
+        preneutr_h = entropy(original_probs.values())
 
-    if relative_count_to_relevant_sounds and len(contain_target_segment) > 0:
-        result /= sum(x.frequency for x in contain_target_segment)
+    single_char = all(len(s) == 1 for s in symbols)
+    containing = defaultdict(list)
+    segments = set(itertools.chain.from_iterable(segment_pairs))
+    for k, string in strings.items():
+        for s in segments:
+            if s in string:
+                containing[s].append(k)
 
-    # added what to do if the relative count to the whole corpus is true, namely, divide by the number of words in the corpus
-    elif relative_count_to_whole_corpus:
-        result = result / num_words_in_corpus
+    if call_back is not None:
+        call_back('Neutralizing instances of segments...')
+        call_back(0, len(segment_pairs))
+        cur = 0
+    fls = {}
+    for s1, s2 in segment_pairs:
+        if stop_check is not None and stop_check():
+            return
+        if call_back is not None:
+            cur += 1
+            call_back(cur)
+        all_target_segments = [s1, s2]
+        if environment_filter:
+            filled_environments = [EnvironmentFilter(tuple(all_target_segments), env.lhs, env.rhs)
+                                   for env in environment_filter]
+        else:
+            filled_environments = None
+            if single_char:
+                table = str.maketrans({s1: '-', s2: '-'})
+            else:
+                filled_environments = [EnvironmentFilter(middle_segments=tuple(all_target_segments),
+                                                         lhs=list(),
+                                                         rhs=list())]
+        if filled_environments is not None:
+            patterns = compile_environment_patterns(filled_environments)
+
+        groups = defaultdict(list)
+        for k in set(containing[s1]) | set(containing[s2]):
+            if filled_environments is None:
+                neutralized = strings[k].translate(table)
+            else:
+                neutralized = neutralize_with_patterns(strings[k], patterns)
+            groups[neutralized].append(k)
 
-    return (result, minpairs)
+        if corpus_context.type_or_token == 'type':
+            num_merged = sum(len(g) - 1 for g in groups.values())
+            postneutr_h = log(len(original) - num_merged, 2)
+            result = preneutr_h - postneutr_h
+        else:
+            result = 0.0
+            for g in groups.values():
+                if len(g) < 2:
+                    continue
+                merged = sum(original_probs[k] for k in g)
+                result += merged * log(merged, 2) if merged > 0 else 0
+                result -= sum(original_probs[k] * log(original_probs[k], 2)
+                              for k in g if original_probs[k] > 0)
+
+        if result < 1e-10:
+            result = 0.0
+
+        if not prevent_normalization and preneutr_h > 0.0:
+            result = result / preneutr_h
+        fls[(s1, s2)] = result
+    return fls
@@ -32,10 +32,11 @@ class FAWorker(FunctionWorker):
                                 kwargs['algorithm'],
                                 min_rel=kwargs['min_rel'], max_rel=kwargs['max_rel'],
                                 min_pairs_okay=kwargs['include_minimal_pairs'],
-                                from_gui = True, phono_align=kwargs['phono_align'],
+                                phono_align=kwargs['phono_align'],
                                 output_filename=kwargs['output_filename'],
                                 stop_check = kwargs['stop_check'],
-                                call_back = kwargs['call_back'])
+                                call_back = kwargs['call_back'],
+                                num_cores = kwargs['num_cores'])
                     if self.stopped:
                         break
                     self.results.append(res)
@@ -320,6 +321,7 @@ class FADialog(FunctionDialog):
         kwargs['pair_behavior'] = pairBehaviour
         kwargs['frequency_cutoff'] = frequency_cutoff
         kwargs['output_filename'] = out_file
+        kwargs['num_cores'] = self.settings['num_cores']
         return kwargs
 
     def setResults(self, results):
@@ -55,7 +55,10 @@ class InformativityDialog(FunctionDialog):
         optionsLayout.addWidget(self.tierSelect)
 
         self.precedingContext = RadioSelectWidget('Preceding context',
-                                                  OrderedDict([('All preceding segments', 'all')]))
+                                                  OrderedDict([('All preceding segments', 'all'),
+                                                               ('One preceding segment', 1),
+                                                               ('Two preceding segments', 2),
+                                                               ('Three preceding segments', 3)]))
         optionsLayout.addWidget(self.precedingContext)
 
         self.typeTokenWidget = RadioSelectWidget('Type or token frequencies',
@@ -156,7 +159,8 @@ class InformativityWorker(FunctionWorker):
                 #         self.stopped = True #result is None if user cancelled
                 # else:
                 results = informativity.get_multiple_informativity(c, kwargs['segs'], sequence_type, type_or_token=kwargs['type_or_token'],
-                            rounding=rounding, stop_check= kwargs['stop_check'], call_back=kwargs['call_back'])
+                            rounding=rounding, stop_check= kwargs['stop_check'], call_back=kwargs['call_back'],
+                            preceding_context=kwargs['preceding_context'])
                 try:
                     for result in results:
                         result.pop('Rounding')
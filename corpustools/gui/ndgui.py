@@ -1,5 +1,6 @@
 import os
-from collections import OrderedDict, defaultdict
+import copy
+from collections import OrderedDict
 
 from .imports import *
 from corpustools.neighdens.neighborhood_density import (neighborhood_density,
@@ -33,36 +34,19 @@ class NDWorker(FunctionWorker):
 
         with cm(corpus, st, tt, attribute=att, frequency_threshold = ft) as c:
             try:
-                tierdict = defaultdict(list)
-                # Create a dict with sequence_type keys for constant-time lookup
-                for entry in c:
-                    w = getattr(entry, kwargs['sequence_type'])
-                    key = str(w)
-                    tierdict[key].append(entry)
                 if 'query' in kwargs:#this will be true when searching for a single word (in the corpus or not)
-                    last_value_removed = None
-                    last_key_removed = None
                     for q in kwargs['query']:
                         q = ensure_query_is_word(q, c, c.sequence_type, kwargs['tier_type'])
-                        #the following code for adding/removing keys is to ensure that homophones are counted later in
-                        #the ND algorithm (if the user wants to), but that words are not considered their own neighbours
-                        #however, we only do this when comparing inside a corpus. when using a list of external words
-                        #we don't want to do this, since it's possible for the external list to contain words that
-                        #are in the corpus, and removing them gives the wrong ND value in this case
-                        if kwargs['in_corpus']:
-                            if last_value_removed:
-                                tierdict[last_key_removed].append(last_value_removed)
-                            w = getattr(q, kwargs['sequence_type'])
-                            last_key_removed = str(w)
-                            #last_value_removed = tierdict[last_key_removed].pop()
-                            for i, item in enumerate(tierdict[last_key_removed]):
-                                if str(item) == str(q):
-                                    last_value_removed = tierdict[last_key_removed].pop(i)
-                                    break
+                        #the ND algorithms never count a corpus word as its own neighbour, but homophones
+                        #are still counted (if the user wants to). when using a list of external words, a word
+                        #that is also in the corpus should count the corpus word as a neighbour, so it is
+                        #compared as a new word instead
+                        if not kwargs['in_corpus']:
+                            q = copy.copy(q)
 
                         #now we call the actual ND algorithms
                         if kwargs['algorithm'] != 'substitution':
-                            res = neighborhood_density(c, q, tierdict,
+                            res = neighborhood_density(c, q,
                                                 algorithm = kwargs['algorithm'],
                                                 max_distance = kwargs['max_distance'],
                                                 force_quadratic=kwargs['force_quadratic'],
@@ -88,7 +72,7 @@ class NDWorker(FunctionWorker):
                 else:#this will be the case if searching the entire corpus
                     end = kwargs['corpusModel'].beginAddColumn(att)
                     if kwargs['algorithm'] != 'substitution':
-                        results = neighborhood_density_all_words(c, tierdict,
+                        results = neighborhood_density_all_words(c,
                                                 tier_type = kwargs['tier_type'],
                                                 algorithm = kwargs['algorithm'],
                                                 output_format = kwargs['output_format'],
@@ -100,7 +84,7 @@ class NDWorker(FunctionWorker):
                                                 collapse_homophones = kwargs['collapse_homophones']
                                                 )
                     else:
-                        results = find_mutation_minpairs_all_words(c, tierdict,
+                        results = find_mutation_minpairs_all_words(c,
                                                 tier_type = kwargs['tier_type'],
                                                 collapse_homophones = kwargs['collapse_homophones'],
                                                 num_cores = kwargs['num_cores'],
@@ -332,9 +316,9 @@ class NDDialog(FunctionDialog):
             self.fileWidget.setToolTip(loadFromFileTip)
             self.fileRadio.setToolTip(loadFromFileTip)
 
-            self.useQuadratic.setToolTip(('<FONT COLOR=black>If this box is checked, PCT will use an algorithm '
-            'specific to calculating neighborhood density based on a maximum edit distance of 1. '
-            'This algorithm may be faster than the general-purpose algorithm, '
+            self.useQuadratic.setToolTip(('<FONT COLOR=black>If this box is checked, PCT will compare '
+            'the query with every word in the corpus in turn, instead of looking up its neighbors '
+            'in an index of the corpus. This general-purpose algorithm is slower, '
             'especially on very large corpora.</FONT>'))
 
             self.algorithmWidget.setToolTip(("<FONT COLOR=black>"
@@ -404,9 +388,6 @@ class NDDialog(FunctionDialog):
 
     def generateKwargs(self):
 
-        if self.useQuadratic.isChecked() and int(self.maxDistanceEdit.text()) != 1:
-            self.useQuadratic.setChecked(False)
-
         if self.maxDistanceEdit.text() == '':
             max_distance = None
         else:
@@ -2,7 +2,7 @@ import os
 from collections import OrderedDict
 
 from .imports import *
-from corpustools.phonoprob.phonotactic_probability import (phonotactic_probability,
+from corpustools.phonoprob.phonotactic_probability import (phonotactic_probabilities,
                                                     phonotactic_probability_all_words)
 from corpustools.neighdens.io import load_words_neighden
 from corpustools.corpus.classes import Attribute
@@ -31,21 +31,20 @@ class PPWorker(FunctionWorker):
         with cm(corpus, st, tt, attribute=att, frequency_threshold = ft, log_count=log_count) as c:
             try:
                 if 'query' in kwargs:
-                    for q in kwargs['query']:
-                        res = phonotactic_probability(c, q,
+                    res = phonotactic_probabilities(c, kwargs['query'],
                                             algorithm = kwargs['algorithm'],
                                             probability_type = kwargs['probability_type'],
+                                            num_cores = kwargs['num_cores'],
                                             stop_check = kwargs['stop_check'],
                                             call_back = kwargs['call_back'])
-                        if self.stopped:
-                            break
-                        self.results.append([q,res])
+                    if not self.stopped:
+                        self.results = [[q,r] for q, r in zip(kwargs['query'], res)]
                 else:
                     end = kwargs['corpusModel'].beginAddColumn(att)
                     phonotactic_probability_all_words(c,
                                             algorithm = kwargs['algorithm'],
                                             probability_type = kwargs['probability_type'],
-                                            #num_cores = kwargs['num_cores'],
+                                            num_cores = kwargs['num_cores'],
                                             stop_check = kwargs['stop_check'],
                                             call_back = kwargs['call_back'])
                     end = kwargs['corpusModel'].endAddColumn(end)
@@ -271,6 +270,7 @@ class PPDialog(FunctionDialog):
                 'type_token':self.typeTokenWidget.value(),
                 'frequency_cutoff':frequency_cutoff,
                 'probability_type':self.probabilityTypeWidget.value(),
+                'num_cores':self.settings['num_cores'],
                 'log_count': self.useLogScale.isEnabled() and self.useLogScale.isChecked()}
 
         if self.compType is None:
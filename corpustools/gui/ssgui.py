@@ -196,10 +196,12 @@ class SSDialog(FunctionDialog):
 
         self.minEdit = QLineEdit()
         self.maxEdit = QLineEdit()
+        self.topKEdit = QLineEdit()
 
         vbox = QFormLayout()
         vbox.addRow('Minimum:', self.minEdit)
         vbox.addRow('Maximum:', self.maxEdit)
+        vbox.addRow('Most similar words only\n(one word to all, blank for all):', self.topKEdit)
 
         threshFrame.setLayout(vbox)
 
@@ -249,6 +251,9 @@ class SSDialog(FunctionDialog):
                                     ' scores for the algorithm to filter out.  For example, a minimum'
                                     ' of -10 for Khorsi or a maximum of 8 for edit distance will likely'
                                     ' filter out words that are highly different from each other.'
+                                    ' Specifying a number of most similar words returns only that'
+                                    ' many words when comparing one word to the corpus, which is'
+                                    ' much faster for large corpora.'
                                     "</FONT>"))
 
     def clearCreated(self):
@@ -319,6 +324,12 @@ class SSDialog(FunctionDialog):
                 max_rel = float(self.maxEdit.text())
             except ValueError:
                 pass
+        top_k = None
+        if self.topKEdit.text() != '':
+            try:
+                top_k = int(self.topKEdit.text())
+            except ValueError:
+                pass
         kwargs = {'corpusModel': self.corpusModel,
                   'context': self.variantsWidget.value(),
                   'algorithm': self.algorithmWidget.value(),
@@ -326,7 +337,9 @@ class SSDialog(FunctionDialog):
                   'type_token': self.typeTokenWidget.value(),
                   'frequency_cutoff': frequency_cutoff,
                   'min_rel': min_rel,
-                  'max_rel': max_rel}
+                  'max_rel': max_rel,
+                  'top_k': top_k,
+                  'num_cores': self.settings['num_cores']}
         # Error checking
         if self.compType is None:
             reply = QMessageBox.critical(self,
@@ -1,11 +1,287 @@
 from math import log2
 from collections import defaultdict
 
+from corpustools.exceptions import InformativityError
 
-def context(index, word, sequence_type = 'transcription'):
-    """Get the context for a given segment, specified by its index. The context is 
-    all preceding segments in the word. In the future, functionality to set the number
-    of segments will be added. "All" is the preferred context type in Cohen Priva (2015).
+
+class PrefixTrie(object):
+    """
+    Trie of the words in a corpus, holding the cumulative frequency of
+    every prefix.
+
+    Attributes
+    ----------
+    root : list
+        Node of the empty prefix.  Each node is a list of the total
+        frequency of the words beginning with its prefix, a dictionary
+        of child nodes keyed by the following segment, and the index of
+        the first word that reached the node
+    num_words : int
+        Number of words added
+    """
+    def __init__(self):
+        self.root = [0, {}, 0]
+        self.num_words = 0
+
+    def add(self, sequence, frequency):
+        node = self.root
+        node[0] += frequency
+        for seg in sequence:
+            children = node[1]
+            try:
+                node = children[seg]
+            except KeyError:
+                node = children[seg] = [0, {}, self.num_words]
+            node[0] += frequency
+        self.num_words += 1
+
+    def frequency(self, prefix):
+        """
+        Get the total frequency of the words beginning with a prefix.
+        """
+        node = self.root
+        for seg in prefix:
+            try:
+                node = node[1][seg]
+            except KeyError:
+                return 0
+        return node[0]
+
+    def segment_contexts(self, segments):
+        """
+        Get the frequency of segments in each of their preceding contexts,
+        along with the frequency of the contexts, in a single traversal.
+
+        Parameters
+        ----------
+        segments : iterable of str
+            Segments to look up
+
+        Returns
+        -------
+        dict {str : list}
+            Dictionary with each segment as key, and a list of tuples of a
+            context, the frequency of the segment in that context and the
+            frequency of the context, ordered by where the contexts first
+            occur in the corpus
+        """
+        segments = set(segments)
+        found = {seg: [] for seg in segments}
+        stack = [(self.root, ())]
+        while stack:
+            node, prefix = stack.pop()
+            for seg, child in node[1].items():
+                if seg in segments:
+                    found[seg].append(((child[2], len(prefix)), prefix, child[0], node[0]))
+                if child[1]:
+                    stack.append((child, prefix + (seg,)))
+        return {seg: [entry[1:] for entry in sorted(entries, key = lambda x: x[0])]
+                for seg, entries in found.items()}
+
+
+def get_prefix_trie(corpus_context, sequence_type = 'transcription', type_or_token = 'token',
+                    stop_check = None, call_back = None):
+    """
+    Generate (and cache) the prefix trie of the words in a corpus context.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    sequence_type : str
+        Tier of the words to use
+    type_or_token : str
+        If 'token', add each word with its frequency, otherwise count each
+        word once
+    stop_check : callable, optional
+        Optional function to check whether to gracefully terminate early
+    call_back : callable, optional
+        Optional function to supply progress information during the function
+
+    Returns
+    -------
+    PrefixTrie
+        Prefix trie of the words, or None if stopped early
+    """
+    key = (sequence_type, type_or_token)
+    if key in corpus_context._prefix_trie:
+        return corpus_context._prefix_trie[key]
+    if call_back is not None:
+        call_back('Calculating context frequencies...')
+        call_back(0, len(corpus_context))
+        cur = 0
+    trie = PrefixTrie()
+    for word in corpus_context:
+        if stop_check is not None and stop_check():
+            return
+        if call_back is not None:
+            cur += 1
+            if cur % 100 == 0:
+                call_back(cur)
+        if type_or_token == 'token':
+            trie.add(getattr(word, sequence_type), word.frequency)
+        else:
+            trie.add(getattr(word, sequence_type), 1)
+    corpus_context._prefix_trie[key] = trie
+    return trie
+
+
+class ContextModel(object):
+    """
+    Frequencies of bounded preceding contexts of every size up to a
+    maximum, and of the segments following them.  Contexts are cut off at
+    the beginning of words, so a context shorter than its size only
+    occurs word-initially.
+
+    Parameters
+    ----------
+    max_context : int
+        Largest number of preceding segments in a context
+
+    Attributes
+    ----------
+    contexts : dict {int : dict}
+        For each context size, dictionary with tuples of context segments
+        as keys, and their frequency before a segment or the end of a word
+        as values
+    segments : dict {int : dict}
+        For each context size, dictionary with segments as keys, and
+        dictionaries of the frequency of the segment after each context as
+        values, in the order the contexts first occur in the corpus
+    """
+    def __init__(self, max_context):
+        self.max_context = max_context
+        self.contexts = {n: {} for n in range(1, max_context + 1)}
+        self.segments = {n: {} for n in range(1, max_context + 1)}
+
+    def add(self, sequence, frequency):
+        sequence = list(sequence)
+        for j in range(len(sequence) + 1):
+            for n in range(1, self.max_context + 1):
+                c = tuple(sequence[max(0, j - n):j])
+                contexts = self.contexts[n]
+                contexts[c] = contexts.get(c, 0) + frequency
+                if j < len(sequence):
+                    following = self.segments[n].setdefault(sequence[j], {})
+                    following[c] = following.get(c, 0) + frequency
+
+    def frequency(self, context, size):
+        """
+        Get the frequency of a context of a given size.
+        """
+        return self.contexts[size].get(tuple(context), 0)
+
+    def segment_contexts(self, segments, size):
+        """
+        Get the frequency of segments in each of their preceding contexts
+        of a given size, along with the frequency of the contexts.
+
+        Parameters
+        ----------
+        segments : iterable of str
+            Segments to look up
+        size : int
+            Number of preceding segments in a context
+
+        Returns
+        -------
+        dict {str : list}
+            Dictionary with each segment as key, and a list of tuples of a
+            context, the frequency of the segment in that context and the
+            frequency of the context, ordered by where the contexts first
+            occur in the corpus
+        """
+        contexts = self.contexts[size]
+        return {seg: [(c, fr, contexts[c]) for c, fr in self.segments[size].get(seg, {}).items()]
+                for seg in segments}
+
+
+def get_context_model(corpus_context, size, sequence_type = 'transcription', type_or_token = 'token',
+                      stop_check = None, call_back = None):
+    """
+    Generate (and cache) the model of bounded preceding contexts of the
+    words in a corpus context.  The cached model is reused for any context
+    size up to the largest one requested so far.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    size : int
+        Number of preceding segments in a context
+    sequence_type : str
+        Tier of the words to use
+    type_or_token : str
+        If 'token', add each word with its frequency, otherwise count each
+        word once
+    stop_check : callable, optional
+        Optional function to check whether to gracefully terminate early
+    call_back : callable, optional
+        Optional function to supply progress information during the function
+
+    Returns
+    -------
+    ContextModel
+        Model of contexts of at least `size` segments, or None if stopped
+        early
+    """
+    key = (sequence_type, type_or_token)
+    model = corpus_context._context_model.get(key)
+    if model is not None and model.max_context >= size:
+        return model
+    if call_back is not None:
+        call_back('Calculating context frequencies...')
+        call_back(0, len(corpus_context))
+        cur = 0
+    model = ContextModel(size)
+    for word in corpus_context:
+        if stop_check is not None and stop_check():
+            return
+        if call_back is not None:
+            cur += 1
+            if cur % 100 == 0:
+                call_back(cur)
+        if type_or_token == 'token':
+            model.add(getattr(word, sequence_type), word.frequency)
+        else:
+            model.add(getattr(word, sequence_type), 1)
+    corpus_context._context_model[key] = model
+    return model
+
+
+def _context_size(preceding_context):
+    if preceding_context == 'all':
+        return None
+    if isinstance(preceding_context, int) and preceding_context >= 1:
+        return preceding_context
+    raise(InformativityError("The preceding context must be 'all' or a positive number of segments, "
+                             "not {}.".format(preceding_context)))
+
+
+def _segment_contexts(corpus_context, segments, sequence_type = 'transcription', type_or_token = 'token',
+                      preceding_context = 'all', stop_check = None, call_back = None):
+    """
+    Look up the frequencies of segments in their contexts in the cached
+    prefix trie or context model, as for `PrefixTrie.segment_contexts`.
+    Returns None if stopped early.
+    """
+    size = _context_size(preceding_context)
+    segments = [str(seg) for seg in segments]
+    if size is None:
+        trie = get_prefix_trie(corpus_context, sequence_type, type_or_token, stop_check, call_back)
+        if trie is None:
+            return
+        return trie.segment_contexts(segments)
+    model = get_context_model(corpus_context, size, sequence_type, type_or_token, stop_check, call_back)
+    if model is None:
+        return
+    return model.segment_contexts(segments, size)
+
+
+def context(index, word, sequence_type = 'transcription', preceding_context = 'all'):
+    """Get the context for a given segment, specified by its index. The context is
+    all preceding segments in the word, or a given number of them. "All" is the
+    preferred context type in Cohen Priva (2015).
 
     Parameters
     ----------
@@ -13,17 +289,22 @@ def context(index, word, sequence_type = 'transcription'):
         Segment index
     word: Word 
         Word object from which the context will be obtained
+    preceding_context: str or int
+        'all' for all preceding segments, or the number of preceding segments
 
     Returns
     -------
     tuple (Segment, ...)
         Tuple of context Segments     
    """
-    return tuple(getattr(word, sequence_type)[0:index - 1])
+    size = _context_size(preceding_context)
+    if size is None:
+        return tuple(getattr(word, sequence_type)[0:index - 1])
+    return tuple(getattr(word, sequence_type)[max(0, index - 1 - size):index - 1])
 
 
 def segment_in_context_frequencies(segment, corpus_context, sequence_type='transcription',
-                                   stop_check=None, call_back=None):
+                                   stop_check=None, call_back=None, preceding_context='all'):
     """Gets the frequencies of a segment occurring in a given context
 
     Parameters
@@ -31,33 +312,26 @@ def segment_in_context_frequencies(segment, corpus_context, sequence_type='trans
     segment: str
     corpus_context: CorpusContext
         Context manager for a corpus
+    preceding_context: str or int
+        'all' for all preceding segments, or the number of preceding segments
 
    Returns
     ----------
     dict {tuple : int,...}
         Dictionary with tuple of context Segments as key, and integer of frequency as value
     """
-    if call_back is not None:
-        call_back('Calculating segment frequencies...')
-        call_back(0, len(corpus_context))
-        cur = 0
+    found = _segment_contexts(corpus_context, [segment], sequence_type, 'token', preceding_context,
+                              stop_check, call_back)
+    if found is None:
+        return 'quit'
     contexts = defaultdict(int)
-    for word in corpus_context:
-        i = 0
-        if stop_check is not None and stop_check():
-            return 'quit'
-        if call_back is not None:
-            cur += 1
-            if cur % 100 == 0:
-                call_back(cur)
-        for seg in getattr(word, sequence_type):
-            i += 1
-            if seg == segment:
-                contexts[context(i, word, sequence_type)] += word.frequency
+    for c, segment_fr, _ in found[str(segment)]:
+        contexts[c] = segment_fr
     return contexts
 
 
-def context_frequencies(contexts, corpus_context, sequence_type='transcription', stop_check=None, call_back=None):
+def context_frequencies(contexts, corpus_context, sequence_type='transcription', stop_check=None, call_back=None,
+                        preceding_context='all'):
     """Given a dictionary (or list/iterable) of contexts and a corpus, gets frequencies for the
      contexts regardless of the following segment.
 
@@ -67,28 +341,30 @@ def context_frequencies(contexts, corpus_context, sequence_type='transcription',
         Dictionary or other iterable of tuples containing contexts
     corpus_context: CorpusContext
         Context manager for a corpus
+    preceding_context: str or int
+        'all' for all preceding segments, or the number of preceding segments
 
     Returns
     ----------
     dict {tuple : int,...}
         Dictionary with tuple of context segments as key, and integer of frequency as value
     """
-    if call_back is not None:
-        call_back('Calculating context frequencies...')
-        call_back(0, len(contexts))
-        cur = 0
+    size = _context_size(preceding_context)
+    if size is None:
+        counts = get_prefix_trie(corpus_context, sequence_type, 'token', stop_check, call_back)
+    else:
+        counts = get_context_model(corpus_context, size, sequence_type, 'token', stop_check, call_back)
+    if counts is None:
+        return 'quit'
     context_frs = defaultdict(int)
     for c in contexts:
-        if call_back is not None:
-            cur += 1
-            if cur % 100 == 0:
-                call_back(cur)
         if c is not None:
-            for word in corpus_context:
-                if stop_check is not None and stop_check():
-                    return 'quit'
-                if tuple(getattr(word, sequence_type)[0:len(c)]) == c:
-                    context_frs[c] += word.frequency
+            if size is None:
+                frequency = counts.frequency(c)
+            else:
+                frequency = counts.frequency(c, size)
+            if frequency:
+                context_frs[c] = frequency
     return context_frs
 
 
@@ -127,53 +403,20 @@ def conditional_probability(segment_frs, context_frs, stop_check=None, call_back
     return conditional_prs
 
 def get_multiple_informativity(corpus, segment_list, sequence_type = 'transcription', rounding=3, type_or_token='token',
-                               call_back = None, stop_check=None):
+                               call_back = None, stop_check=None, preceding_context='all'):
     # s_frs = segment_in_context_frequencies(segment, corpus_context, sequence_type)
     # seg_frequencies = {seg:segment_in_context_frequencies(seg, corpus, sequence_type) for seg in segment_list}
     seg_frequencies = {seg:defaultdict(int) for seg in segment_list}
     context_frequencies = {seg:defaultdict(int) for seg in segment_list}
     seg_conditional_probs = {seg:defaultdict(float) for seg in segment_list}
-    corpus_size = len(corpus)
-    if call_back is not None:
-        call_back('Calculating segment frequencies...')
-        call_back(0, corpus_size)
-        cur = 0
-    for word in corpus:
-        i = 0
-        if stop_check is not None and stop_check():
-            return
-        if call_back is not None:
-            cur += 1
-            if cur % 100 == 0:
-                call_back(cur)
-
-        for seg in getattr(word, sequence_type):
-            i += 1
-            if seg in segment_list:
-                if type_or_token == 'token':
-                    seg_frequencies[seg][context(i, word, sequence_type)] += word.frequency
-                else:
-                    seg_frequencies[seg][context(i, word, sequence_type)] += 1
-
-    if call_back is not None:
-        call_back('Calculating context frequencies...')
-        call_back(0, corpus_size)
-        cur = 0
-    for word in corpus:
-        if stop_check is not None and stop_check():
-            return
-        if call_back is not None:
-            cur += 1
-            if cur % 100 == 0:
-                call_back(cur)
-        for seg in segment_list:
-            for c in seg_frequencies[seg]:
-                if c is not None:
-                    if tuple(getattr(word, sequence_type)[0:len(c)]) == c:
-                        if type_or_token == 'token':
-                            context_frequencies[seg][c] += word.frequency
-                        else:
-                            context_frequencies[seg][c] += 1
+    found = _segment_contexts(corpus, segment_list, sequence_type, type_or_token, preceding_context,
+                              stop_check, call_back)
+    if found is None:
+        return
+    for seg in segment_list:
+        for c, segment_fr, context_fr in found[str(seg)]:
+            seg_frequencies[seg][c] = segment_fr
+            context_frequencies[seg][c] = context_fr
 
     if call_back is not None:
         call_back('Calculating context frequencies...')
@@ -206,7 +449,7 @@ def get_multiple_informativity(corpus, segment_list, sequence_type = 'transcript
             "PCT ver.": corpus.corpus._version,
             "Segment": seg,
             "Informativity": informativity,
-            "Context": "all",
+            "Context": preceding_context,
             "Rounding": rounding,
             "Type or token": type_or_token,
             "Transcription tier": sequence_type,
@@ -218,7 +461,7 @@ def get_multiple_informativity(corpus, segment_list, sequence_type = 'transcript
 
 
 def get_informativity(corpus_context, segment, sequence_type = 'transcription', rounding=3,
-                      stop_check=None, call_back=None):
+                      stop_check=None, call_back=None, preceding_context='all'):
     """Calculate the informativity of one segment. 
 
     Parameters
@@ -229,6 +472,8 @@ def get_informativity(corpus_context, segment, sequence_type = 'transcription',
         The Segment for which informativity should be calculated
     rounding: int 
         Integer indicates the number of decimal places
+    preceding_context: str or int
+        'all' for all preceding segments, or the number of preceding segments
 
     Returns
     ----------
@@ -236,10 +481,12 @@ def get_informativity(corpus_context, segment, sequence_type = 'transcription',
         Dictionary provides a summary of the parameters, with string keys. Value
         for informativity is a float with specified rounding
     """
-    s_frs = segment_in_context_frequencies(segment, corpus_context, sequence_type, stop_check, call_back)
+    s_frs = segment_in_context_frequencies(segment, corpus_context, sequence_type, stop_check, call_back,
+                                           preceding_context)
     if s_frs == 'quit':
         return
-    c_frs = context_frequencies(s_frs, corpus_context, sequence_type, stop_check, call_back)
+    c_frs = context_frequencies(s_frs, corpus_context, sequence_type, stop_check, call_back,
+                                preceding_context)
     if c_frs == 'quit':
         return
     c_prs = conditional_probability(s_frs, c_frs, stop_check, call_back)
@@ -250,7 +497,7 @@ def get_informativity(corpus_context, segment, sequence_type = 'transcription',
     summary = {
         "Corpus": corpus_context.name,
         "Segment": segment,
-        "Context": "all",
+        "Context": preceding_context,
         "Rounding": rounding,
         "Informativity": informativity
     }
@@ -263,7 +510,7 @@ def calculate_informativity(s_frs, c_prs, rounding):
     return informativity
 
 
-def all_informativity(corpus_context, rounding=3):
+def all_informativity(corpus_context, rounding=3, preceding_context='all'):
     """
 
     Parameters
@@ -272,6 +519,8 @@ def all_informativity(corpus_context, rounding=3):
         Context manager for a corpus
     rounding: int 
         Integer indicates the number of decimal places
+    preceding_context: str or int
+        'all' for all preceding segments, or the number of preceding segments
 
     Returns
     ----------
@@ -280,8 +529,22 @@ def all_informativity(corpus_context, rounding=3):
         with Segment objects as keys. 
     """
     all_informativities = defaultdict(dict)
+    found = _segment_contexts(corpus_context, corpus_context.inventory, corpus_context.sequence_type,
+                              'token', preceding_context)
     for segment in corpus_context.inventory:
-        all_informativities[str(segment)] = get_informativity(corpus_context, segment, rounding)
+        s_frs = defaultdict(int)
+        c_frs = defaultdict(int)
+        for c, segment_fr, context_fr in found[str(segment)]:
+            s_frs[c] = segment_fr
+            c_frs[c] = context_fr
+        c_prs = conditional_probability(s_frs, c_frs)
+        all_informativities[str(segment)] = {
+            "Corpus": corpus_context.name,
+            "Segment": segment,
+            "Context": preceding_context,
+            "Rounding": rounding,
+            "Informativity": calculate_informativity(s_frs, c_prs, rounding)
+        }
     return all_informativities
 
 
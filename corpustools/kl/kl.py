@@ -1,22 +1,153 @@
-from math import log
-from collections import defaultdict
+from math import log, fsum
+from collections import OrderedDict
 import os
 from codecs import open
 
+import numpy as np
+
 from corpustools.exceptions import KLError
 
-class Context(object):
+def _side_name(side):
+    if side.startswith('r'):
+        return 'right'
+    elif side.startswith('l'):
+        return 'left'
+    return 'both'
+
+class ContextCounts(object):
+    """
+    Frequencies of every segment in every context of a corpus, for
+    calculating KL distances between any segments.
 
-    def __init__(self):
-        self.seg1 = 0
-        self.seg2 = 0
-        self.other = 0
+    Parameters
+    ----------
+    side : str
+        One of 'right', 'left' or 'both'
+
+    Attributes
+    ----------
+    contexts : list
+        Contexts in the order they were first seen
+    segments : list
+        Segments in the order they were first seen
+    counts : numpy.ndarray
+        Frequency of each segment (columns) in each context (rows)
+    segment_totals : numpy.ndarray
+        Frequency of each segment over all contexts
+    """
+    def __init__(self, side):
+        self.side = _side_name(side)
+        self.contexts = []
+        self.segments = []
+        self.counts = np.zeros((0, 0))
+        self.segment_totals = np.zeros(0)
+        self._context_index = OrderedDict()
+        self._segment_index = OrderedDict()
+        self._pending = OrderedDict()
+        self._pending_totals = []
+
+    def add(self, word, sequence_type):
+        symbols = getattr(word, sequence_type).with_word_boundaries()
+        for pos in range(1, len(symbols)-1):
+            seg = symbols[pos]
+            if self.side == 'right':
+                context = symbols[pos-1]
+            elif self.side == 'left':
+                context = symbols[pos+1]
+            else:
+                context = (symbols[pos-1],symbols[pos+1])
+            c = self._context_index.setdefault(context, len(self._context_index))
+            s = self._segment_index.setdefault(seg, len(self._segment_index))
+            if s == len(self._pending_totals):
+                self._pending_totals.append(0)
+            self._pending[c, s] = self._pending.get((c, s), 0) + word.frequency
+            self._pending_totals[s] += word.frequency
 
-    def sum(self):
-        return sum([self.seg1,self.seg2,self.other])
+    def pack(self):
+        """
+        Build the count matrix from the words added.
+        """
+        self.contexts = list(self._context_index.keys())
+        self.segments = list(self._segment_index.keys())
+        self.counts = np.zeros((len(self.contexts), len(self.segments)))
+        for (c, s), count in self._pending.items():
+            self.counts[c, s] = count
+        self.segment_totals = np.array(self._pending_totals, dtype=float)
+        self._pending = OrderedDict()
+
+    def __len__(self):
+        return len(self.contexts)
+
+    def column(self, segments):
+        """
+        Get the frequencies of a set of segments in each context.
+
+        Parameters
+        ----------
+        segments : iterable
+            Segments to add up
+
+        Returns
+        -------
+        numpy.ndarray
+            Frequency of the segments in each context
+        float
+            Frequency of the segments over all contexts
+        """
+        indices = sorted(set(self._segment_index[s] for s in segments
+                                if s in self._segment_index))
+        if len(indices) == 1:
+            return self.counts[:, indices[0]], self.segment_totals[indices[0]]
+        return (self.counts[:, indices].sum(axis=1),
+                float(self.segment_totals[indices].sum()))
+
+    def probabilities(self, counts, total):
+        """
+        Smoothed probability of each context given the frequencies of a
+        segment, as used by `KullbackLeibler`.
+        """
+        return (counts + 1) / (total + len(self.contexts))
+
+def get_context_counts(corpus_context, side, stop_check = None, call_back = None):
+    """
+    Generate (and cache) the context counts of a corpus context.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    side : str
+        One of 'right', 'left' or 'both'
+    stop_check : callable, optional
+        Optional function to check whether to gracefully terminate early
+    call_back : callable, optional
+        Optional function to supply progress information during the function
 
-    def __repr__(self):
-        return str((self.seg1, self.seg2, self.other))
+    Returns
+    -------
+    ContextCounts
+        Context counts for the sequence type of the context, or None if
+        stopped early
+    """
+    key = (corpus_context.sequence_type, _side_name(side))
+    if key in corpus_context._context_counts:
+        return corpus_context._context_counts[key]
+    if call_back:
+        call_back('Counting contexts...')
+        call_back(0, len(corpus_context))
+        cur = 0
+    counts = ContextCounts(side)
+    for word in corpus_context:
+        if stop_check and stop_check():
+            return
+        if call_back:
+            cur += 1
+            if cur % 100 == 0:
+                call_back(cur)
+        counts.add(word, corpus_context.sequence_type)
+    counts.pack()
+    corpus_context._context_counts[key] = counts
+    return counts
 
 def KullbackLeibler(corpus_context, seg1, seg2, side, outfile = None,
                         stop_check = False, call_back = False):
@@ -65,54 +196,24 @@ def KullbackLeibler(corpus_context, seg1, seg2, side, outfile = None,
             raise ValueError('Segment \'{}\' does not exist in this corpus.'.format(seg2))
         seg2 = [seg2]
 
-    allC = defaultdict(Context)
-    seg_counts = {'seg1':0, 'seg2':0}
+    counts = get_context_counts(corpus_context, side, stop_check, call_back)
+    if counts is None:
+        return
+    totalC = len(counts)
 
+    seg1_counts, seg1_total = counts.column(seg1)
+    seg2_counts, seg2_total = counts.column(seg2)
+    P1 = counts.probabilities(seg1_counts, seg1_total)
+    P2 = counts.probabilities(seg2_counts, seg2_total)
 
-    for word in corpus_context:
-        tier = getattr(word, corpus_context.sequence_type)
-        symbols = tier.with_word_boundaries()
-        for pos in range(1, len(symbols)-1):
-            seg = symbols[pos]
-            thisc = (symbols[pos-1],symbols[pos+1])
-            if side.startswith('r'):
-                thisc = thisc[0]
-            elif side.startswith('l'):
-                thisc = thisc[1]
-
-            flag = False
-            if seg in seg1:
-                allC[thisc].seg1 += word.frequency
-                seg_counts['seg1'] += word.frequency
-                flag = True
-
-            if seg in seg2:
-                allC[thisc].seg2 += word.frequency
-                seg_counts['seg2'] += word.frequency
-                flag = True
-
-            if not flag:
-                allC[thisc].other += word.frequency
-
-    totalC = len(allC)
-    freq_c = defaultdict(int)
-    for c in allC:
-        freq_c[c] += 1
-
-    P = lambda c,s: (getattr(c,s)+1)/(seg_counts[s]+totalC)
-
-    KL = sum(
-    [(P(c,'seg1')*log(P(c,'seg1')/P(c,'seg2')))
-    +(P(c,'seg2')*log(P(c,'seg2')/P(c,'seg1')))
-    for c in allC.values()])
-
-    seg1_entropy = sum(P(result,'seg1')*log(
-                                        P(result,'seg1')/(freq_c[context]/totalC))
-                        for (context,result) in allC.items())
-
-    seg2_entropy = sum(P(result,'seg2')*log(
-                                        P(result,'seg2')/(freq_c[context]/totalC))
-                        for (context,result) in allC.items())
+    # The sums are exact (fsum), so that segments whose distributions only
+    # differ in the order of their contexts still tie
+    KL = fsum(P1*np.log(P1/P2) + P2*np.log(P2/P1))
+
+    # Every context occurs once among the contexts, so the probability
+    # of a context is 1/totalC
+    seg1_entropy = fsum(P1*np.log(P1/(1/totalC)))
+    seg2_entropy = fsum(P2*np.log(P2/(1/totalC)))
 
     ur,sr = (seg1,seg2) if seg1_entropy < seg2_entropy else (seg2,seg1)
 
@@ -120,26 +221,79 @@ def KullbackLeibler(corpus_context, seg1, seg2, side, outfile = None,
         if not outfile.endswith('.txt'):
             outfile += '.txt'
 
+        union_counts, _ = counts.column(set(seg1) | set(seg2))
+        other_counts = counts.counts.sum(axis=1) - union_counts
         with open(outfile, mode='w', encoding='utf-8-sig') as f:
             print('Context, Context frequency, {} frequency in context, {} frequency in context\n\r'.format(seg1,seg2), file=f)
-            for context,result in allC.items():
-                cfrequency = freq_c[context]/totalC
+            for i, context in enumerate(counts.contexts):
+                cfrequency = 1/totalC
+                context_sum = seg1_counts[i] + seg2_counts[i] + other_counts[i]
                 print('{},{},{},{}\n\r'.format(context,
                                 cfrequency,
-                                result.seg1/result.sum(),
-                                result.seg2/result.sum()),
+                                seg1_counts[i]/context_sum,
+                                seg2_counts[i]/context_sum),
                         file=f)
 
     is_spurious = _check_spurious(ur, sr, corpus_context)
 
-    if side.startswith('r'):
-        retside = 'right'
-    elif side.startswith('l'):
-        retside = 'left'
-    elif side.startswith('b'):
-        retside = 'both'
     return seg1_entropy, seg2_entropy, KL, ur, is_spurious
 
+def pairwise_KullbackLeibler(corpus_context, side, segments = None,
+                                stop_check = None, call_back = None):
+    """
+    Calculates the KL distances between every pair of segments at once.
+
+    The distances and entropies are the same as those given by
+    `KullbackLeibler` for each pair; the segment with the lower entropy
+    of a pair is its likely underlying form.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    side : str
+        One of 'right', 'left' or 'both'
+    segments : list, optional
+        Segments to compare, defaults to the segments of the inventory
+    stop_check : callable or None
+        Optional function to check whether to gracefully terminate early
+    call_back : callable or None
+        Optional function to supply progress information during the function
+
+    Returns
+    -------
+    list
+        The segments compared
+    numpy.ndarray
+        Entropy of each segment
+    numpy.ndarray
+        Matrix of the KL distances between each pair of segments
+    """
+    if segments is None:
+        segments = [s.symbol for s in corpus_context.inventory]
+    for x in segments:
+        if x not in corpus_context.inventory:
+            raise ValueError('Segment \'{}\' does not exist in this corpus.'.format(x))
+
+    counts = get_context_counts(corpus_context, side, stop_check, call_back)
+    if counts is None:
+        return
+    totalC = len(counts)
+
+    columns = np.zeros((totalC, len(segments)))
+    totals = np.zeros(len(segments))
+    for i, s in enumerate(segments):
+        columns[:, i], totals[i] = counts.column([s])
+    P = counts.probabilities(columns, totals)
+    logP = np.log(P)
+
+    cross = P.T.dot(logP)
+    self_terms = np.diag(cross)
+    distances = self_terms[:, None] + self_terms[None, :] - cross - cross.T
+    np.fill_diagonal(distances, 0)
+    entropies = self_terms + np.log(totalC) * P.sum(axis=0)
+    return segments, entropies, distances
+
 
 def _check_spurious(ur, sr, corpus_context):
     if len(ur) > 1: #Set of segments, probably supplied from GUI, hack until refactor
@@ -2,7 +2,8 @@
 
 
 import math
-import time
+
+import numpy as np
 
 from corpustools.exceptions import MutualInfoError
 
@@ -57,7 +58,7 @@ def pointwise_mi(corpus_context, query, halve_edges = False, in_word = False,
     try:
         prob_bg = bigram_dict[query]
     except KeyError:
-        raise MutualInfoError('The bigram {} was not found in the corpus using {}s'.format(''.join(query),sequence_type))
+        raise MutualInfoError('The bigram {} was not found in the corpus using {}s'.format(''.join(query),corpus_context.sequence_type))
 
 
     if unigram_dict[query[0]] == 0.0:
@@ -87,27 +88,123 @@ def get_in_word_bigram_frequency(corpus_context, query):
             total += word.frequency
     return {query: total / len(corpus_context)}
 
+def get_in_word_cooccurrence(corpus_context, segments, stop_check = None, call_back = None):
+    """
+    Get the frequencies of the words containing each segment and each pair
+    of segments, as used by `get_in_word_unigram_frequencies` and
+    `get_in_word_bigram_frequency`.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    segments : list
+        Segments to count
+    stop_check : callable or None
+        Optional function to check whether to gracefully terminate early
+    call_back : callable or None
+        Optional function to supply progress information during the function
+
+    Returns
+    -------
+    numpy.ndarray
+        Matrix of the frequencies of the words containing both segments
+        of each pair, with the frequencies of the words containing each
+        segment on its diagonal, or None if stopped early
+    """
+    index = {s: i for i, s in enumerate(segments)}
+    cooccurrence = np.zeros((len(segments), len(segments)))
+    if call_back is not None:
+        call_back('Counting segments in words...')
+        call_back(0, len(corpus_context))
+        cur = 0
+    for word in corpus_context:
+        if stop_check is not None and stop_check():
+            return
+        if call_back is not None:
+            cur += 1
+            if cur % 100 == 0:
+                call_back(cur)
+        tier = getattr(word, corpus_context.sequence_type)
+        if isinstance(tier, str):
+            present = [i for i, s in enumerate(segments) if s in tier]
+        else:
+            present = sorted(set(index[x] for x in tier if x in index))
+        if present:
+            cooccurrence[np.ix_(present, present)] += word.frequency
+    return cooccurrence
+
 def all_mis(corpus_context,
             halve_edges = False, in_word = False,
             stop_check = None, call_back = None):
-    mis = {}
-    total_calculations = ((len(corpus_context.inventory)**2)-len(corpus_context.inventory)/2)+1
-    ct = 1
-    t = time.time()
-    for s1 in corpus_context.inventory:
-        for s2 in corpus_context.inventory:
-                #print('Performing MI calculation {} out of {} possible'.format(str(ct), str(total_calculations)))
-                ct += 1
-                #print('Duration of last calculation: {}'.format(str(time.time() - t)))
-                t = time.time()
-                if type(s1) != str:
-                    s1 = s1.symbol
-                if type(s2) != str:
-                    s2 = s2.symbol
-                #print(s1,s2)
-                mi = pointwise_mi(corpus_context, (s1, s2), halve_edges = halve_edges, in_word = in_word)
-                mis[(s1,s2)] = mi
-
-    ordered_mis = sorted([(pair, str(mis[pair])) for pair in mis], key=lambda p: p[1])
+    """
+    Calculate the mutual information for every bigram of segments in the
+    inventory.
+
+    The probabilities are counted once for all bigrams, as a matrix, and
+    each mutual information is the same as that from `pointwise_mi`.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    halve_edges : bool
+        Flag whether to only count word boundaries once per word rather than
+        twice, defaults to False
+    in_word : bool
+        Flag to calculate non-local, non-ordered mutual information,
+        defaults to False
+    stop_check : callable or None
+        Optional function to check whether to gracefully terminate early
+    call_back : callable or None
+        Optional function to supply progress information during the function
+
+    Returns
+    -------
+    list
+        Tuples of each bigram and its mutual information as a string,
+        sorted by that string
+    """
+    segments = [s if type(s) == str else s.symbol for s in corpus_context.inventory]
+    if in_word:
+        cooccurrence = get_in_word_cooccurrence(corpus_context, segments,
+                                                stop_check = stop_check, call_back = call_back)
+        if cooccurrence is None:
+            return
+        bigrams = cooccurrence / len(corpus_context)
+        unigrams = np.diag(bigrams).copy()
+        found = np.ones(len(segments), dtype=bool)
+    else:
+        unigram_dict = corpus_context.get_frequency_base(gramsize = 1, halve_edges = halve_edges, probability=True)
+        bigram_dict = corpus_context.get_frequency_base(gramsize = 2, halve_edges = halve_edges, probability=True)
+        found = np.array([s in unigram_dict for s in segments], dtype=bool)
+        unigrams = np.array([unigram_dict.get(s, 0.0) for s in segments])
+        bigrams = np.array([[bigram_dict.get((s1, s2), np.nan) for s2 in segments]
+                                for s1 in segments]).reshape(len(segments), len(segments))
+
+    # Report the first bigram that cannot be calculated, with the same
+    # error as pointwise_mi
+    problems = (~found[:, None] | ~found[None, :] | (unigrams[:, None] == 0)
+                | (unigrams[None, :] == 0) | np.isnan(bigrams) | (bigrams == 0))
+    if problems.any():
+        i, j = [int(x) for x in np.argwhere(problems)[0]]
+        query = (segments[i], segments[j])
+        for s in query:
+            if not found[segments.index(s)]:
+                raise(MutualInfoError('The segment {} was not found in the corpus'.format(s)))
+        if np.isnan(bigrams[i, j]):
+            raise MutualInfoError('The bigram {} was not found in the corpus using {}s'.format(''.join(query),corpus_context.sequence_type))
+        for s in query:
+            if unigrams[segments.index(s)] == 0.0:
+                raise MutualInfoError('Warning! Mutual information could not be calculated because the unigram {} is not in the corpus.'.format(s))
+        raise MutualInfoError('Warning! Mutual information could not be calculated because the bigram {} is not in the corpus.'.format(str(query)))
+
+    ratios = bigrams / (unigrams[:, None] * unigrams[None, :])
+    # math.log rather than numpy's log, which can differ in the last bit
+    # and so change the string the results are sorted by
+    ordered_mis = [((s1, s2), str(math.log(ratio, 2)))
+                    for s1, row in zip(segments, ratios.tolist())
+                    for s2, ratio in zip(segments, row)]
+    ordered_mis.sort(key=lambda p: p[1])
 
     return ordered_mis
@@ -1,12 +1,22 @@
 from functools import partial
 
 from corpustools.corpus.classes import Word
-from corpustools.symbolsim.edit_distance import edit_distance
-from corpustools.symbolsim.khorsi import khorsi
-from corpustools.symbolsim.phono_edit_distance import phono_edit_distance
-from corpustools.symbolsim.phono_align import Aligner
-from corpustools.c_multiprocessing import filter_mp, score_mp
-
+from corpustools.symbolsim.edit_distance import (edit_distance, get_encoded_lexicon,
+                                                  get_deletion_index)
+from corpustools.symbolsim.khorsi import khorsi, khorsi_log_terms
+from corpustools.symbolsim.phono_edit_distance import (phono_edit_distance, phono_edit_distances,
+                                                        get_aligner)
+from corpustools.c_multiprocessing import context_words_map_mp
+
+# Largest edit distance to answer with a deletion index; above this the
+# number of deletion variants per word makes scanning the encoded lexicon
+# the cheaper option
+MAX_INDEXED_DISTANCE = 3
+
+def _is_same_word(w, query):
+    # Words yielded by a corpus context are copies that keep the corpus
+    # Word they came from as `original`
+    return getattr(w, 'original', w) is getattr(query, 'original', query)
 
 def _is_edit_distance_neighbor(w, query, sequence_type, max_distance):
     w_len = len(getattr(w, sequence_type))
@@ -18,12 +28,29 @@ def _is_edit_distance_neighbor(w, query, sequence_type, max_distance):
     return edit_distance(w, query, sequence_type, max_distance) <= max_distance
 
 def _is_phono_edit_distance_neighbor(w, query, sequence_type, specifier, max_distance):
-    return phono_edit_distance(w, query, sequence_type, specifier) <= max_distance
-
-def _is_khorsi_neighbor(w, query, freq_base, sequence_type, max_distance):
-    return khorsi(w, query, freq_base, sequence_type, max_distance) >= max_distance
+    return phono_edit_distance(w, query, sequence_type, specifier, max_distance) <= max_distance
+
+def _is_khorsi_neighbor(w, query, freq_base, sequence_type, max_distance, log_terms = None):
+    return khorsi(w, query, freq_base, sequence_type, max_distance, log_terms) >= max_distance
+
+def _neighborhood_density_job(corpus_context, query, output_format, **kwargs):
+    res = neighborhood_density(corpus_context, query, **kwargs)
+    return res[0], [getattr(r, output_format) for r in res[1]]
+
+def _build_shared_indexes(corpus_context, algorithm, max_distance):
+    # Indexes built before the worker processes start are shared with
+    # them rather than rebuilt in each one
+    if algorithm == 'phono_edit_distance':
+        get_encoded_lexicon(corpus_context)
+        get_aligner(corpus_context.specifier).build_cost_tables()
+    if algorithm != 'edit_distance':
+        return
+    if max_distance <= MAX_INDEXED_DISTANCE:
+        get_deletion_index(corpus_context, max_distance)
+    else:
+        get_encoded_lexicon(corpus_context)
 
-def neighborhood_density_all_words(corpus_context, tierdict, tier_type = None, sequence_type = None,
+def neighborhood_density_all_words(corpus_context, tierdict = None, tier_type = None, sequence_type = None,
             algorithm = 'edit_distance', max_distance = 1, output_format = 'spelling',
             num_cores = -1, settable_attr = None, collapse_homophones = False,
             stop_check = None, call_back = None):
@@ -34,6 +61,10 @@ def neighborhood_density_all_words(corpus_context, tierdict, tier_type = None, s
     ----------
     corpus_context : CorpusContext
         Context manager for a corpus
+    tierdict : dict, optional
+        Mapping of sequences (as strings) to the words with them, to look
+        up distance-1 neighbors in instead of the cached index of the corpus
+        context
     algorithm : str
         The algorithm used to determine distance
     max_distance : float, optional
@@ -45,34 +76,20 @@ def neighborhood_density_all_words(corpus_context, tierdict, tier_type = None, s
     settable_attr: string
         Name of attribute that neighbourhood density results will be assigned to
     """
-    function = partial(neighborhood_density, corpus_context,
-                        tierdict = tierdict,
-                        tier_type = tier_type,
-                        sequence_type = sequence_type,
-                        algorithm = algorithm,
-                        max_distance = max_distance,
-                        collapse_homophones = collapse_homophones)
     if call_back is not None:
         call_back('Calculating neighborhood densities...')
         call_back(0,len(corpus_context))
         cur = 0
 
     results = dict()
-    last_value_removed = None
-    last_key_removed = None
     if num_cores == -1 or num_cores == 1:
-
         for w in corpus_context:
             if stop_check is not None and stop_check():
                 return
-            if last_value_removed:
-                tierdict[last_key_removed].append(last_value_removed)
-            w_sequence = getattr(w, corpus_context.sequence_type)
-            last_key_removed = str(w_sequence)
-            for i, item in enumerate(tierdict[last_key_removed]):
-                if str(item) == str(w):
-                    last_value_removed = tierdict[last_key_removed].pop(i)
-                    break
+            if call_back is not None:
+                cur += 1
+                if cur % 100 == 0:
+                    call_back(cur)
             res = neighborhood_density(corpus_context, w, tierdict,
                         tier_type = tier_type,
                         sequence_type = sequence_type,
@@ -81,31 +98,27 @@ def neighborhood_density_all_words(corpus_context, tierdict, tier_type = None, s
                         collapse_homophones = collapse_homophones)
             results[str(w)] = [getattr(r, output_format) for r in res[1]]
             setattr(w.original, settable_attr.name, res[0])
-
-
-        # for w in corpus_context:
-        #     if stop_check is not None and stop_check():
-        #         return
-        #     cur += 1
-        #     call_back(cur)
-        #     res = function(w)
-        #     results[str(w)] = [getattr(r, output_format) for r in res[1]]
-        #     setattr(w.original, settable_attr.name, res[0]-1)
-        #     #the -1 is to account for the fact that words are counted as their own neighbour, and this is incorrect
-        #     #subtracting 1 here is easier than fixing the neighbourhood density algorithm
     else:
-        iterable = ((w,) for w in corpus_context)
-        neighbors = score_mp(iterable, function, num_cores, call_back, stop_check, chunk_size = 1)
-        for n in neighbors:
-            #Have to look up the key, then look up the object due to how
-            #multiprocessing pickles objects
-            setattr(corpus_context.corpus.find(corpus_context.corpus.key(n[0])),
-                    #corpus_context.attribute.name, n[1][0])
-                    settable_attr.name, n[1][0])
+        _build_shared_indexes(corpus_context, algorithm, max_distance)
+        function = partial(_neighborhood_density_job,
+                        output_format = output_format,
+                        tierdict = tierdict,
+                        tier_type = tier_type,
+                        sequence_type = sequence_type,
+                        algorithm = algorithm,
+                        max_distance = max_distance,
+                        collapse_homophones = collapse_homophones)
+        neighbors = context_words_map_mp(corpus_context, function, num_cores,
+                                        call_back = call_back, stop_check = stop_check)
+        if neighbors is None:
+            return
+        for w, res in zip(corpus_context, neighbors):
+            results[str(w)] = res[1]
+            setattr(w.original, settable_attr.name, res[0])
 
     return results
 
-def neighborhood_density(corpus_context, query, tierdict,
+def neighborhood_density(corpus_context, query, tierdict = None,
             algorithm = 'edit_distance', max_distance = 1, collapse_homophones = False,
             force_quadratic = False, file_type = None, tier_type=None, sequence_type = None,
             stop_check = None, call_back = None):
@@ -117,13 +130,18 @@ def neighborhood_density(corpus_context, query, tierdict,
         Context manager for a corpus
     query : Word
         The word whose neighborhood density to calculate.
+    tierdict : dict, optional
+        Mapping of sequences (as strings) to the words with them, to look
+        up distance-1 neighbors in instead of the cached index of the corpus
+        context
     algorithm : str
         The algorithm used to determine distance
     max_distance : float, optional
         Maximum edit distance from the queried word to consider a word a neighbor
     force_quadratic : bool
-        Force use of the less efficient quadratic algorithm even when finding edit
-        distance of 1 neighborhoods
+        Force use of the less efficient quadratic algorithm, comparing the
+        query with every word in turn, instead of looking up neighbors in
+        the deletion index or the encoded lexicon
     stop_check : callable, optional
         Optional function to check whether to gracefully terminate early
     call_back : callable, optional
@@ -147,19 +165,44 @@ def neighborhood_density(corpus_context, query, tierdict,
         return fast_neighborhood_density(corpus_context, query, corpus_context.sequence_type, tier_type, tierdict,
                                          file_type=file_type, collapse_homophones=collapse_homophones)
 
-    if algorithm == 'edit_distance':
+    if force_quadratic and algorithm == 'edit_distance':
         is_neighbor = partial(_is_edit_distance_neighbor,
                                 sequence_type = corpus_context.sequence_type,
                                 max_distance = max_distance)
-    elif algorithm == 'phono_edit_distance':
+    elif force_quadratic and algorithm == 'phono_edit_distance':
         is_neighbor = partial(_is_phono_edit_distance_neighbor,
                                 specifier = corpus_context.specifier,
                                 sequence_type = corpus_context.sequence_type,
                                 max_distance = max_distance)
+    elif algorithm == 'edit_distance':
+        sequence = getattr(query, corpus_context.sequence_type)
+        if max_distance <= MAX_INDEXED_DISTANCE:
+            index = get_deletion_index(corpus_context, max_distance, stop_check = stop_check)
+            if index is None or (stop_check is not None and stop_check()):
+                return
+            matches = index.query(sequence)
+        else:
+            lexicon = get_encoded_lexicon(corpus_context, stop_check = stop_check)
+            if lexicon is None or (stop_check is not None and stop_check()):
+                return
+            distances = lexicon.edit_distances(sequence, max_distance)
+            matches = [w for w, d in zip(lexicon.words, distances) if d <= max_distance]
+        neighbors = set(matches)-set([query])
+        return (len(neighbors), neighbors)
+    elif algorithm == 'phono_edit_distance':
+        lexicon = get_encoded_lexicon(corpus_context, stop_check = stop_check)
+        if lexicon is None or (stop_check is not None and stop_check()):
+            return
+        distances = phono_edit_distances(lexicon, corpus_context.specifier,
+                                         getattr(query, corpus_context.sequence_type), max_distance)
+        matches = [w for w, d in zip(lexicon.words, distances) if d <= max_distance]
+        neighbors = set(matches)-set([query])
+        return (len(neighbors), neighbors)
     elif algorithm == 'khorsi':
         freq_base = corpus_context.get_frequency_base()
         is_neighbor = partial(_is_khorsi_neighbor,
                                 freq_base = freq_base,
+                                log_terms = khorsi_log_terms(freq_base),
                                 sequence_type = corpus_context.sequence_type,
                                 max_distance = max_distance)
     for w in corpus_context:
@@ -178,92 +221,74 @@ def neighborhood_density(corpus_context, query, tierdict,
 
 
 def fast_neighborhood_density(corpus_context, query, sequence_type, tier_type,
-                              tierdict, file_type=None, trans_delimiter='.', collapse_homophones = False):
-    """Generates all neighbors of edit distance <= 1 and searches
-    for them in corpus_context.
-
-    Will be faster than neighborhood_density when:
-    n > m * (1 + s), where
-    n: number of words in corpus
-    m: length of query
-    s: size of segment inventory
+                              tierdict = None, file_type=None, trans_delimiter='.', collapse_homophones = False):
+    """Finds all sequences in corpus_context within edit distance 1 of
+    the query with a deletion index, and collects their words.
+
+    Each lookup takes O(m) probes of the index, where m is the length of
+    the query, regardless of the size of the segment inventory. The words
+    come from the index unless a tierdict is given, and the query itself
+    is never counted as its own neighbor.
     """
 
     neighbors = list()
     query = ensure_query_is_word(query, corpus_context, sequence_type, tier_type, file_type=file_type)
 
-    for candidate in generate_neighbor_candidates(corpus_context, query, sequence_type):
-        if tier_type.att_type == 'tier':
-            cand_str = trans_delimiter.join(candidate)
+    index = get_deletion_index(corpus_context, 1)
+    for candidate in index.neighbours(getattr(query, sequence_type)):
+        if tierdict is None:
+            words = index.words[candidate]
         else:
-            cand_str = ''.join(candidate)
-
-        if cand_str in tierdict:
-            for w in tierdict[cand_str]:
-                w_sequence = getattr(w, sequence_type)
-                if collapse_homophones and any(getattr(word, sequence_type) == w_sequence for word in neighbors):
-                    continue
-                else:
-                    neighbors.append(w)
+            if tier_type.att_type == 'tier':
+                cand_str = trans_delimiter.join(candidate)
+            else:
+                cand_str = ''.join(candidate)
+            if cand_str not in tierdict:
+                continue
+            words = tierdict[cand_str]
+
+        for w in words:
+            if _is_same_word(w, query):
+                continue
+            w_sequence = getattr(w, sequence_type)
+            if collapse_homophones and any(getattr(word, sequence_type) == w_sequence for word in neighbors):
+                continue
+            else:
+                neighbors.append(w)
     return (len(neighbors), neighbors)
 
-def generate_neighbor_candidates(corpus_context, query, sequence_type):
-    sequence = getattr(query, sequence_type)
-    yield [str(c) for c in sequence]
-    for i in range(len(sequence)):
-        yield [str(c) for c in sequence[:i]] + [str(c) for c in sequence[i+1:]] # deletion
-        for char in corpus_context.inventory:
-            if str(char) not in ['#', sequence[i]]:
-                yield [str(c) for c in sequence[:i]] + [str(char)] + [str(c) for c in sequence[i:]] # insertion
-                yield [str(c) for c in sequence[:i]] + [str(char)] + [str(c) for c in sequence[i+1:]] # substitution
-    for char in corpus_context.inventory: # final pass to get insertion at len+1
-        if str(char) not in ['#', sequence[i]]:
-            yield [str(c) for c in sequence[:]] + [str(char)] # insertion
-
-def find_mutation_minpairs_all_words(corpus_context, tierdict, tier_type = None, num_cores = -1, collapse_homophones = False,
+def find_mutation_minpairs_all_words(corpus_context, tierdict = None, tier_type = None, num_cores = -1, collapse_homophones = False,
                     stop_check = None, call_back = None):
 
-    function = partial(find_mutation_minpairs, corpus_context, tier_type=tier_type, collapse_homophones = collapse_homophones)
     if call_back is not None:
         call_back('Calculating neighborhood densities...')
         call_back(0,len(corpus_context))
         cur = 0
 
     results = dict()
-    last_value_removed = None
-    last_key_removed = None
     if num_cores == -1 or num_cores == 1:
         for w in corpus_context:
             if stop_check is not None and stop_check():
                 return
-            if last_value_removed:
-                tierdict[last_key_removed].append(last_value_removed)
-            w_sequence = getattr(w, corpus_context.sequence_type)
-            last_key_removed = str(w_sequence)
-            for i, item in enumerate(tierdict[last_key_removed]):
-                if str(item) == str(w):
-                    last_value_removed = tierdict[last_key_removed].pop(i)
-                    break
+            if call_back is not None:
+                cur += 1
+                if cur % 100 == 0:
+                    call_back(cur)
             res = find_mutation_minpairs(corpus_context, w,
                                          tier_type=tier_type, collapse_homophones = collapse_homophones)
             results[str(w)] = res[1]
             setattr(w.original, corpus_context.attribute.name, res[0])
-
-        # for w in corpus_context:
-        #     if stop_check is not None and stop_check():
-        #         return
-        #     cur += 1
-        #     call_back(cur)
-        #     res = function(w)
-        #     results[str(w)] = res[1]#[str(r) for r in res[1]]
-        #     setattr(w.original, corpus_context.attribute.name, res[0])
     else:
-        iterable = ((w,) for w in corpus_context)
-        neighbors = score_mp(iterable, function, num_cores, call_back, stop_check, chunk_size= 1)
-        for n in neighbors:
-            #Have to look up the key, then look up the object due to how
-            #multiprocessing pickles objects
-            setattr(corpus_context.corpus.find(corpus_context.corpus.key(n[0])), corpus_context.attribute.name, n[1][0])
+        _build_shared_indexes(corpus_context, 'edit_distance', 1)
+        function = partial(find_mutation_minpairs, tier_type = tier_type,
+                            collapse_homophones = collapse_homophones)
+        minpairs = context_words_map_mp(corpus_context, function, num_cores,
+                                        call_back = call_back, stop_check = stop_check)
+        if minpairs is None:
+            return
+        for w, res in zip(corpus_context, minpairs):
+            results[str(w)] = res[1]
+            setattr(w.original, corpus_context.attribute.name, res[0])
 
     return results
 
@@ -291,33 +316,20 @@ def find_mutation_minpairs(corpus_context, query, tier_type = None, collapse_hom
     matches = []
     sequence_type = corpus_context.sequence_type
     query = ensure_query_is_word(query, corpus_context, corpus_context.sequence_type, tier_type)
-    if call_back is not None:
-        call_back('Finding neighbors...')
-        call_back(0,len(corpus_context))
-        cur = 0
-    al = Aligner(features_tf=False, ins_penalty=float('inf'), del_penalty=float('inf'), sub_penalty=1)
-    for w in corpus_context:
-        w_sequence = getattr(w, sequence_type)
-        query_sequence = getattr(query, sequence_type)
-        if stop_check is not None and stop_check():
-            return
-        if call_back is not None:
-            cur += 1
-            if cur % 10 == 0:
-                call_back(cur)
-        if (len(w_sequence) > len(query_sequence)+1 or
-            len(w_sequence) < len(query_sequence)-1):
-            continue
-        m = al.make_similarity_matrix(query_sequence, w_sequence)
-        if m[-1][-1]['f'] != 1:
-            continue
-
-        w_sequence = getattr(w, sequence_type)
-        if collapse_homophones and any(getattr(m, sequence_type) == w_sequence for m in matches):
-            continue
-        else:
-            #matches.append(str(w_sequence))
-            matches.append(w)
+    query_sequence = getattr(query, sequence_type)
+    index = get_deletion_index(corpus_context, 1, stop_check = stop_check, call_back = call_back)
+    if index is None:
+        return
+    # A neighbor of the same length differs by exactly one substitution
+    candidates = [c for c in index.neighbours(query_sequence)
+                  if len(c) == len(query_sequence) and list(c) != list(query_sequence)]
+    for candidate in candidates:
+        for w in index.words[candidate]:
+            w_sequence = getattr(w, sequence_type)
+            if collapse_homophones and any(getattr(m, sequence_type) == w_sequence for m in matches):
+                continue
+            else:
+                matches.append(w)
 
     matches = [m.spelling for m in matches]
     neighbors = list(set(matches)-set([str(query_sequence)]))
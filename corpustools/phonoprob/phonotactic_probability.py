@@ -1,10 +1,119 @@
 # -*- coding: utf-8 -*-
+from functools import partial
+
+import numpy as np
 
 from corpustools.corpus.classes import Word
 
 from corpustools.exceptions import PhonoProbError
 
 from corpustools.contextmanagers import ensure_context
+from corpustools.symbolsim.edit_distance import get_encoded_lexicon
+from corpustools.c_multiprocessing import map_mp
+
+# Number of words scored together by one process
+CHUNK_SIZE = 10000
+
+def _gramsize(probability_type):
+    if probability_type == 'unigram':
+        return 1
+    elif probability_type == 'bigram':
+        return 2
+
+def positional_probability_table(corpus_context, codes, probability_type = 'unigram'):
+    """
+    Arrange the positional probabilities of n-grams from
+    `get_phone_probs` as an array indexed by the codes of the segments.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    codes : dict
+        Mapping of each segment to its integer code, starting at 1, such
+        as the codes of an `EncodedLexicon`
+    probability_type : str
+        Either 'unigram' or 'bigram' probability
+
+    Returns
+    -------
+    numpy.ndarray
+        Array with one dimension per segment of an n-gram and a final
+        dimension for the position, holding NaN for n-grams that were
+        not seen at a position
+    """
+    gramsize = _gramsize(probability_type)
+    prob_dict = corpus_context.get_phone_probs(gramsize = gramsize)
+    num_positions = max([pos + 1 for (_, pos) in prob_dict.keys()], default = 0)
+    table = np.full((len(codes) + 1,) * gramsize + (num_positions,), np.nan)
+    for (gram, pos), prob in prob_dict.items():
+        try:
+            index = tuple(codes[s] for s in gram)
+        except KeyError:
+            continue
+        table[index + (pos,)] = prob
+    return table
+
+def score_sequences(table, sequences):
+    """
+    Calculate the Vitevitch & Luce phonotactic probability of encoded
+    sequences of the same length.
+
+    Parameters
+    ----------
+    table : numpy.ndarray
+        Positional probabilities from `positional_probability_table`
+    sequences : numpy.ndarray
+        2D array of encoded sequences, one per row
+
+    Returns
+    -------
+    numpy.ndarray
+        Phonotactic probability of each sequence, NaN for sequences with
+        an n-gram not seen at its position
+    """
+    gramsize = table.ndim - 1
+    num_grams = sequences.shape[1] - gramsize + 1
+    total = np.zeros(len(sequences))
+    if num_grams <= 0:
+        return total
+    # Added up one position at a time, in the same order as
+    # phonotactic_probability_vitevitch
+    for i in range(num_grams):
+        if i >= table.shape[-1]:
+            return np.full(len(sequences), np.nan)
+        index = tuple(sequences[:, i + j] for j in range(gramsize)) + (i,)
+        total = total + table[index]
+    return total / num_grams
+
+def _score_buckets(table, buckets, num_words, num_cores = -1, stop_check = None, call_back = None):
+    """
+    Score buckets of encoded sequences, mapping each length to an array
+    of indices and a 2D array of sequences like `EncodedLexicon.buckets`.
+    """
+    jobs = []
+    for length, (indices, sequences) in buckets.items():
+        for start in range(0, len(indices), CHUNK_SIZE):
+            jobs.append((indices[start:start + CHUNK_SIZE], sequences[start:start + CHUNK_SIZE]))
+    if call_back is not None:
+        call_back('Calculating phonotactic probabilities...')
+        call_back(0, len(jobs))
+    scores = np.full(num_words, np.nan)
+    if num_cores == -1 or num_cores == 1:
+        for cur, (indices, sequences) in enumerate(jobs):
+            if stop_check is not None and stop_check():
+                return
+            if call_back is not None:
+                call_back(cur)
+            scores[indices] = score_sequences(table, sequences)
+    else:
+        results = map_mp(partial(score_sequences, table), [(sequences,) for _, sequences in jobs],
+                        num_cores, call_back = call_back, stop_check = stop_check, chunk_size = 1)
+        if results is None:
+            return
+        for (indices, _), result in zip(jobs, results):
+            scores[indices] = result
+    return scores
 
 def phonotactic_probability_all_words(corpus_context, algorithm,
                                     probability_type = 'unigram',
@@ -22,33 +131,91 @@ def phonotactic_probability_all_words(corpus_context, algorithm,
         only 'vitevitch')
     probability_type : str
         Either 'unigram' or 'bigram' probability
+    num_cores : int, optional
+        Number of cores to use, -1 or 1 to use only one
     stop_check : callable, optional
         Optional function to check whether to gracefully terminate early
     call_back : callable, optional
         Optional function to supply progress information during the function
     """
     ensure_context(corpus_context)
-    if call_back is not None:
-        call_back('Calculating phonotactic probabilities...')
-        call_back(0,len(corpus_context))
-        cur = 0
-    num_cores = -1 # Multiprocessing not yet implemented
-    if num_cores == -1:
-        for w in corpus_context:
-            if stop_check is not None and stop_check():
-                break
-            if call_back is not None:
-                cur += 1
-                if cur % 20 == 0:
-                    call_back(cur)
-            if algorithm == 'vitevitch':
-                res = phonotactic_probability_vitevitch(corpus_context, w,
-                                        probability_type = probability_type,
-                                        stop_check = stop_check)
-                setattr(w.original, corpus_context.attribute.name,res)
+    if algorithm == 'vitevitch':
+        lexicon = get_encoded_lexicon(corpus_context, stop_check = stop_check,
+                                    call_back = call_back)
+        if lexicon is not None:
+            table = positional_probability_table(corpus_context, lexicon.codes, probability_type)
+            scores = _score_buckets(table, lexicon.buckets, len(lexicon), num_cores = num_cores,
+                                    stop_check = stop_check, call_back = call_back)
+        if lexicon is not None and scores is not None:
+            for w, res in zip(lexicon.words, scores):
+                if np.isnan(res):
+                    # Raises the error for the n-gram that was not found
+                    res = phonotactic_probability_vitevitch(corpus_context, w,
+                                        probability_type = probability_type)
+                setattr(w.original, corpus_context.attribute.name, float(res))
     if stop_check is not None and stop_check():
         corpus_context.corpus.remove_attribute(corpus_context.attribute)
 
+def phonotactic_probabilities(corpus_context, queries, algorithm,
+                                    probability_type = 'unigram',
+                                    num_cores = -1,
+                                    stop_check = None, call_back = None):
+    """Calculate the phonotactic probability of many words or nonwords at
+    once, such as a list of nonwords loaded from a file.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    queries : list of Word
+        The words whose phonotactic probability to calculate
+    algorithm : str
+        Algorithm to use for calculating phonotactic probability (currently
+        only 'vitevitch')
+    probability_type : str
+        Either 'unigram' or 'bigram' probability
+    num_cores : int, optional
+        Number of cores to use, -1 or 1 to use only one
+    stop_check : callable, optional
+        Optional function to check whether to gracefully terminate early
+    call_back : callable, optional
+        Optional function to supply progress information during the function
+
+    Returns
+    -------
+    list of float
+        Phonotactic probability of each query, or None if stopped early
+    """
+    ensure_context(corpus_context)
+    if algorithm != 'vitevitch':
+        return
+    lexicon = get_encoded_lexicon(corpus_context, stop_check = stop_check,
+                                call_back = call_back)
+    if lexicon is None:
+        return
+    buckets = {}
+    for i, q in enumerate(queries):
+        encoded = lexicon.encode(getattr(q, corpus_context.sequence_type))
+        indices, sequences = buckets.setdefault(len(encoded), ([], []))
+        indices.append(i)
+        sequences.append(encoded)
+    buckets = {length: (np.array(indices, dtype=int),
+                        np.array(sequences, dtype=np.int32).reshape(len(indices), length))
+                for length, (indices, sequences) in buckets.items()}
+    table = positional_probability_table(corpus_context, lexicon.codes, probability_type)
+    scores = _score_buckets(table, buckets, len(queries), num_cores = num_cores,
+                            stop_check = stop_check, call_back = call_back)
+    if scores is None:
+        return
+    results = []
+    for q, res in zip(queries, scores):
+        if np.isnan(res):
+            # Raises the error for the n-gram that was not found
+            res = phonotactic_probability_vitevitch(corpus_context, q,
+                                probability_type = probability_type)
+        results.append(float(res))
+    return results
+
 def phonotactic_probability(corpus_context, query, algorithm,
                                     probability_type = 'unigram',
                                     stop_check = None, call_back = None):
@@ -106,10 +273,7 @@ def phonotactic_probability_vitevitch(corpus_context, query,
     """
     ensure_context(corpus_context)
 
-    if probability_type == 'unigram':
-        gramsize = 1
-    elif probability_type == 'bigram':
-        gramsize = 2
+    gramsize = _gramsize(probability_type)
 
     prob_dict = corpus_context.get_phone_probs(gramsize = gramsize)
     sequence = zip(*[getattr(query, corpus_context.sequence_type)[i:] for i in range(gramsize)])
@@ -1,3 +1,4 @@
+from corpustools.corpus.classes import Corpus, EnvironmentMatcher
 
 
 def phonological_search(corpus, envs, sequence_type='transcription', call_back=None, stop_check=None,
@@ -33,10 +34,14 @@ def phonological_search(corpus, envs, sequence_type='transcription', call_back=N
     """
     if sequence_type == 'spelling':
         return None
+    if mode == 'segMode' and isinstance(corpus, Corpus):
+        return indexed_search(corpus, envs, sequence_type, call_back, stop_check, result_type)
     if call_back is not None:
         call_back('Searching...')
         call_back(0, len(corpus))
         cur = 0
+    if mode == 'segMode':
+        matcher = EnvironmentMatcher(envs)
     results = []
     for word in corpus:
         if stop_check is not None and stop_check():
@@ -48,9 +53,79 @@ def phonological_search(corpus, envs, sequence_type='transcription', call_back=N
         tier = getattr(word, sequence_type)
         found = []
 
-        for env in envs:
-            es = tier.find(env, mode)
-            if es is not None:
+        if mode == 'segMode':
+            for es in matcher.find(tier):
+                found.extend(es)
+        else:
+            for env in envs:
+                es = tier.find(env, mode)
+                if es is not None:
+                    found.extend(es)
+
+        if result_type == 'positive':
+            if found:
+                results.append((word, found))
+        else:
+            if not found:
+                results.append((word, found))
+    return results
+
+
+def indexed_search(corpus, envs, sequence_type='transcription', call_back=None, stop_check=None,
+                   result_type='positive'):
+    """
+    Perform a segment search of a corpus like `phonological_search`, only
+    testing the words and positions that the SegmentIndex of the corpus
+    finds for the middle segments of the environments.
+
+    Parameters
+    ----------
+    corpus : Corpus
+        Corpus to search
+    envs : list
+        EnvironmentFilters to search for
+    sequence_type : string
+        Specifies whether to use 'transcription' or the name of a
+        transcription tier to use for comparisons
+    stop_check : callable
+        Callable that returns a boolean for whether to exit before
+        finishing full calculation
+    call_back : callable
+        Function that can handle strings (text updates of progress),
+        tuples of two integers (0, total number of steps) and an integer
+        for updating progress out of the total set by a tuple
+
+    Returns
+    -------
+    list
+        A list of tuples with the first element a word and the second
+        a tuple of the segment and the environment that matched
+    """
+    index = corpus.get_segment_index(sequence_type)
+    matcher = EnvironmentMatcher(envs)
+    candidates = index.candidates(envs)
+    if result_type == 'positive':
+        keys = candidates
+    else:
+        keys = list(corpus.wordlist.keys())
+        candidates = set(candidates)
+    if call_back is not None:
+        call_back('Searching...')
+        call_back(0, len(keys))
+        cur = 0
+    results = []
+    for key in keys:
+        if stop_check is not None and stop_check():
+            return
+        if call_back is not None:
+            cur += 1
+            if cur % 20 == 0:
+                call_back(cur)
+        word = corpus.wordlist[key]
+        found = []
+        if result_type == 'positive' or key in candidates:
+            tier = getattr(word, sequence_type)
+            for es in matcher.find(tier, index.starts(key, envs)):
                 found.extend(es)
 
         if result_type == 'positive':
@@ -59,4 +134,4 @@ def phonological_search(corpus, envs, sequence_type='transcription', call_back=N
         else:
             if not found:
                 results.append((word, found))
-    return results
\ No newline at end of file
+    return results
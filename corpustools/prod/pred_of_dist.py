@@ -2,7 +2,8 @@ from collections import defaultdict, OrderedDict
 from math import log2
 import os
 
-from corpustools.corpus.classes import EnvironmentFilter
+from corpustools.corpus.classes import Corpus, EnvironmentFilter, EnvironmentMatcher
+from corpustools.contextmanagers import CanonicalVariantContext
 from corpustools.exceptions import ProdError, PCTError
 
 def check_envs(corpus_context, envs, stop_check, call_back):
@@ -15,6 +16,22 @@ def check_envs(corpus_context, envs, stop_check, call_back):
     missing_envs = defaultdict(set)
     overlapping_envs = defaultdict(dict)
 
+    matcher = EnvironmentMatcher(envs)
+    # Words without any of the middle segments match no environment, so
+    # only the other words need to be checked when they have the
+    # transcriptions of the corpus
+    candidates = None
+    if type(corpus_context) is CanonicalVariantContext and isinstance(corpus_context.corpus, Corpus):
+        index = corpus_context.corpus.get_segment_index(corpus_context.sequence_type)
+        middle = set()
+        for env in envs:
+            for m in env.middle:
+                if isinstance(m, str):
+                    middle.add(m)
+                else:
+                    middle.update(m)
+        candidates = {id(corpus_context.corpus.wordlist[key]) for key in index.words(middle)}
+
     if call_back is not None:
         call_back('Finding instances of environments...')
         call_back(0,len(corpus_context))
@@ -27,15 +44,14 @@ def check_envs(corpus_context, envs, stop_check, call_back):
             if cur % 100 == 0:
                 call_back(cur)
 
+        if candidates is not None and id(word.original) not in candidates:
+            continue
+
         tier = getattr(word, corpus_context.sequence_type)
         overlaps = defaultdict(list)
         found_env = False
-        for env in envs:
-            a = env.is_applicable(tier.with_word_boundaries())
-            if not a:
-                continue
-            es = tier.find(env)
-            if es is not None:
+        for env, es in zip(envs, matcher.find(tier)):
+            if es:
                 found_env = True
                 for e in es:
                     if is_sets:
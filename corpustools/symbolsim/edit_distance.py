@@ -1,3 +1,9 @@
+from collections import defaultdict
+import heapq
+import math
+
+import numpy as np
+
 from corpustools.corpus.classes import Word
 #from corpustools.symbolsim.phono_align import Aligner
 
@@ -73,6 +79,9 @@ def edit_distance(word1, word2, sequence_type, max_distance = None):
     string_type : string
         String specifying what attribute of the Word objects to compare,
         can be "spelling", "transcription" or a tier
+    max_distance : int or float, optional
+        If specified, only distances up to this bound are calculated, and
+        any larger distance is returned as ``float('inf')``
 
     Returns
     -------
@@ -82,6 +91,9 @@ def edit_distance(word1, word2, sequence_type, max_distance = None):
     s1 = getattr(word1, sequence_type)
     s2 = getattr(word2, sequence_type)
 
+    if max_distance is not None:
+        return bounded_edit_distance(list(s1), list(s2), max_distance)
+
     longer, shorter = (s1,s2) if len(s1) > len(s2) else (s2,s1)
 
     previous_row = range(len(shorter) + 1)
@@ -93,7 +105,510 @@ def edit_distance(word1, word2, sequence_type, max_distance = None):
             substitutions = previous_row[j] + (c1 != c2)
             current_row.append(min(insertions, deletions, substitutions))
         previous_row = current_row
-        #if max_distance is not None and previous_row[-1] > max_distance:
-        #    break
     return previous_row[-1]
 
+def bounded_edit_distance(s1, s2, max_distance):
+    """Returns the Levenshtein edit distance between two sequences if it
+    is no more than `max_distance`, and ``float('inf')`` otherwise.
+
+    Only the diagonal band of cells within `max_distance` of the main
+    diagonal can hold a distance within the bound, so only those are
+    filled in, and the calculation stops at the first row whose cells
+    all exceed the bound.
+
+    Parameters
+    ----------
+    s1: sequence
+        the first sequence of symbols to be compared
+    s2: sequence
+        the second sequence of symbols to be compared
+    max_distance : int or float
+        the largest distance to calculate
+
+    Returns
+    -------
+    int or float:
+        the edit distance between the sequences, or ``float('inf')``
+        if it is larger than `max_distance`
+    """
+    bound = math.floor(max_distance)
+    longer, shorter = (s1,s2) if len(s1) > len(s2) else (s2,s1)
+    if bound < 0 or len(longer) - len(shorter) > bound:
+        return float('inf')
+    if s1 == s2:
+        return 0
+
+    # Cells outside the band only need to compare as larger than the bound
+    outside = bound + 1
+    num_cols = len(shorter) + 1
+    previous_row = [j if j <= bound else outside for j in range(num_cols)]
+    for i, c1 in enumerate(longer, 1):
+        current_row = [outside] * num_cols
+        if i <= bound:
+            current_row[0] = i
+        row_min = current_row[0]
+        for j in range(max(1, i - bound), min(num_cols - 1, i + bound) + 1):
+            distance = previous_row[j - 1] + (c1 != shorter[j - 1])
+            insertion = previous_row[j] + 1
+            if insertion < distance:
+                distance = insertion
+            deletion = current_row[j - 1] + 1
+            if deletion < distance:
+                distance = deletion
+            if distance > outside:
+                distance = outside
+            current_row[j] = distance
+            if distance < row_min:
+                row_min = distance
+        if row_min > bound:
+            return float('inf')
+        previous_row = current_row
+    if previous_row[-1] > bound:
+        return float('inf')
+    return previous_row[-1]
+
+def batch_edit_distance(query, candidates, max_distance = None):
+    """Returns the Levenshtein edit distances between one encoded
+    sequence and a batch of encoded sequences of the same length.
+
+    The table for all candidates is filled in together, one row (symbol
+    of the query) at a time. If `max_distance` is specified, candidates
+    are dropped as soon as a whole row of theirs exceeds it.
+
+    Parameters
+    ----------
+    query: array of int
+        the encoded sequence to compare against
+    candidates: 2D array of int
+        the encoded sequences to be compared, one per row
+    max_distance : int or float, optional
+        If specified, distances above this bound are returned as
+        ``numpy.inf``
+
+    Returns
+    -------
+    array:
+        the edit distance between the query and each candidate
+    """
+    num_candidates, length = candidates.shape
+    cols = np.arange(length + 1)
+    if max_distance is None:
+        result = np.empty(num_candidates, dtype=int)
+    else:
+        bound = math.floor(max_distance)
+        result = np.full(num_candidates, np.inf)
+        if bound < 0 or abs(len(query) - length) > bound:
+            return result
+    remaining = np.arange(num_candidates)
+    previous_row = np.tile(cols, (num_candidates, 1))
+    for i, symbol in enumerate(query, 1):
+        current_row = np.empty_like(previous_row)
+        current_row[:, 0] = i
+        np.minimum(previous_row[:, :-1] + (candidates != symbol),
+                   previous_row[:, 1:] + 1, out=current_row[:, 1:])
+        # Deletions chain along the row: cell j is the minimum over k <= j
+        # of cell k plus (j - k)
+        current_row = np.minimum.accumulate(current_row - cols, axis=1) + cols
+        if max_distance is not None:
+            within = current_row.min(axis=1) <= bound
+            if not within.all():
+                remaining = remaining[within]
+                candidates = candidates[within]
+                current_row = current_row[within]
+                if not len(remaining):
+                    return result
+        previous_row = current_row
+    distances = previous_row[:, -1]
+    if max_distance is None:
+        result[remaining] = distances
+    else:
+        within = distances <= bound
+        result[remaining[within]] = distances[within]
+    return result
+
+class EncodedLexicon(object):
+    """
+    Words of a corpus context with their sequences encoded as arrays of
+    small integers, grouped by length, for batch edit distance calculations.
+
+    Parameters
+    ----------
+    sequence_type : str
+        Attribute of the Words to encode
+
+    Attributes
+    ----------
+    words : list of Word
+        The words in the order they were added
+    codes : dict
+        Mapping of each symbol to its integer code, starting at 1
+    buckets : dict
+        Mapping of each sequence length to a tuple of an array of indices
+        into `words` and a 2D array of encoded sequences
+    """
+    def __init__(self, sequence_type):
+        self.sequence_type = sequence_type
+        self.words = []
+        self.codes = {}
+        self.buckets = {}
+        self._pending = {}
+
+    def __len__(self):
+        return len(self.words)
+
+    def encode(self, sequence):
+        """
+        Encode a sequence of symbols, with 0 for symbols that are not in
+        the lexicon.
+        """
+        return np.array([self.codes.get(s, 0) for s in sequence], dtype=np.int32)
+
+    def add(self, word):
+        sequence = getattr(word, self.sequence_type)
+        encoded = []
+        for s in sequence:
+            try:
+                encoded.append(self.codes[s])
+            except KeyError:
+                self.codes[s] = len(self.codes) + 1
+                encoded.append(self.codes[s])
+        if len(encoded) not in self._pending:
+            self._pending[len(encoded)] = ([], [])
+        indices, sequences = self._pending[len(encoded)]
+        indices.append(len(self.words))
+        sequences.append(encoded)
+        self.words.append(word)
+
+    def pack(self):
+        """
+        Convert the words added so far into the arrays in `buckets`.
+        """
+        for length, (indices, sequences) in self._pending.items():
+            sequences = np.array(sequences, dtype=np.int32).reshape(len(indices), length)
+            indices = np.array(indices, dtype=int)
+            if length in self.buckets:
+                old_indices, old_sequences = self.buckets[length]
+                indices = np.concatenate([old_indices, indices])
+                sequences = np.concatenate([old_sequences, sequences])
+            self.buckets[length] = (indices, sequences)
+        self._pending = {}
+
+    def edit_distances(self, sequence, max_distance = None):
+        """
+        Calculate the edit distance between a sequence and every word.
+
+        Parameters
+        ----------
+        sequence : sequence
+            Sequence of symbols to compare against
+        max_distance : int or float, optional
+            If specified, only words of lengths within this bound are
+            compared, and larger distances are returned as ``numpy.inf``
+
+        Returns
+        -------
+        array
+            Edit distances, in the order of `words`
+        """
+        query = self.encode(sequence)
+        result = np.full(len(self.words), np.inf)
+        for length, (indices, sequences) in self.buckets.items():
+            if max_distance is not None and abs(length - len(query)) > max_distance:
+                continue
+            result[indices] = batch_edit_distance(query, sequences, max_distance)
+        return result
+
+    def nearest(self, query_length, k, bucket_distances, max_distance = None, min_distance = None):
+        """
+        Find the `k` words with the smallest distances to a query.
+
+        Buckets are visited from the length of the query outwards, and the
+        k-th smallest distance found so far is passed on as the bound for
+        the following buckets, so most of their calculations stop early.
+
+        Parameters
+        ----------
+        query_length : int
+            Length of the query
+        k : int
+            Number of words to find
+        bucket_distances : callable
+            Function taking a length, the 2D array of encoded sequences of
+            that length and a bound (or None), and returning their
+            distances, with ``numpy.inf`` for those above the bound
+        max_distance : int or float, optional
+            If specified, words further than this are not returned
+        min_distance : int or float, optional
+            If specified, words closer than this are not returned
+
+        Returns
+        -------
+        list of tuples
+            Index into `words` and distance of the nearest words, from the
+            nearest, with ties in the order of `words`
+        """
+        if k <= 0:
+            return []
+        # Heap of the best words so far, with the worst on top
+        heap = []
+        for length in sorted(self.buckets, key = lambda l: (abs(l - query_length), l)):
+            cutoff = max_distance
+            if len(heap) == k:
+                worst = -heap[0][0]
+                cutoff = worst if cutoff is None else min(cutoff, worst)
+            indices, sequences = self.buckets[length]
+            distances = bucket_distances(length, sequences, cutoff)
+            found = np.isfinite(distances)
+            if min_distance is not None:
+                found &= distances >= min_distance
+            for i in np.flatnonzero(found):
+                item = (-distances[i], -indices[i])
+                if len(heap) < k:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+        return [(-index, -distance) for distance, index in sorted(heap, reverse = True)]
+
+def get_encoded_lexicon(corpus_context, stop_check = None, call_back = None):
+    """
+    Generate (and cache) the encoded lexicon of a corpus context.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    stop_check : callable, optional
+        Optional function to check whether to gracefully terminate early
+    call_back : callable, optional
+        Optional function to supply progress information during the function
+
+    Returns
+    -------
+    EncodedLexicon
+        Encoded lexicon for the sequence type of the context, or None if
+        stopped early
+    """
+    key = corpus_context.sequence_type
+    if key in corpus_context._encoded_lexicon:
+        return corpus_context._encoded_lexicon[key]
+    if call_back is not None:
+        call_back('Encoding words...')
+        call_back(0, len(corpus_context))
+        cur = 0
+    lexicon = EncodedLexicon(corpus_context.sequence_type)
+    for w in corpus_context:
+        if stop_check is not None and stop_check():
+            return
+        if call_back is not None:
+            cur += 1
+            if cur % 100 == 0:
+                call_back(cur)
+        lexicon.add(w)
+    lexicon.pack()
+    corpus_context._encoded_lexicon[key] = lexicon
+    return lexicon
+
+def deletion_variants(sequence, max_deletions):
+    """Returns every sequence that can be made by deleting up to
+    `max_deletions` symbols from a sequence, including the sequence itself.
+
+    Parameters
+    ----------
+    sequence: tuple
+        the sequence of symbols
+    max_deletions : int
+        the largest number of symbols to delete
+
+    Returns
+    -------
+    dict:
+        Mapping of each deletion variant to the smallest number of
+        deletions that makes it
+    """
+    variants = {sequence: 0}
+    frontier = [sequence]
+    for num_deletions in range(1, max_deletions + 1):
+        next_frontier = []
+        for v in frontier:
+            for i in range(len(v)):
+                deleted = v[:i] + v[i+1:]
+                if deleted not in variants:
+                    variants[deleted] = num_deletions
+                    next_frontier.append(deleted)
+        frontier = next_frontier
+    return variants
+
+class DeletionIndex(object):
+    """
+    Index of words for finding all words within an edit distance of a
+    query.
+
+    Two sequences are within edit distance `k` of each other exactly when
+    deleting at most `k` symbols from each of them can make them the same,
+    so every distinct sequence is indexed under its deletion variants, and
+    only the sequences sharing a variant with the query are considered.
+    A shared variant reached by `i` deletions from one and `j` from the
+    other also shows that their distance is at most `i + j`, so the edit
+    distance is only calculated when that does not settle it.
+
+    Parameters
+    ----------
+    sequence_type : str
+        Attribute of the Words to index
+    max_distance : int
+        Largest edit distance that can be queried
+
+    Attributes
+    ----------
+    words : dict
+        Mapping of each distinct sequence (as a tuple) to the list of
+        words that have it
+    variants : dict
+        Mapping of each deletion variant to a dictionary of the sequences
+        it comes from and the number of deletions needed
+    codes : dict
+        Mapping of each symbol to its integer code, starting at 1
+    encoded : dict
+        Mapping of each distinct sequence to its list of integer codes
+    """
+    def __init__(self, sequence_type, max_distance):
+        self.sequence_type = sequence_type
+        self.max_distance = int(max_distance)
+        self.words = defaultdict(list)
+        self.variants = defaultdict(dict)
+        self.codes = {}
+        self.encoded = {}
+
+    def add(self, word):
+        sequence = tuple(getattr(word, self.sequence_type))
+        if sequence not in self.words:
+            for v, num_deletions in deletion_variants(sequence, self.max_distance).items():
+                self.variants[v][sequence] = num_deletions
+            for s in sequence:
+                if s not in self.codes:
+                    self.codes[s] = len(self.codes) + 1
+            self.encoded[sequence] = [self.codes[s] for s in sequence]
+        self.words[sequence].append(word)
+
+    def candidates(self, sequence, max_distance = None):
+        """
+        Get the distinct sequences that share a deletion variant with a
+        sequence, which include all sequences within the edit distance.
+
+        Returns
+        -------
+        dict
+            Mapping of each candidate sequence to an upper bound on its
+            edit distance from `sequence`
+        """
+        if max_distance is None:
+            max_distance = self.max_distance
+        candidates = {}
+        for v, i in deletion_variants(tuple(sequence), int(max_distance)).items():
+            if v not in self.variants:
+                continue
+            for candidate, j in self.variants[v].items():
+                if i + j < candidates.get(candidate, i + j + 1):
+                    candidates[candidate] = i + j
+        return candidates
+
+    def neighbours(self, sequence, max_distance = None):
+        """
+        Find all distinct sequences within an edit distance of a sequence.
+
+        Parameters
+        ----------
+        sequence : sequence
+            Sequence of symbols to search around
+        max_distance : int or float, optional
+            Largest edit distance of the sequences to return, at most (and
+            by default) the `max_distance` of the index
+
+        Returns
+        -------
+        list of tuple
+            The sequences within the distance
+        """
+        if max_distance is None:
+            max_distance = self.max_distance
+        elif int(max_distance) > self.max_distance:
+            raise(ValueError('The index only supports distances up to {}.'.format(self.max_distance)))
+        sequence = tuple(sequence)
+        results = []
+        undecided = defaultdict(list)
+        for candidate, upper_bound in self.candidates(sequence, max_distance).items():
+            if upper_bound <= max_distance:
+                results.append(candidate)
+            else:
+                undecided[len(candidate)].append(candidate)
+        if undecided:
+            # Settle the rest in batches of the same length
+            query = np.array([self.codes.get(s, 0) for s in sequence], dtype=np.int32)
+            for length, group in undecided.items():
+                encoded = np.array([self.encoded[c] for c in group],
+                                   dtype=np.int32).reshape(len(group), length)
+                distances = batch_edit_distance(query, encoded, max_distance)
+                results.extend(c for c, d in zip(group, distances) if d <= max_distance)
+        return results
+
+    def query(self, sequence, max_distance = None):
+        """
+        Find all words within an edit distance of a sequence.
+
+        Parameters
+        ----------
+        sequence : sequence
+            Sequence of symbols to search around
+        max_distance : int or float, optional
+            Largest edit distance of the words to return, at most (and by
+            default) the `max_distance` of the index
+
+        Returns
+        -------
+        list of Word
+            The words within the distance
+        """
+        results = []
+        for neighbour in self.neighbours(sequence, max_distance):
+            results.extend(self.words[neighbour])
+        return results
+
+def get_deletion_index(corpus_context, max_distance, stop_check = None, call_back = None):
+    """
+    Generate (and cache) a deletion index of a corpus context.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    max_distance : int or float
+        Largest edit distance the index will be queried with
+    stop_check : callable, optional
+        Optional function to check whether to gracefully terminate early
+    call_back : callable, optional
+        Optional function to supply progress information during the function
+
+    Returns
+    -------
+    DeletionIndex
+        Deletion index for the sequence type of the context, or None if
+        stopped early
+    """
+    key = (corpus_context.sequence_type, int(max_distance))
+    if key in corpus_context._deletion_index:
+        return corpus_context._deletion_index[key]
+    if call_back is not None:
+        call_back('Indexing words...')
+        call_back(0, len(corpus_context))
+        cur = 0
+    index = DeletionIndex(corpus_context.sequence_type, max_distance)
+    for w in corpus_context:
+        if stop_check is not None and stop_check():
+            return
+        if call_back is not None:
+            cur += 1
+            if cur % 100 == 0:
+                call_back(cur)
+        index.add(w)
+    corpus_context._deletion_index[key] = index
+    return index
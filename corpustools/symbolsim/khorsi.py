@@ -1,11 +1,127 @@
 
 from collections import defaultdict
+from functools import lru_cache
 from math import log
 
+class SuffixAutomaton(object):
+    """
+    Suffix automaton of a sequence of segments, for finding its longest
+    common substring with other sequences in time linear in their length.
+
+    Parameters
+    ----------
+    sequence : iterable
+        Sequence of segments (or characters)
+
+    Attributes
+    ----------
+    sequence : list
+        The segments of the sequence
+    transitions : list of dict
+        Mapping of segments to the next state, for each state
+    links : list of int
+        Suffix link of each state, -1 for the initial state
+    lengths : list of int
+        Length of the longest substring reaching each state
+    first_ends : list of int
+        Index in `sequence` where the first occurrence of the substrings
+        reaching each state ends
+    """
+    def __init__(self, sequence):
+        self.sequence = list(sequence)
+        self.transitions = [{}]
+        self.links = [-1]
+        self.lengths = [0]
+        self.first_ends = [-1]
+        last = 0
+        for i, segment in enumerate(self.sequence):
+            current = self._add_state(self.lengths[last] + 1, i)
+            p = last
+            while p != -1 and segment not in self.transitions[p]:
+                self.transitions[p][segment] = current
+                p = self.links[p]
+            if p == -1:
+                self.links[current] = 0
+            else:
+                q = self.transitions[p][segment]
+                if self.lengths[p] + 1 == self.lengths[q]:
+                    self.links[current] = q
+                else:
+                    clone = self._add_state(self.lengths[p] + 1, self.first_ends[q])
+                    self.transitions[clone] = dict(self.transitions[q])
+                    self.links[clone] = self.links[q]
+                    while p != -1 and self.transitions[p].get(segment) == q:
+                        self.transitions[p][segment] = clone
+                        p = self.links[p]
+                    self.links[q] = clone
+                    self.links[current] = clone
+            last = current
+
+    def _add_state(self, length, first_end):
+        self.transitions.append({})
+        self.links.append(-1)
+        self.lengths.append(length)
+        self.first_ends.append(first_end)
+        return len(self.lengths) - 1
+
+    def longest_common_substring(self, other):
+        """
+        Find the longest substring shared with another sequence.
+
+        Among substrings of the longest length, the one starting earliest
+        in `other` is found, along with its first occurrence in the
+        automaton's sequence.
+
+        Parameters
+        ----------
+        other : sequence
+            Sequence of segments to compare
+
+        Returns
+        -------
+        tuple
+            Start of the substring in `other`, start of it in the
+            automaton's sequence, and its length (0 if none is shared)
+        """
+        state = 0
+        length = 0
+        best = (0, 0, 0)
+        for i, segment in enumerate(other):
+            while state and segment not in self.transitions[state]:
+                state = self.links[state]
+                length = self.lengths[state]
+            if segment in self.transitions[state]:
+                state = self.transitions[state][segment]
+                length += 1
+            if length > best[2]:
+                best = (i - length + 1, self.first_ends[state] - length + 1, length)
+        return best
+
+@lru_cache(maxsize=10000)
+def suffix_automaton(sequence):
+    """
+    Build (and cache) the suffix automaton of a sequence.
+
+    Parameters
+    ----------
+    sequence : tuple
+        Sequence of segments (or characters)
+
+    Returns
+    -------
+    SuffixAutomaton
+        The suffix automaton, shared with other calls for the same sequence
+    """
+    return SuffixAutomaton(sequence)
+
 def lcs(x1, x2):
     """Returns the longest common sequence of two lists of characters
     and the remainder elements not in the longest common sequence
 
+    If there are several longest common sequences, the one that starts
+    earliest in the shorter list is used, and its first occurrence in the
+    longer list is taken out of it.
+
     Parameters
     ----------
     x1: list
@@ -29,45 +145,18 @@ def lcs(x1, x2):
     else:
         longer = x2
         shorter = x1
-    stringMatches = []
-    largestMatch = None
-    for i in range(len(shorter),0,-1):
-        #Get all possible substrings of word x1
-        shorter_strings = substring_set(shorter, i)
-        longer_strings = substring_set(longer, i)
-
-        s = shorter_strings & longer_strings
-
-        if len(s):
-            break
-    else:
+    shorter_begin, longer_begin, length = suffix_automaton(tuple(longer)).longest_common_substring(shorter)
+    if length == 0:
         return [], longer+shorter
 
+    longer = list(longer)
+    shorter = list(shorter)
     leftover = []
-    for i in range(len(shorter)):
-
-        begin = i
-        for lcs in s:
-            lcs = lcs.split('.') #back to list
-            end = i+len(lcs)
-            if shorter[begin:end] == lcs:
-                break
-        else:
-            lcs = None
-        if lcs is not None:
-            break
-    if lcs is None:
-        lcs = []
-    leftover.extend(shorter[:begin])
-    leftover.extend(shorter[end:])
-    for i in range(len(longer)):
-        begin = i
-        end = i+len(lcs)
-        if longer[begin:end] == lcs:
-            break
-    leftover.extend(longer[:begin])
-    leftover.extend(longer[end:])
-    return lcs,leftover
+    leftover.extend(shorter[:shorter_begin])
+    leftover.extend(shorter[shorter_begin+length:])
+    leftover.extend(longer[:longer_begin])
+    leftover.extend(longer[longer_begin+length:])
+    return shorter[shorter_begin:shorter_begin+length], leftover
 
 def substring_set(w, l):
     """Returns all substrings of a word w of length l
@@ -94,7 +183,24 @@ def substring_set(w, l):
         substrings.update(['.'.join(sub)])
     return substrings
 
-def khorsi(word1, word2, freq_base, sequence_type, max_distance = None):
+def khorsi_log_terms(freq_base):
+    """Precompute the log term of each segment for `khorsi`
+
+    Parameters
+    ----------
+    freq_base: dictionary
+        a dictionary where each segment is mapped to its frequency of
+        occurrence in a corpus, with the total under 'total'
+
+    Returns
+    -------
+    dict
+        Mapping of each segment to log(1/(frequency/total))
+    """
+    total = freq_base['total']
+    return {k: log(1/(v/total)) for k, v in freq_base.items() if k != 'total' and v}
+
+def khorsi(word1, word2, freq_base, sequence_type, max_distance = None, log_terms = None):
     """Calculate the string similarity of two words given a set of
     characters and their frequencies in a corpus based on Khorsi (2012)
 
@@ -114,6 +220,10 @@ def khorsi(word1, word2, freq_base, sequence_type, max_distance = None):
         The type of segments to be used ('spelling' = Roman letters,
         'transcription' = IPA symbols)
 
+    log_terms: dictionary, optional
+        Log terms of the segments from `khorsi_log_terms(freq_base)`,
+        to avoid recalculating them when comparing many words
+
     Returns
     -------
     float
@@ -125,17 +235,21 @@ def khorsi(word1, word2, freq_base, sequence_type, max_distance = None):
         w1 = list(w1)
         w2 = list(w2)
     longest, left_over = lcs(w1, w2)
-    #print(w1,w2)
-    #print(longest,left_over)
+
+    if log_terms is None:
+        log_terms = {}
+    def log_term(x):
+        try:
+            return log_terms[x]
+        except KeyError:
+            return log(1/(freq_base[x]/freq_base['total']))
 
     #Khorsi's algorithm
-    #print([(freq_base[x]/freq_base['total']) for x in longest])
     khorsi_sum = 0
     for x in longest:
-        khorsi_sum += log(1/(freq_base[x]/freq_base['total']))
+        khorsi_sum += log_term(x)
     for x in left_over:
-        khorsi_sum -= log(1/(freq_base[x]/freq_base['total']))
+        khorsi_sum -= log_term(x)
         if max_distance is not None and khorsi_sum < max_distance:
             break
     return khorsi_sum
-
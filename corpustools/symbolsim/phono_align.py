@@ -7,6 +7,12 @@
 from collections import defaultdict
 from codecs import open
 
+import numpy as np
+
+# Directions of the traceback in Aligner.morpho_related_sequences, in the
+# order that generate_alignment prefers them
+_ABOVELEFT, _ABOVE, _LEFT = 1, 2, 3
+
 class Aligner(object):
 
     def __init__(self, features_tf=True, ins_penalty=1, del_penalty=1,
@@ -21,6 +27,7 @@ class Aligner(object):
         self.features = features
         self.underspec_cost = underspec_cost # should be set to 1.0 to disable underspecification
         self.ins_del_basis = ins_del_basis
+        self._segment_index = None
 
         if features_tf:
             if self.ins_del_basis == 'empty':
@@ -44,7 +51,115 @@ class Aligner(object):
         alignment = self.generate_alignment(seq1, seq2, similarity_matrix)
         return alignment
 
-
+    def build_cost_tables(self):
+        """
+        Precompute the costs of substituting, inserting and deleting each
+        segment of the feature matrix.
+
+        Costs are those given by `compare_segments`, with segments
+        numbered in `_segment_index`.  The tables are built on first use,
+        so changes to the feature matrix after that are not seen by this
+        Aligner.
+        """
+        matrix = getattr(self.features, 'matrix', self.features)
+        symbols = sorted(matrix.keys())
+        if symbols:
+            feature_names = list(matrix[symbols[0]].keys())
+        else:
+            feature_names = []
+        values = np.array([[matrix[symbol].get(f) for f in feature_names] for symbol in symbols],
+                          dtype=object).reshape(len(symbols), len(feature_names))
+        unspecified = values == '0'
+
+        # Feature differences are added up one feature at a time, in the
+        # same order as compare_segments, so that the float totals (and
+        # so ties between alignments) come out identical
+        empty_costs = np.zeros(len(symbols))
+        sub_costs = np.zeros((len(symbols), len(symbols)))
+        for f in range(len(feature_names)):
+            column = values[:, f]
+            empty_costs += np.where(unspecified[:, f], 0, self.underspec_cost)
+            differ = column[:, None] != column[None, :]
+            underspecified = unspecified[:, f][:, None] | unspecified[:, f][None, :]
+            sub_costs += np.where(differ, np.where(underspecified, self.underspec_cost, 1), 0)
+        if self.ins_del_basis == 'average':
+            empty_costs = np.full(len(symbols), float(self.ins_del_difference))
+
+        self._segment_index = {symbol: i for i, symbol in enumerate(symbols)}
+        self.sub_cost_array = sub_costs * self.sub_penalty
+        self.ins_cost_array = empty_costs * self.ins_penalty
+        self.del_cost_array = empty_costs * self.del_penalty
+        self._sub_costs = self.sub_cost_array.tolist()
+        self._ins_costs = self.ins_cost_array.tolist()
+        self._del_costs = self.del_cost_array.tolist()
+
+    def segment_codes(self, seq):
+        """
+        Return the indices of segments in the cost tables, building the
+        tables first if needed.
+        """
+        if self._segment_index is None:
+            self.build_cost_tables()
+        return [self._segment_index[s if type(s) is str else s.symbol] for s in seq]
+
+    def _costs(self, seq1, seq2):
+        # Deletion costs for seq1, insertion costs for seq2 and rows of
+        # substitution costs between them
+        if self.features_tf:
+            codes1 = self.segment_codes(seq1)
+            codes2 = self.segment_codes(seq2)
+            dels = [self._del_costs[c] for c in codes1]
+            inss = [self._ins_costs[c] for c in codes2]
+            subs = [[self._sub_costs[c1][c2] for c2 in codes2] for c1 in codes1]
+        else:
+            dels = [self.del_penalty] * len(seq1)
+            inss = [self.ins_penalty] * len(seq2)
+            subs = [[int(s1 != s2) * self.sub_penalty for s2 in seq2] for s1 in seq1]
+        return dels, inss, subs
+
+    def distance(self, seq1, seq2, max_distance=None):
+        """
+        Calculate the alignment score of two sequences, without keeping
+        what is needed to trace back the alignment.
+
+        Parameters
+        ----------
+        seq1 : iterable
+            First sequence of segments
+        seq2 : iterable
+            Second sequence of segments
+        max_distance : float, optional
+            If specified, the calculation stops as soon as a whole row of
+            the table exceeds it
+
+        Returns
+        -------
+        float
+            The score of the best alignment, same as the final cell of
+            `make_similarity_matrix`, or ``float('inf')`` if it is larger
+            than `max_distance`
+        """
+        seq1 = list(seq1)
+        seq2 = list(seq2)
+        dels, inss, subs = self._costs(seq1, seq2)
+
+        previous = [0]
+        for ins in inss:
+            previous.append(previous[-1] + ins)
+        for x in range(len(seq1)):
+            sub_row = subs[x]
+            deletion = dels[x]
+            current = [previous[0] + deletion]
+            for y in range(len(seq2)):
+                current.append(min(previous[y] + sub_row[y],
+                                   current[y] + inss[y],
+                                   previous[y + 1] + deletion))
+            if max_distance is not None and min(current) > max_distance:
+                return float('inf')
+            previous = current
+        if max_distance is not None and previous[-1] > max_distance:
+            return float('inf')
+        return previous[-1]
 
     def make_similarity_matrix(self, seq1=None, seq2=None):
 
@@ -52,6 +167,7 @@ class Aligner(object):
 
         seq1 = list(seq1)
         seq2 = list(seq2)
+        dels, inss, subs = self._costs(seq1, seq2)
 
         def compare(x, y):
             return x - y <= self.tolerance
@@ -66,18 +182,18 @@ class Aligner(object):
         d[0][0]['f'] = 0
 
         for x in range(1, len(seq1)+1):
-            d[x][0]['f'] = d[x-1][0]['f'] + self.compare_segments(seq1[x-1], 'empty', self.underspec_cost)
+            d[x][0]['f'] = d[x-1][0]['f'] + dels[x-1]
             d[x][0]['left'] = 1
 
         for y in range(1, len(seq2)+1):
-            d[0][y]['f'] = d[0][y-1]['f'] + self.compare_segments('empty', seq2[y-1], self.underspec_cost)
+            d[0][y]['f'] = d[0][y-1]['f'] + inss[y-1]
             d[0][y]['above'] = 1
 
         for x in range(1, len(seq1)+1):
             for y in range(1, len(seq2)+1):
-                aboveleft = (d[x - 1][y - 1]['f'] + self.compare_segments(seq1[x-1], seq2[y-1], self.underspec_cost))
-                left = d[x - 1][y]['f'] + self.compare_segments(seq1[x-1], 'empty', self.underspec_cost)
-                above = d[x][y - 1]['f'] + self.compare_segments('empty', seq2[y-1], self.underspec_cost)
+                aboveleft = d[x - 1][y - 1]['f'] + subs[x-1][y-1]
+                left = d[x - 1][y]['f'] + dels[x-1]
+                above = d[x][y - 1]['f'] + inss[y-1]
 
                 if compare(aboveleft,above) and compare(aboveleft,left):
                     d[x][y]['f'] = aboveleft
@@ -169,6 +285,100 @@ class Aligner(object):
 
         return current_alignment
 
+    def morpho_related_sequences(self, seq1, seq2, s1, s2):
+        """
+        Check whether two sequences are morphologically related through an
+        alternation of two segments, without building the alignment.
+
+        This gives the same result as
+        ``morpho_related(align(seq1, seq2), s1, s2)``: the table is filled
+        in the same way, with ties broken as in `generate_alignment`, but
+        only the preferred direction of each cell is kept and the
+        traceback is checked directly.
+
+        Parameters
+        ----------
+        seq1 : iterable
+            First sequence of segments
+        seq2 : iterable
+            Second sequence of segments
+        s1 : str
+            First segment of the alternation
+        s2 : str
+            Second segment of the alternation
+
+        Returns
+        -------
+        bool
+            True if the first run of aligned segments is made up of
+            identical segments and at least one alternation of `s1` and `s2`
+        """
+        seq1 = list(seq1)
+        seq2 = list(seq2)
+        dels, inss, subs = self._costs(seq1, seq2)
+        tolerance = self.tolerance
+        width = len(seq2) + 1
+
+        directions = bytearray([_ABOVE]) * width
+        previous = [0]
+        for ins in inss:
+            previous.append(previous[-1] + ins)
+        for x in range(len(seq1)):
+            sub_row = subs[x]
+            deletion = dels[x]
+            row = bytearray(width)
+            row[0] = _LEFT
+            current = [previous[0] + deletion]
+            for y in range(len(seq2)):
+                aboveleft = previous[y] + sub_row[y]
+                above = current[y] + inss[y]
+                left = previous[y + 1] + deletion
+                if aboveleft - above <= tolerance and aboveleft - left <= tolerance:
+                    row[y + 1] = _ABOVELEFT
+                elif above - aboveleft <= tolerance and above - left <= tolerance:
+                    row[y + 1] = _ABOVE
+                else:
+                    row[y + 1] = _LEFT
+                current.append(min(aboveleft, above, left))
+            directions += row
+            previous = current
+
+        # Trace back from the end, keeping the aligned pairs of positions
+        # and None for insertions and deletions
+        steps = []
+        x = len(seq1)
+        y = len(seq2)
+        while x > 0 or y > 0:
+            direction = directions[x * width + y]
+            if direction == _ABOVELEFT:
+                x -= 1
+                y -= 1
+                steps.append((x, y))
+            else:
+                if direction == _ABOVE:
+                    y -= 1
+                else:
+                    x -= 1
+                steps.append(None)
+
+        found_alternation = False
+        in_core = False
+        for step in reversed(steps):
+            if step is None:
+                if in_core:
+                    break
+                continue
+            in_core = True
+            elem1 = seq1[step[0]]
+            elem2 = seq2[step[1]]
+            if elem1 == elem2:
+                continue
+            if (elem1 == s1 and elem2 == s2) or (elem1 == s2 and elem2 == s1):
+                found_alternation = True
+                continue
+            return False
+        return found_alternation
+
     def morpho_related(self, alignment, s1, s2):
         core = []
         adding = 0
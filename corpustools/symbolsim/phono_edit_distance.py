@@ -1,8 +1,35 @@
 
 
+import numpy as np
+
 from corpustools.symbolsim.phono_align import Aligner
 
-def phono_edit_distance(word1, word2, sequence_type, features):
+# The Aligner for the most recently used FeatureMatrix, with its cost
+# tables, as (features, revision, aligner)
+_cached_aligner = (None, None, None)
+
+def get_aligner(features):
+    """Return an Aligner for the FeatureMatrix, reusing the one (and its
+    precomputed cost tables) from the previous call with the same matrix,
+    unless the matrix has been changed since.
+
+    Parameters
+    ----------
+    features: FeatureMatrix
+        FeatureMatrix to align with
+
+    Returns
+    -------
+    Aligner
+        Aligner with features_tf set to True
+    """
+    global _cached_aligner
+    revision = getattr(features, 'revision', None)
+    if _cached_aligner[0] is not features or _cached_aligner[1] != revision:
+        _cached_aligner = (features, revision, Aligner(features_tf=True, features=features))
+    return _cached_aligner[2]
+
+def phono_edit_distance(word1, word2, sequence_type, features, max_distance = None):
     """Returns an analogue to Levenshtein edit distance but uses
     phonological _features instead of characters
 
@@ -23,6 +50,10 @@ def phono_edit_distance(word1, word2, sequence_type, features):
         FeatureMatrix that contains all the segments in both transcriptions
         to be compared
 
+    max_distance: float, optional
+        If specified, the calculation stops once the distance is known to
+        be larger than this, and ``float('inf')`` is returned
+
     Returns
     -------
     float
@@ -32,10 +63,149 @@ def phono_edit_distance(word1, word2, sequence_type, features):
     w1 = getattr(word1,sequence_type)
     w2 = getattr(word2,sequence_type)
 
+    return get_aligner(features).distance(w1, w2, max_distance)
+
+def batch_phono_edit_distance(aligner, query, candidates, max_distance = None):
+    """Returns the phonological edit distances between one sequence and a
+    batch of sequences of the same length, all given as indices into the
+    cost tables of an Aligner.
+
+    The tables for all candidates are filled in together, one row (segment
+    of the query) at a time, adding costs in the same order as
+    `Aligner.distance`. If `max_distance` is specified, candidates are
+    dropped as soon as a whole row of theirs exceeds it.
+
+    Parameters
+    ----------
+    aligner: Aligner
+        Aligner with features_tf set to True
+    query: array of int
+        Segment indices of the sequence to compare against
+    candidates: 2D array of int
+        Segment indices of the sequences to be compared, one per row
+    max_distance: float, optional
+        If specified, distances above this bound are returned as
+        ``numpy.inf``
+
+    Returns
+    -------
+    array
+        the phonological edit distance between the query and each candidate
+    """
+    num_candidates, length = candidates.shape
+    result = np.full(num_candidates, np.inf)
+    remaining = np.arange(num_candidates)
+    ins_costs = aligner.ins_cost_array[candidates]
+    previous_row = np.zeros((num_candidates, length + 1))
+    previous_row[:, 1:] = np.cumsum(ins_costs, axis=1)
+    for segment in query:
+        deletion = aligner.del_cost_array[segment]
+        substitutions = aligner.sub_cost_array[segment][candidates]
+        current_row = np.empty_like(previous_row)
+        current_row[:, 0] = previous_row[:, 0] + deletion
+        np.minimum(previous_row[:, :-1] + substitutions,
+                   previous_row[:, 1:] + deletion, out=current_row[:, 1:])
+        # Insertion costs vary by segment, so they are chained along the
+        # row one column at a time
+        for j in range(length):
+            np.minimum(current_row[:, j + 1], current_row[:, j] + ins_costs[:, j],
+                       out=current_row[:, j + 1])
+        if max_distance is not None:
+            within = current_row.min(axis=1) <= max_distance
+            if not within.all():
+                remaining = remaining[within]
+                candidates = candidates[within]
+                ins_costs = ins_costs[within]
+                current_row = current_row[within]
+                if not len(remaining):
+                    return result
+        previous_row = current_row
+    distances = previous_row[:, -1]
+    if max_distance is None:
+        result[remaining] = distances
+    else:
+        within = distances <= max_distance
+        result[remaining[within]] = distances[within]
+    return result
+
+# Allowance for rounding when comparing bounds (such as the length-based
+# lower bound) against relatedness thresholds, as they add up costs or
+# log terms in a different order than the full calculation
+_BOUND_TOLERANCE = 1e-9
+
+def phono_bucket_distances(lexicon, features, sequence):
+    """Returns a function calculating the phonological edit distances
+    between a sequence and the words of one length bucket of an encoded
+    lexicon, for use with `EncodedLexicon.nearest`.
+
+    If a bound is given, buckets are skipped when the difference in length
+    alone means too many insertions or deletions, using the cheapest
+    insertion cost and the cheapest deletion costs of the query's segments
+    as lower bounds.
+
+    Parameters
+    ----------
+    lexicon: EncodedLexicon
+        Words to compare against, such as from `get_encoded_lexicon`
+    features: FeatureMatrix
+        FeatureMatrix that contains all the segments of the lexicon and
+        the sequence
+    sequence: sequence
+        Sequence of segments to compare
+
+    Returns
+    -------
+    callable
+        Function taking a length, the encoded sequences of that length and
+        a bound (or None), and returning their distances to the sequence
+    """
+    aligner = get_aligner(features)
+    query = np.array(aligner.segment_codes(sequence), dtype=int)
+    segment_indices = np.zeros(len(lexicon.codes) + 1, dtype=int)
+    for symbol, code in lexicon.codes.items():
+        segment_indices[code] = aligner.segment_codes([symbol])[0]
+    min_ins_cost = aligner.ins_cost_array.min() if len(aligner.ins_cost_array) else 0
+    query_del_costs = np.sort(aligner.del_cost_array[query])
 
-    a = Aligner(features_tf=True, features=features)
+    def bucket_distances(length, sequences, max_distance):
+        if max_distance is not None:
+            if length > len(query):
+                lower_bound = (length - len(query)) * min_ins_cost
+            else:
+                lower_bound = query_del_costs[:len(query) - length].sum()
+            if lower_bound - _BOUND_TOLERANCE > max_distance:
+                return np.full(len(sequences), np.inf)
+        return batch_phono_edit_distance(aligner, query, segment_indices[sequences], max_distance)
+    return bucket_distances
 
-    m = a.make_similarity_matrix(w1, w2)
+def phono_edit_distances(lexicon, features, sequence, max_distance = None):
+    """Returns the phonological edit distance between a sequence and every
+    word of an encoded lexicon.
 
-    return m[-1][-1]['f']
+    If `max_distance` is specified, words are skipped when the difference
+    in length alone means too many insertions or deletions (see
+    `phono_bucket_distances`).
 
+    Parameters
+    ----------
+    lexicon: EncodedLexicon
+        Words to compare against, such as from `get_encoded_lexicon`
+    features: FeatureMatrix
+        FeatureMatrix that contains all the segments of the lexicon and
+        the sequence
+    sequence: sequence
+        Sequence of segments to compare
+    max_distance: float, optional
+        If specified, distances above this bound are returned as
+        ``numpy.inf``
+
+    Returns
+    -------
+    array
+        Phonological edit distances, in the order of the words of the lexicon
+    """
+    bucket_distances = phono_bucket_distances(lexicon, features, sequence)
+    result = np.full(len(lexicon), np.inf)
+    for length, (indices, sequences) in lexicon.buckets.items():
+        result[indices] = bucket_distances(length, sequences, max_distance)
+    return result
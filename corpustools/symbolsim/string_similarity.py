@@ -1,8 +1,14 @@
 from functools import partial
+from itertools import tee
+import heapq
 from corpustools.corpus.classes import Word
-from corpustools.symbolsim.khorsi import khorsi
-from corpustools.symbolsim.edit_distance import edit_distance
-from corpustools.symbolsim.phono_edit_distance import phono_edit_distance
+from corpustools.symbolsim.khorsi import khorsi, khorsi_log_terms
+from corpustools.symbolsim.edit_distance import (edit_distance, get_encoded_lexicon,
+                                                  batch_edit_distance)
+from corpustools.symbolsim.phono_edit_distance import (phono_edit_distance, phono_edit_distances,
+                                                        phono_bucket_distances)
+
+from corpustools.c_multiprocessing import context_imap_mp, context_words_map_mp
 
 from corpustools.exceptions import StringSimilarityError
 
@@ -14,19 +20,100 @@ def khorsi_wrapper(w1, w2, freq_base,sequence_type, max_distance):
         return None
 
 def edit_distance_wrapper(w1, w2, sequence_type, max_distance):
-    score = edit_distance(w1, w2, sequence_type)
+    score = edit_distance(w1, w2, sequence_type, max_distance)
     if score <= max_distance:
         return score
     else:
         return None
 
 def phono_edit_distance_wrapper(w1, w2, sequence_type, features, max_distance):
-    score = phono_edit_distance(w1, w2, sequence_type = sequence_type,features = features)
+    score = phono_edit_distance(w1, w2, sequence_type = sequence_type,features = features,
+                                max_distance = max_distance)
     if score <= max_distance:
         return score
     else:
         return None
 
+def _thresholded_relatedness(relate_func, min_rel, max_rel, w1, w2):
+    relatedness = relate_func(w1, w2)
+    if min_rel is not None and relatedness < min_rel:
+        return None
+    if max_rel is not None and relatedness > max_rel:
+        return None
+    return relatedness
+
+def _query_relatedness_job(corpus_context, word, relate_func, query, min_rel, max_rel):
+    return _thresholded_relatedness(relate_func, min_rel, max_rel, query, word)
+
+def _pair_relatedness_job(corpus_context, w1, w2, relate_func, min_rel, max_rel):
+    return _thresholded_relatedness(relate_func, min_rel, max_rel, w1, w2)
+
+def khorsi_frequency_base(corpus_context):
+    """
+    Get the segment frequencies used by khorsi, which leave out word
+    boundaries.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+
+    Returns
+    -------
+    dict
+        Keys are segments and values are their frequency in the corpus,
+        with the total under 'total'
+    """
+    freq_base = corpus_context.get_frequency_base()
+    try:
+        bound_count = freq_base['#']
+        freq_base = {k:v for k,v in freq_base.items() if k != '#'}
+        freq_base['total'] -= bound_count
+    except KeyError:
+        pass
+    return freq_base
+
+def relatedness_function(corpus_context, algorithm, max_rel = None):
+    """
+    Get the function scoring the relatedness of two words with a string
+    similarity algorithm.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    algorithm: string
+        The algorithm of string similarity to be used, currently supports
+        'khorsi', 'edit_distance', and 'phono_edit_distance'
+    max_rel: double, optional
+        Largest relatedness that will be kept, so that larger distances
+        need not be calculated exactly
+
+    Returns
+    -------
+    callable
+        Function taking two Words and returning their relatedness
+    """
+    if algorithm == 'khorsi':
+        freq_base = khorsi_frequency_base(corpus_context)
+        relate_func = partial(khorsi, freq_base=freq_base,
+                                sequence_type = corpus_context.sequence_type,
+                                log_terms = khorsi_log_terms(freq_base))
+    elif algorithm == 'edit_distance':
+        # Distances above max_rel are filtered out anyway, so they
+        # do not need to be calculated exactly
+        relate_func =  partial(edit_distance,
+                                sequence_type = corpus_context.sequence_type,
+                                max_distance = max_rel)
+    elif algorithm == 'phono_edit_distance':
+        relate_func = partial(phono_edit_distance,
+                                sequence_type = corpus_context.sequence_type,
+                                features = corpus_context.specifier,
+                                max_distance = max_rel)
+    else:
+        raise(StringSimilarityError('{} is not a possible string similarity algorithm.'.format(algorithm)))
+    return relate_func
+
 def string_similarity(corpus_context, query, algorithm, **kwargs):
     """
     This function computes similarity of pairs of words across a corpus.
@@ -48,6 +135,12 @@ def string_similarity(corpus_context, query, algorithm, **kwargs):
         Filters out all words that are higher than max_rel from a relatedness measure
     min_rel: double
         Filters out all words that are lower than min_rel from a relatedness measure
+    num_cores : int
+        Number of processes to compare words with, -1 or 1 to use only
+        the current one
+    top_k : int
+        If specified with a single query word, only this many of the most
+        similar words are returned (see `top_k_string_similarity`)
     stop_check : callable or None
         Optional function to check whether to gracefully terminate early
     call_back : callable or None
@@ -59,32 +152,138 @@ def string_similarity(corpus_context, query, algorithm, **kwargs):
         The first two elements of the tuple are the words that were compared
         and the final element is their relatedness score
     """
+    if kwargs.get('top_k', None) is not None and isinstance(query, Word):
+        return top_k_string_similarity(corpus_context, query, algorithm, **kwargs)
+    stop_check = kwargs.get('stop_check', None)
+    related_data = list(iter_string_similarity(corpus_context, query, algorithm, **kwargs))
+    if stop_check is not None and stop_check():
+        return
+    if isinstance(query, Word):
+        #Sort the list by most morphologically related
+        related_data.sort(key=lambda t:t[-1])
+        if related_data and related_data[0][1] != query:
+            related_data.reverse()
+    return related_data
+
+def top_k_string_similarity(corpus_context, query, algorithm, top_k, **kwargs):
+    """
+    Find the words in a corpus most similar to a query word.
+
+    Only the best `top_k` words so far are kept, in a heap, and the
+    relatedness of the worst of them is used as a cutoff for the
+    remaining words: edit distances are bounded by it and khorsi stops
+    adding up a score once it falls below it, so most comparisons stop
+    early.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    query: Word
+        Word to compare every word in the corpus to
+    algorithm: string
+        The algorithm of string similarity to be used, currently supports
+        'khorsi', 'edit_distance', and 'phono_edit_distance'
+    top_k: int
+        Number of words to return
+    max_rel: double
+        Filters out all words that are higher than max_rel from a relatedness measure
+    min_rel: double
+        Filters out all words that are lower than min_rel from a relatedness measure
+    stop_check : callable or None
+        Optional function to check whether to gracefully terminate early
+    call_back : callable or None
+        Optional function to supply progress information during the function
+
+    Returns
+    -------
+    list of tuples:
+        The query, a word and their relatedness score, from the most
+        similar word (lowest distance or highest khorsi score), with ties
+        in the order of the corpus
+    """
     stop_check = kwargs.get('stop_check', None)
     call_back = kwargs.get('call_back', None)
     min_rel = kwargs.get('min_rel', None)
     max_rel = kwargs.get('max_rel', None)
 
-    if algorithm == 'khorsi':
-        freq_base = corpus_context.get_frequency_base()
-        try:
-            bound_count = freq_base['#']
-            freq_base = {k:v for k,v in freq_base.items() if k != '#'}
-            freq_base['total'] -= bound_count
-        except KeyError:
-            pass
-        relate_func = partial(khorsi, freq_base=freq_base,
-                                sequence_type = corpus_context.sequence_type)
-    elif algorithm == 'edit_distance':
-        relate_func =  partial(edit_distance,
-                                sequence_type = corpus_context.sequence_type)
-    elif algorithm == 'phono_edit_distance':
-        relate_func = partial(phono_edit_distance,
-                                sequence_type = corpus_context.sequence_type,
-                                features = corpus_context.specifier)
-    else:
-        raise(StringSimilarityError('{} is not a possible string similarity algorithm.'.format(algorithm)))
+    relate_func = relatedness_function(corpus_context, algorithm, max_rel)
+    if top_k <= 0:
+        return []
+
+    if algorithm in ['edit_distance', 'phono_edit_distance']:
+        lexicon = get_encoded_lexicon(corpus_context, stop_check = stop_check)
+        if lexicon is None:
+            return
+        sequence = getattr(query, corpus_context.sequence_type)
+        if algorithm == 'edit_distance':
+            encoded = lexicon.encode(sequence)
+            bucket_distances = lambda length, sequences, bound: batch_edit_distance(encoded, sequences, bound)
+        else:
+            bucket_distances = phono_bucket_distances(lexicon, corpus_context.specifier, sequence)
+        nearest = lexicon.nearest(len(sequence), top_k, bucket_distances, max_rel, min_rel)
+        if algorithm == 'edit_distance':
+            return [(query, lexicon.words[i], int(d)) for i, d in nearest]
+        return [(query, lexicon.words[i], float(d)) for i, d in nearest]
+
+    if call_back is not None:
+        call_back('Calculating string similarity...')
+        call_back(0, len(corpus_context))
+        cur = 0
+    # Heap of the best words so far, with the worst on top
+    heap = []
+    for position, word in enumerate(corpus_context):
+        if stop_check is not None and stop_check():
+            return
+        if call_back is not None:
+            cur += 1
+            if cur % 50 == 0:
+                call_back(cur)
+        cutoff = min_rel
+        if len(heap) == top_k:
+            cutoff = heap[0][0] if cutoff is None else max(cutoff, heap[0][0])
+        relatedness = relate_func(query, word, max_distance = cutoff)
+        if min_rel is not None and relatedness < min_rel:
+            continue
+        if max_rel is not None and relatedness > max_rel:
+            continue
+        item = (relatedness, -position, word)
+        if len(heap) < top_k:
+            heapq.heappush(heap, item)
+        elif item[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, item)
+    return [(query, word, relatedness) for relatedness, _, word in sorted(heap, key = lambda t: t[:2], reverse = True)]
+
+def iter_string_similarity(corpus_context, query, algorithm, **kwargs):
+    """
+    Generate the similarity of pairs of words across a corpus, one row at
+    a time.
+
+    Takes the same arguments as `string_similarity`, but rows are yielded
+    as they are calculated, in the order of the corpus or of the query
+    pairs rather than sorted, so they can be written out without keeping
+    them all in memory (see `print_pairs_results`).  If `stop_check`
+    returns True, the generator ends early.
+
+    With `num_cores` above 1, words are compared in a pool of processes
+    that apply `min_rel` and `max_rel` themselves.  Single queries with
+    'edit_distance' and 'phono_edit_distance' are always compared in the
+    current process, as the whole lexicon is compared at once.
+
+    Yields
+    ------
+    tuple
+        The two words that were compared and their relatedness score
+    """
+    stop_check = kwargs.get('stop_check', None)
+    call_back = kwargs.get('call_back', None)
+    min_rel = kwargs.get('min_rel', None)
+    max_rel = kwargs.get('max_rel', None)
+    num_cores = kwargs.get('num_cores', -1)
+    multiprocessing = num_cores not in [-1, 1]
+
+    relate_func = relatedness_function(corpus_context, algorithm, max_rel)
 
-    related_data = []
     if isinstance(query,Word):
         if call_back is not None:
             total = len(corpus_context)
@@ -94,37 +293,73 @@ def string_similarity(corpus_context, query, algorithm, **kwargs):
             call_back('Calculating string similarity...')
             call_back(cur,total)
         targ_word = query
-        relate = list()
-        for word in corpus_context:
+        if algorithm in ['edit_distance', 'phono_edit_distance']:
+            # Compare against the whole lexicon at once on its encoded form
+            lexicon = get_encoded_lexicon(corpus_context, stop_check = stop_check)
+            if lexicon is None:
+                return
+            sequence = getattr(targ_word, corpus_context.sequence_type)
+            if algorithm == 'edit_distance':
+                distances = lexicon.edit_distances(sequence, max_rel)
+            else:
+                distances = phono_edit_distances(lexicon, corpus_context.specifier,
+                                                 sequence, max_rel)
+            words = zip(lexicon.words, distances)
+        elif multiprocessing:
+            function = partial(_query_relatedness_job, relate_func = relate_func,
+                               query = targ_word, min_rel = min_rel, max_rel = max_rel)
+            scores = context_words_map_mp(corpus_context, function, num_cores,
+                                          call_back = call_back, stop_check = stop_check)
+            if scores is None:
+                return
+            for word, relatedness in zip(corpus_context, scores):
+                if relatedness is not None:
+                    yield (targ_word, word, relatedness)
+            return
+        else:
+            words = ((word, None) for word in corpus_context)
+        for word, relatedness in words:
             if stop_check is not None and stop_check():
                 return
             if call_back is not None:
                 cur += 1
                 if cur % 50 == 0:
                     call_back(cur)
-            relatedness = relate_func(targ_word, word)
+            if relatedness is None:
+                relatedness = relate_func(targ_word, word)
+            elif algorithm == 'edit_distance' and relatedness != float('inf'):
+                relatedness = int(relatedness)
+            else:
+                relatedness = float(relatedness)
 
             if min_rel is not None and relatedness < min_rel:
                 continue
             if max_rel is not None and relatedness > max_rel:
                 continue
-            related_data.append( (targ_word,word,relatedness) )
-        #Sort the list by most morphologically related
-        related_data.sort(key=lambda t:t[-1])
-        if related_data[0][1] != targ_word:
-            related_data.reverse()
+            yield (targ_word,word,relatedness)
     elif isinstance(query, tuple):
         w1 = query[0]
         w2 = query[1]
-        relatedness = relate_func(w1,w2)
-        related_data.append((w1,w2,relatedness))
+        # A single pair is reported whatever its relatedness, so it has to
+        # be calculated exactly
+        relatedness = relatedness_function(corpus_context, algorithm)(w1,w2)
+        yield (w1,w2,relatedness)
     elif hasattr(query,'__iter__'):
         if call_back is not None:
-            total = len(query)
             cur = 0
             call_back('Calculating string similarity...')
-            if total:
-                call_back(cur,total)
+            if hasattr(query, '__len__') and len(query):
+                call_back(cur,len(query))
+        if multiprocessing:
+            pairs, jobs = tee(query)
+            function = partial(_pair_relatedness_job, relate_func = relate_func,
+                               min_rel = min_rel, max_rel = max_rel)
+            scores = context_imap_mp(corpus_context, function, ((q1, q2) for q1, q2 in jobs),
+                                     num_cores, call_back = call_back, stop_check = stop_check)
+            for (w1, w2), relatedness in zip(pairs, scores):
+                if relatedness is not None:
+                    yield (w1, w2, relatedness)
+            return
         for q1,q2 in query:
             if stop_check is not None and stop_check():
                 return
@@ -139,7 +374,4 @@ def string_similarity(corpus_context, query, algorithm, **kwargs):
                 continue
             if max_rel is not None and relatedness > max_rel:
                 continue
-            related_data.append( (w1,w2,relatedness) )
-
-    return related_data
-
+            yield (w1,w2,relatedness)
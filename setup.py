@@ -65,6 +65,8 @@ setup(name='corpustools',
                             'pct_corpus=corpustools.command_line.pct_corpus:main',
                             'pct_funcload=corpustools.command_line.pct_funcload:main',
                             'pct_neighdens=corpustools.command_line.pct_neighdens:main',
+                            'pct_stringsim=corpustools.command_line.pct_stringsim:main',
+                            'pct_phonoprob=corpustools.command_line.pct_phonoprob:main',
                             'pct_mutualinfo=corpustools.command_line.pct_mutualinfo:main',
                             'pct_kl=corpustools.command_line.pct_kl:main',
                             'pct_search=corpustools.command_line.pct_search:main',
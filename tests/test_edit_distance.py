@@ -3,7 +3,11 @@
 import sys
 import os
 
+import numpy as np
+
 from corpustools.symbolsim.string_similarity import string_similarity
+from corpustools.symbolsim.edit_distance import (edit_distance, batch_edit_distance,
+                                                  get_encoded_lexicon, get_deletion_index)
 from corpustools.contextmanagers import CanonicalVariantContext, MostFrequentVariantContext, WeightedVariantContext
 
 def test_spelling(unspecified_test_corpus):
@@ -95,3 +99,61 @@ def test_transcription(unspecified_test_corpus):
     calced.sort(key=lambda t:t[1])
     for i, v in enumerate(expected):
         assert(calced[i] == v)
+
+def test_max_distance(unspecified_test_corpus):
+    atema = unspecified_test_corpus.find('atema')
+    assert(edit_distance(atema, unspecified_test_corpus.find('mata'), 'spelling', 3) == 3)
+    assert(edit_distance(atema, unspecified_test_corpus.find('mata'), 'spelling', 2) == float('inf'))
+    assert(edit_distance(atema, unspecified_test_corpus.find('tishenishu'), 'spelling', 3) == float('inf'))
+    assert(edit_distance(atema, atema, 'spelling', 0) == 0)
+    assert(edit_distance(atema, atema, 'spelling', -0.5) == float('inf'))
+
+    with CanonicalVariantContext(unspecified_test_corpus, 'spelling', 'type') as c:
+        calced = string_similarity(c, atema, 'edit_distance', max_rel = 3)
+    assert(sorted(w.spelling for _, w, _ in calced) ==
+           ['atema', 'mata', 'nata', 'ta', 'tatomi', 'tusa'])
+
+    with CanonicalVariantContext(unspecified_test_corpus, 'spelling', 'type') as c:
+        tishenishu = unspecified_test_corpus.find('tishenishu')
+        pair = string_similarity(c, (atema, tishenishu), 'edit_distance', max_rel = 3)
+    assert(pair[0][2] == edit_distance(atema, tishenishu, 'spelling'))
+
+def test_batch_edit_distance(unspecified_test_corpus):
+    with CanonicalVariantContext(unspecified_test_corpus, 'spelling', 'type') as c:
+        lexicon = get_encoded_lexicon(c)
+        assert(get_encoded_lexicon(c) is lexicon)
+        atema = unspecified_test_corpus.find('atema')
+        distances = lexicon.edit_distances(atema.spelling)
+        for word, distance in zip(lexicon.words, distances):
+            assert(distance == edit_distance(atema, word, 'spelling'))
+        distances = lexicon.edit_distances(atema.spelling, 3)
+        for word, distance in zip(lexicon.words, distances):
+            assert(distance == edit_distance(atema, word, 'spelling', 3))
+
+    query = np.array([1, 2, 3])
+    candidates = np.array([[1, 2, 3], [1, 3, 3], [3, 2, 1], [4, 4, 4]])
+    assert(list(batch_edit_distance(query, candidates)) == [0, 1, 2, 3])
+    assert(list(batch_edit_distance(query, candidates, 1)) == [0, 1, np.inf, np.inf])
+    assert(list(batch_edit_distance(query, candidates, -0.5)) == [np.inf] * 4)
+
+def test_deletion_index(unspecified_test_corpus):
+    with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'type') as c:
+        index = get_deletion_index(c, 3)
+        assert(get_deletion_index(c, 3) is index)
+        for query in c:
+            for max_distance in range(4):
+                expected = [w for w in c
+                            if edit_distance(query, w, 'transcription') <= max_distance]
+                found = index.query(query.transcription, max_distance)
+                assert(sorted(found) == sorted(expected))
+
+def test_top_k(unspecified_test_corpus):
+    query = unspecified_test_corpus.find('atema')
+    with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'type') as c:
+        full = string_similarity(c, query, 'edit_distance')
+        for k in [1, 3, 10, 100]:
+            top = string_similarity(c, query, 'edit_distance', top_k = k)
+            assert([x[2] for x in top] == [x[2] for x in full[:k]])
+        top = string_similarity(c, query, 'edit_distance', top_k = 100, max_rel = 3)
+        assert(top == [x for x in full if x[2] <= 3][:len(top)])
+        assert(string_similarity(c, query, 'edit_distance', top_k = 0) == [])
@@ -58,3 +58,14 @@ def test_freqalt(specified_test_corpus):
 
         result = calc_freq_of_alt(c,'s','ʃ','phono_edit_distance', max_rel = 20, phono_align=False)
         assert(result==(8,6,0.75))
+
+def test_freqalt_multiprocessing(specified_test_corpus):
+    with CanonicalVariantContext(specified_test_corpus, 'transcription', 'token') as c:
+        for algorithm, kwargs in [('khorsi', {'min_rel': -15}), ('khorsi', {'min_rel': -6}),
+                                    ('edit_distance', {'max_rel': 4}),
+                                    ('phono_edit_distance', {'max_rel': 20})]:
+            for phono_align in [True, False]:
+                serial = calc_freq_of_alt(c, 's', 'ʃ', algorithm, phono_align = phono_align, **kwargs)
+                parallel = calc_freq_of_alt(c, 's', 'ʃ', algorithm, phono_align = phono_align,
+                                            num_cores = 2, **kwargs)
+                assert(serial == parallel)
@@ -5,8 +5,11 @@ import pytest
 
 from corpustools.funcload.functional_load import (minpair_fl, deltah_fl,
                                 relative_minpair_fl, relative_deltah_fl,
-                                all_pairwise_fls,)
+                                all_pairwise_fls, get_minpair_index,
+                                pairwise_minpair_fls, pairwise_deltah_fls,
+                                neutralize_with_all_envs)
 from corpustools.corpus.classes import Segment
+from corpustools.corpus.classes.lexicon import Transcription, EnvironmentFilter
 
 from corpustools.contextmanagers import (CanonicalVariantContext,
                                         MostFrequentVariantContext,
@@ -122,6 +125,56 @@ def test_deltah(unspecified_test_corpus):
             assert(abs(deltah_fl(c, **kwargs)-v) < 0.0001)
 
 
+def test_minpair_index(unspecified_test_corpus):
+    with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'type') as c:
+        index = get_minpair_index(c, [('s','ʃ')])
+        assert(len(index.words) == 8)
+        pairs = [(str(index.words[i]), str(index.words[j])) for i, j in index.candidate_pairs()]
+        assert(pairs == [('sasi', 'shashi')])
+        assert(get_minpair_index(c, [('ʃ','s')]) is index)
+
+        res = minpair_fl(c, [('s','ʃ'), ('m','n')], relative_count_to_whole_corpus=False)
+        assert(res[0] == 2)
+        assert([(str(x[0][0]), str(x[1][0])) for x in res[1]] == [('mata', 'nata'), ('sasi', 'shashi')])
+
+def test_pairwise_fls(unspecified_test_corpus):
+    for type_or_token in ['type', 'token']:
+        with CanonicalVariantContext(unspecified_test_corpus, 'transcription', type_or_token) as c:
+            inventory = [s.symbol for s in c.inventory]
+            pairs = [(s1, s2) for i, s1 in enumerate(inventory) for s2 in inventory[i+1:]]
+            minpair_fls = pairwise_minpair_fls(c, pairs, relative_count_to_relevant_sounds=True)
+            deltah_fls = pairwise_deltah_fls(c, pairs)
+            for pair in pairs:
+                assert(abs(minpair_fls[pair] - minpair_fl(c, [pair],
+                            relative_count_to_relevant_sounds=True)[0]) < 0.0001)
+                assert(abs(deltah_fls[pair] - deltah_fl(c, [pair])) < 0.0001)
+            fls = dict(all_pairwise_fls(c))
+            assert(abs(fls[('s', 'ʃ')] - 1/15) < 0.0001)
+            assert(abs(fls[('m', 'n')] - 1/15) < 0.0001)
+
+
+def test_neutralize_with_all_envs():
+    trans = Transcription(['s', 'ɑ', 's', 'i', 's'])
+    envs = [EnvironmentFilter(('s', 'ʃ'), [], [])]
+    assert(neutralize_with_all_envs(trans, envs) == '#-ɑ-i-#')
+    envs = [EnvironmentFilter(('s', 'ʃ'), [], [('ɑ', 'i')])]
+    assert(neutralize_with_all_envs(trans, envs) == '#-ɑ-is#')
+    envs = [EnvironmentFilter(('s', 'ʃ'), [('#',)], []),
+            EnvironmentFilter(('s', 'ʃ'), [], [('#',)])]
+    assert(neutralize_with_all_envs(trans, envs) == '#-ɑsi-#')
+
+
+def test_pairwise_fls_multiprocessing(unspecified_test_corpus):
+    with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'type') as c:
+        for algorithm in ['minpair', 'deltah']:
+            assert(all_pairwise_fls(c, algorithm=algorithm, num_cores=2) ==
+                   all_pairwise_fls(c, algorithm=algorithm))
+        assert(abs(relative_minpair_fl(c, 's', num_cores=2) -
+                   relative_minpair_fl(c, 's')) < 0.0001)
+        assert(abs(relative_deltah_fl(c, 's', num_cores=2) -
+                   relative_deltah_fl(c, 's')) < 0.0001)
+        assert(all_pairwise_fls(c, num_cores=2, stop_check=lambda: True) is None)
+
 
 # def test_minimal_pair_wordtokens(unspecified_discourse_corpus):
 #     corpus = unspecified_discourse_corpus.lexicon
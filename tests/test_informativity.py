@@ -0,0 +1,59 @@
+import pytest
+
+from corpustools.informativity.informativity import (get_informativity,
+                                                     get_multiple_informativity,
+                                                     all_informativity,
+                                                     segment_in_context_frequencies,
+                                                     context_frequencies,
+                                                     context)
+from corpustools.exceptions import InformativityError
+from corpustools.contextmanagers import CanonicalVariantContext
+
+
+def test_context_frequencies(unspecified_test_corpus):
+    with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'token') as c:
+        s_frs = segment_in_context_frequencies('ɑ', c)
+        c_frs = context_frequencies(s_frs, c)
+        for context, fr in s_frs.items():
+            expected_s = sum(w.frequency for w in c
+                             if tuple(w.transcription[0:len(context) + 1]) == context + ('ɑ',))
+            expected_c = sum(w.frequency for w in c
+                             if tuple(w.transcription[0:len(context)]) == context)
+            assert(fr == expected_s)
+            assert(c_frs[context] == expected_c)
+
+def test_multiple_informativity(unspecified_test_corpus):
+    segs = [s.symbol for s in unspecified_test_corpus.inventory]
+    for type_or_token in ['type', 'token']:
+        with CanonicalVariantContext(unspecified_test_corpus, 'transcription', type_or_token) as c:
+            results = get_multiple_informativity(c, segs, 'transcription', type_or_token = type_or_token)
+            everything = all_informativity(c)
+            for seg, result in zip(segs, results):
+                single = get_informativity(c, seg, 'transcription')
+                assert(result['Informativity'] == single['Informativity'])
+                assert(everything[seg]['Informativity'] == single['Informativity'])
+
+def test_preceding_context(unspecified_test_corpus):
+    longest = max(len(w.transcription) for w in unspecified_test_corpus)
+    with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'token') as c:
+        for size in [1, 2]:
+            s_frs = segment_in_context_frequencies('ɑ', c, preceding_context = size)
+            expected = {}
+            for w in c:
+                for i, seg in enumerate(w.transcription):
+                    if seg == 'ɑ':
+                        key = context(i + 1, w, preceding_context = size)
+                        expected[key] = expected.get(key, 0) + w.frequency
+            assert(dict(s_frs) == expected)
+
+        segs = [s.symbol for s in unspecified_test_corpus.inventory]
+        bounded = get_multiple_informativity(c, segs, 'transcription', preceding_context = longest)
+        unbounded = get_multiple_informativity(c, segs, 'transcription')
+        for b, u in zip(bounded, unbounded):
+            assert(b['Informativity'] == u['Informativity'])
+        assert(bounded[0]['Context'] == longest)
+        assert(all_informativity(c, preceding_context = 1)[segs[0]]['Informativity'] ==
+               get_informativity(c, segs[0], 'transcription', preceding_context = 1)['Informativity'])
+
+        with pytest.raises(InformativityError):
+            get_informativity(c, segs[0], 'transcription', preceding_context = 0)
@@ -4,7 +4,8 @@ import sys
 import os
 
 from corpustools.symbolsim.khorsi import lcs
-from corpustools.symbolsim.string_similarity import string_similarity
+from corpustools.symbolsim.string_similarity import string_similarity, iter_string_similarity
+from corpustools.symbolsim.io import print_pairs_results
 from corpustools.contextmanagers import (CanonicalVariantContext,
                                         MostFrequentVariantContext,
                                         WeightedVariantContext)
@@ -160,6 +161,13 @@ def test_lcs_transcription(unspecified_test_corpus):
         assert(calced == (v[2],sorted(v[3])))
 
 
+def test_lcs_segments_with_periods():
+    x1 = ['t', 'a.', 'm', 'a.']
+    x2 = ['s', 'a.', 'm', 'i']
+    assert(lcs(x1, x2) == (['a.', 'm'], ['s', 'i', 't', 'a.']))
+    assert(lcs(['a', 'b'], ['c']) == ([], ['a', 'b', 'c']))
+
+
 def test_mass_relate_spelling_type(unspecified_test_corpus):
     expected = [(unspecified_test_corpus.find('atema'),unspecified_test_corpus.find('atema'),11.0766887),
                 (unspecified_test_corpus.find('atema'),unspecified_test_corpus.find('enuta'),-14.09489383),
@@ -339,3 +347,36 @@ def test_mass_relate_transcription_token(unspecified_test_corpus):
         calced = string_similarity(c,unspecified_test_corpus.find('sasi'),'khorsi')
     for i, v in enumerate(expected):
         assert(abs(calced[i][2] - v[2]) < 0.0001)
+
+
+def test_string_similarity_multiprocessing(unspecified_test_corpus, tmpdir):
+    words = list(unspecified_test_corpus)
+    pairs = [(w1, w2) for w1 in words for w2 in words]
+    with CanonicalVariantContext(unspecified_test_corpus, 'spelling', 'type') as c:
+        for kwargs in [{}, {'min_rel': -10}, {'min_rel': -15, 'max_rel': 0}]:
+            serial = string_similarity(c, unspecified_test_corpus.find('atema'), 'khorsi', **kwargs)
+            parallel = string_similarity(c, unspecified_test_corpus.find('atema'), 'khorsi',
+                                         num_cores = 2, **kwargs)
+            assert(serial == parallel)
+
+            serial = string_similarity(c, pairs, 'khorsi', **kwargs)
+            parallel = string_similarity(c, iter(pairs), 'khorsi', num_cores = 2, **kwargs)
+            assert(serial == parallel)
+
+        path = str(tmpdir.join('pairs.txt'))
+        print_pairs_results(path, iter_string_similarity(c, iter(pairs), 'khorsi',
+                                                         min_rel = -10, num_cores = 2))
+        with open(path, encoding='utf-8-sig') as f:
+            lines = f.read().splitlines()
+        assert(lines == ['{}\t{}\t{}'.format(*row) for row in string_similarity(c, pairs, 'khorsi', min_rel = -10)])
+
+
+def test_top_k(unspecified_test_corpus):
+    query = unspecified_test_corpus.find('atema')
+    with CanonicalVariantContext(unspecified_test_corpus, 'spelling', 'type') as c:
+        full = string_similarity(c, query, 'khorsi')
+        for k in [1, 3, 10, 100]:
+            top = string_similarity(c, query, 'khorsi', top_k = k)
+            assert([x[2] for x in top] == [x[2] for x in full[:k]])
+        top = string_similarity(c, query, 'khorsi', top_k = 5, min_rel = -10)
+        assert([x[2] for x in top] == [x[2] for x in full if x[2] >= -10][:5])
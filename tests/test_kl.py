@@ -2,7 +2,7 @@ import pytest
 import sys
 import os
 
-from corpustools.kl.kl import KullbackLeibler as KL
+from corpustools.kl.kl import KullbackLeibler as KL, pairwise_KullbackLeibler
 from corpustools.contextmanagers import (CanonicalVariantContext,
                                         MostFrequentVariantContext,
                                         WeightedVariantContext)
@@ -47,4 +47,13 @@ def test_error(specified_test_corpus):
         with CanonicalVariantContext(specified_test_corpus, 'transcription', 'type') as c:
             KL(c, 's', '!','')
 
-
+def test_pairwise(specified_test_corpus):
+    with CanonicalVariantContext(specified_test_corpus, 'transcription', 'type') as c:
+        for side in ['r', 'l', 'b']:
+            segments, entropies, distances = pairwise_KullbackLeibler(c, side)
+            for i, seg1 in enumerate(segments):
+                for j, seg2 in enumerate(segments):
+                    seg1_entropy, seg2_entropy, distance, ur, is_spurious = KL(c, seg1, seg2, side)
+                    assert(abs(distance - distances[i, j]) < 1e-9)
+                    assert(abs(seg1_entropy - entropies[i]) < 1e-9)
+                    assert(abs(seg2_entropy - entropies[j]) < 1e-9)
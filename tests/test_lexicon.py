@@ -6,8 +6,8 @@ import sys
 import pdb
 
 from corpustools.corpus.classes import (Word, Corpus, FeatureMatrix, Segment,
-                                        Environment, EnvironmentFilter, Transcription,
-                                        WordToken, Discourse)
+                                        Environment, EnvironmentFilter, EnvironmentMatcher,
+                                        Transcription, WordToken, Discourse)
 
 
 class CorpusTest(unittest.TestCase):
@@ -414,6 +414,29 @@ class EnvironmentFilterTest(unittest.TestCase):
         self.assertFalse(env2 in envfilt)
         self.assertFalse(env3 in envfilt)
 
+    def test_matcher(self):
+        filters = [EnvironmentFilter(['a'], lhs = [['c', '#']]),
+                   EnvironmentFilter(['a', 'b'], rhs = [['*']]),
+                   EnvironmentFilter(['b'], lhs = [['c'], ['a']]),
+                   EnvironmentFilter(['d'])]
+        matcher = EnvironmentMatcher(filters)
+        for word in self.corpus:
+            found = matcher.find(word.transcription)
+            segs = word.transcription.with_word_boundaries()
+            for envfilt, envs in zip(filters, found):
+                lhs_num = envfilt.lhs_count()
+                expected = [(p[lhs_num], i + lhs_num) for i, p in
+                            enumerate(zip(*[segs[j:] for j in range(len(envfilt))]))
+                            if p in envfilt and any(m in word.transcription for m in envfilt.middle)]
+                self.assertEqual([(e.middle, e.position) for e in envs], expected)
+                self.assertEqual(word.transcription.find(envfilt) or [], envs)
+
+        envs = matcher.find(Transcription(['c', 'a', 'b']))
+        self.assertEqual([(e.middle, e.position) for e in envs[0]], [('a', 2)])
+        self.assertEqual([(e.middle, e.position) for e in envs[1]], [('a', 2), ('b', 3)])
+        self.assertEqual([(e.middle, e.position) for e in envs[2]], [('b', 3)])
+        self.assertEqual(envs[3], [])
+
 
 def test_categories_spe(specified_test_corpus):
     cats = {'ɑ':['Vowel','Open','Near back','Unrounded'],
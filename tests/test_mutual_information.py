@@ -1,8 +1,11 @@
 
 import sys
 import os
+import pytest
 
 from corpustools.mutualinfo.mutual_information import pointwise_mi, all_mis
+from corpustools.corpus.classes import Corpus, Word
+from corpustools.exceptions import MutualInfoError
 from corpustools.contextmanagers import (CanonicalVariantContext,
                                         MostFrequentVariantContext,
                                         WeightedVariantContext)
@@ -28,3 +31,22 @@ def test_pointwise_mi(unspecified_test_corpus):
     #with CanonicalVariantContext(unspecified_test_corpus, 'spelling', 'type') as c:
     #   result = pointwise_mi(c, query = ('t', 'a'))
     #   assert(result == 0)
+
+def test_all_mis(unspecified_test_corpus):
+    corpus = Corpus('test')
+    for i, transcription in enumerate([['t', 'a', 't'], ['a', 'a', 't', 't', 'a'],
+                                        ['t', 'a'], ['a', 't', 'a', 'a']]):
+        corpus.add_word(Word(spelling = str(i), transcription = transcription, frequency = i + 1))
+    for type_or_token in ['type', 'token']:
+        with CanonicalVariantContext(corpus, 'transcription', type_or_token) as c:
+            for in_word in [False, True]:
+                result = all_mis(c, in_word = in_word)
+                assert(len(result) == 4)
+                assert([mi for _, mi in result] == sorted(mi for _, mi in result))
+                for pair, mi in result:
+                    assert(mi == str(pointwise_mi(c, pair, in_word = in_word)))
+
+    with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'type') as c:
+        # Some segments never occur next to each other
+        with pytest.raises(MutualInfoError):
+            all_mis(c)
@@ -4,7 +4,13 @@ import os
 
 from corpustools.corpus.classes import Word
 
+from collections import defaultdict
+
+from corpustools.corpus.classes.lexicon import Attribute
+
 from corpustools.neighdens.neighborhood_density import (neighborhood_density,
+                                                        neighborhood_density_all_words,
+                                                        fast_neighborhood_density,
                                                         find_mutation_minpairs)
 
 from corpustools.contextmanagers import (CanonicalVariantContext,
@@ -24,6 +30,58 @@ def test_basic_corpus_nd(specified_test_corpus):
             result = neighborhood_density(c, **kwargs)
             assert(abs(result[0]-v) < 0.0001)
 
+def test_force_quadratic(specified_test_corpus):
+    with CanonicalVariantContext(specified_test_corpus, 'transcription', 'type') as c:
+        for algorithm, max_distance in [('edit_distance', 1), ('edit_distance', 2),
+                                         ('phono_edit_distance', 3)]:
+            for w in c:
+                quadratic = neighborhood_density(c, w, algorithm = algorithm,
+                                                 max_distance = max_distance,
+                                                 force_quadratic = True)
+                assert(c._deletion_index == {})
+                assert(c._encoded_lexicon == {})
+                indexed = neighborhood_density(c, w, algorithm = algorithm,
+                                               max_distance = max_distance)
+                c._deletion_index = {}
+                c._encoded_lexicon = {}
+                assert(quadratic[0] == indexed[0])
+                assert(sorted(str(x) for x in quadratic[1]) == sorted(str(x) for x in indexed[1]))
+
+
+def test_fast_neighborhood_density(specified_test_corpus):
+    tier_type = Attribute('transcription', 'tier')
+    with CanonicalVariantContext(specified_test_corpus, 'transcription', 'type') as c:
+        tierdict = defaultdict(list)
+        for w in c:
+            tierdict[str(w.transcription)].append(w)
+        query = Word(**{'transcription': ['s', 'ɑ', 't', 'ɑ']})
+        result = fast_neighborhood_density(c, query, 'transcription', tier_type, tierdict)
+        assert(sorted(str(w.transcription) for w in result[1]) ==
+               ['m.ɑ.t.ɑ', 'n.ɑ.t.ɑ'])
+
+        query = specified_test_corpus.find('mata')
+        tierdict[str(query.transcription)].remove(query)
+        result = fast_neighborhood_density(c, query, 'transcription', tier_type, tierdict)
+        assert(result[0] == 1)
+        assert([str(w.transcription) for w in result[1]] == ['n.ɑ.t.ɑ'])
+
+
+def test_neighborhood_density_all_words_multiprocessing(specified_test_corpus):
+    tier_type = Attribute('transcription', 'tier')
+    for max_distance in [1, 2]:
+        results = []
+        for num_cores in [1, 2]:
+            attribute = Attribute('nd{}'.format(num_cores), 'numeric')
+            with CanonicalVariantContext(specified_test_corpus, 'transcription', 'type',
+                                         attribute = attribute) as c:
+                result = neighborhood_density_all_words(c, tier_type = tier_type,
+                                                        max_distance = max_distance,
+                                                        num_cores = num_cores,
+                                                        settable_attr = attribute)
+            densities = [getattr(w, attribute.name) for w in specified_test_corpus]
+            results.append((sorted((k, sorted(v)) for k, v in result.items()), densities))
+        assert(results[0] == results[1])
+
 
 def test_basic_corpus_mutation_minpairs(specified_test_corpus):
     calls = [({'query':Word(**{'transcription': ['s', 'ɑ', 't', 'ɑ']}),
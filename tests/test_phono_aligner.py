@@ -1 +1,12 @@
+from corpustools.symbolsim.phono_align import Aligner
 
+def test_morpho_related_sequences(specified_test_corpus):
+    fm = specified_test_corpus.specifier
+    words = [w.transcription for w in specified_test_corpus]
+    for kwargs in [{}, {'tolerance': 0.5}, {'features_tf': False}]:
+        aligner = Aligner(features = fm, **kwargs)
+        for w1 in words:
+            for w2 in words:
+                for s1, s2 in [('s', 'ʃ'), ('t', 'n')]:
+                    expected = aligner.morpho_related(aligner.align(w1, w2), s1, s2)
+                    assert(aligner.morpho_related_sequences(w1, w2, s1, s2) == expected)
@@ -1 +1,71 @@
 
+from corpustools.symbolsim.phono_align import Aligner
+from corpustools.symbolsim.phono_edit_distance import (phono_edit_distance, get_aligner,
+                                                        phono_edit_distances)
+from corpustools.symbolsim.edit_distance import get_encoded_lexicon
+from corpustools.contextmanagers import CanonicalVariantContext
+from corpustools.corpus.classes import Word
+
+def _reference_distance(aligner, seq1, seq2):
+    # Edit distance worked out directly from compare_segments, without the
+    # cost tables of the aligner
+    d = [[0] * (len(seq2) + 1) for _ in range(len(seq1) + 1)]
+    for x in range(1, len(seq1) + 1):
+        d[x][0] = d[x-1][0] + aligner.compare_segments(seq1[x-1], 'empty')
+    for y in range(1, len(seq2) + 1):
+        d[0][y] = d[0][y-1] + aligner.compare_segments('empty', seq2[y-1])
+    for x in range(1, len(seq1) + 1):
+        for y in range(1, len(seq2) + 1):
+            d[x][y] = min(d[x-1][y-1] + aligner.compare_segments(seq1[x-1], seq2[y-1]),
+                          d[x-1][y] + aligner.compare_segments(seq1[x-1], 'empty'),
+                          d[x][y-1] + aligner.compare_segments('empty', seq2[y-1]))
+    return d[-1][-1]
+
+def test_phono_edit_distance(specified_test_corpus):
+    fm = specified_test_corpus.specifier
+    words = list(specified_test_corpus)
+    aligner = Aligner(features_tf=True, features=fm)
+    for w1 in words:
+        for w2 in words:
+            expected = _reference_distance(aligner, w1.transcription, w2.transcription)
+            assert(phono_edit_distance(w1, w2, 'transcription', fm) == expected)
+    aligner.build_cost_tables()
+    for s1 in fm.segments:
+        i = aligner._segment_index[s1]
+        assert(aligner._ins_costs[i] == aligner.compare_segments('empty', s1))
+        assert(aligner._del_costs[i] == aligner.compare_segments(s1, 'empty'))
+        for s2 in fm.segments:
+            assert(aligner._sub_costs[i][aligner._segment_index[s2]] ==
+                   aligner.compare_segments(s1, s2))
+    assert(get_aligner(fm) is get_aligner(fm))
+    assert(phono_edit_distance(words[0], words[0], 'transcription', fm) == 0)
+
+def test_phono_edit_distances(specified_test_corpus):
+    fm = specified_test_corpus.specifier
+    with CanonicalVariantContext(specified_test_corpus, 'transcription', 'type') as c:
+        lexicon = get_encoded_lexicon(c)
+        for query in lexicon.words:
+            expected = [phono_edit_distance(query, w, 'transcription', fm) for w in lexicon.words]
+            assert(list(phono_edit_distances(lexicon, fm, query.transcription)) == expected)
+            for max_distance in [0, 3, 10.5]:
+                distances = phono_edit_distances(lexicon, fm, query.transcription, max_distance)
+                assert([d for d in distances if d <= max_distance] ==
+                       [d for d in expected if d <= max_distance])
+                assert(all(d == float('inf') for d, e in zip(distances, expected) if e > max_distance))
+                assert(phono_edit_distance(query, lexicon.words[0], 'transcription', fm, max_distance) ==
+                       (expected[0] if expected[0] <= max_distance else float('inf')))
+
+def test_matrix_changes(specified_test_corpus):
+    fm = specified_test_corpus.specifier
+    words = list(specified_test_corpus)
+    phono_edit_distance(words[0], words[1], 'transcription', fm)
+    aligner = get_aligner(fm)
+    try:
+        fm.add_segment('q', dict(fm['t']))
+        assert(get_aligner(fm) is not aligner)
+        word = Word(spelling = 'q', transcription = ['q'])
+        t = Word(spelling = 't', transcription = ['t'])
+        assert(phono_edit_distance(words[0], word, 'transcription', fm) ==
+               phono_edit_distance(words[0], t, 'transcription', fm))
+    finally:
+        del fm['q']
@@ -3,7 +3,7 @@ import sys
 import os
 
 from corpustools.phonosearch import phonological_search
-from corpustools.corpus.classes import EnvironmentFilter, Environment
+from corpustools.corpus.classes import EnvironmentFilter, Environment, Word
 
 def test_non_minimal_pair_corpus_minpair(unspecified_test_corpus):
     envs = [EnvironmentFilter(['n'],['#'])]
@@ -15,3 +15,17 @@ def test_non_minimal_pair_corpus_minpair(unspecified_test_corpus):
     print(expected_e.middle, expected_e.position, expected_e.lhs, expected_e.rhs)
     assert(e == expected_e)
 
+
+def test_index_updates(unspecified_test_corpus):
+    envs = [EnvironmentFilter(['ʃ'], rhs = [['i']])]
+    before = [str(w) for w, found in phonological_search(unspecified_test_corpus, envs)]
+    unspecified_test_corpus.add_word(Word(spelling = 'ʃimʃi', transcription = ['ʃ', 'i', 'm', 'ʃ', 'i'],
+                                          frequency = 1))
+    results = phonological_search(unspecified_test_corpus, envs)
+    assert([str(w) for w, found in results] == before + ['ʃimʃi'])
+    assert([e.position for e in results[-1][1]] == [1, 4])
+
+    unspecified_test_corpus.remove_word('ʃimʃi')
+    assert([str(w) for w, found in phonological_search(unspecified_test_corpus, envs)] == before)
+    negative = phonological_search(unspecified_test_corpus, envs, result_type = 'negative')
+    assert(len(negative) + len(before) == len(unspecified_test_corpus))
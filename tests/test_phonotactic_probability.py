@@ -1,9 +1,14 @@
 import unittest
+import pytest
 
 import sys
 import os
 
-from corpustools.phonoprob.phonotactic_probability import phonotactic_probability_vitevitch
+from corpustools.corpus.classes import Word, Attribute
+from corpustools.exceptions import PhonoProbError
+from corpustools.phonoprob.phonotactic_probability import (phonotactic_probability_vitevitch,
+                                                    phonotactic_probability_all_words,
+                                                    phonotactic_probabilities)
 from corpustools.contextmanagers import CanonicalVariantContext, MostFrequentVariantContext, WeightedVariantContext
 
 def test_basic_corpus_probs(unspecified_test_corpus):
@@ -87,6 +92,39 @@ def test_basic_phonoprob(unspecified_test_corpus):
             res = phonotactic_probability_vitevitch(c, unspecified_test_corpus.find(k), 'bigram')
         assert(abs(v - res) < 0.0001)
 
+def test_cached_probs(unspecified_test_corpus):
+    with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'token') as c:
+        prob_dict = c.get_phone_probs(2)
+        assert(c.get_phone_probs(2) is prob_dict)
+        assert(c.get_phone_probs(2, log_count = False) is not prob_dict)
+        freq_base = c.get_frequency_base(probability = True)
+        assert(c.get_frequency_base(probability = True) is freq_base)
+        with pytest.raises(TypeError):
+            freq_base['total'] = 0
+        copied = dict(freq_base)
+        copied['total'] = 0
+        assert(freq_base['total'] == 1)
+
+def test_all_words_and_batch(unspecified_test_corpus):
+    nonwords = [Word(transcription = ['t', 'ɑ', 't', 'ɑ']),
+                Word(transcription = ['n', 'ɑ']),
+                Word(transcription = ['m'])]
+    for probability_type in ['unigram', 'bigram']:
+        attribute = Attribute('pp_' + probability_type, 'numeric')
+        with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'token',
+                                     attribute = attribute) as c:
+            phonotactic_probability_all_words(c, 'vitevitch', probability_type = probability_type)
+            for w in unspecified_test_corpus:
+                expected = phonotactic_probability_vitevitch(c, w, probability_type)
+                assert(getattr(w, attribute.name) == expected)
+
+            expected = [phonotactic_probability_vitevitch(c, w, probability_type) for w in nonwords]
+            assert(phonotactic_probabilities(c, nonwords, 'vitevitch',
+                                             probability_type = probability_type) == expected)
+            with pytest.raises(PhonoProbError):
+                phonotactic_probabilities(c, [Word(transcription = ['t', 'x'])], 'vitevitch',
+                                          probability_type = probability_type)
+
 #def test_iphod(self):
     #return
     #if not os.path.exists(TEST_DIR):